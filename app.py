@@ -1,71 +1,853 @@
 import os
-import subprocess
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file, session
+import hashlib
+import time
+import json
+import threading
+import uuid
+import tarfile
+import zipfile
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, send_file, session, jsonify
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.utils import secure_filename
+from werkzeug.utils import safe_join, secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from reportlab.pdfgen import canvas
-import tempfile
-import shutil
-import cv2
-import numpy as np
+from exiftool_pool import ExifToolPool, ExifToolError
+from jobs import JobRunner, QueueFull
+import reports
+from reports import build_pdf_report, iter_buffer, iter_txt_report
+import metrics
+from metrics import stage
+import uploads
+from uploads import IngestFile, SNIFF_BYTES, file_extension, sniff
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from metadata import MetadataRecord, EXIFTOOL_JSON_ARGS, PROFILE_ARGS, PROFILE_FULL, PROFILE_QUICK, QUICK_EXTENSIONS, parse_exiftool_json, profile_args, system_tags
+from blobstore import BlobStore, hash_file, link_or_copy, remove_view
+from sanitize import DEFAULT_COMMENT, SanitizePolicy, errors_by_file
+import case_index
+from case_index import CORRELATION_FIELDS
+from near_duplicates import HASH_NAMES, MAX_DISTANCE, HashIndex, cluster, to_hex, to_signed, to_unsigned
 
-# Sprawdź i utwórz katalog instance jeśli nie istnieje
-instance_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
-if not os.path.exists(instance_path):
-    os.makedirs(instance_path)
+# Import modułu tylko definiuje aplikację i konfigurację (ze zmiennych
+# środowiskowych); katalogi, ExifTool, baza i rozszerzenia przygotowywane są
+# raz, w create_app() - wywoływanej przez wsgi.py, serwer deweloperski i gunicorn.
+# OpenCV i ReportLab ładowane są przy pierwszym użyciu albo w warm_up().
+instance_path = os.environ.get('INSTANCE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance'))
 
 app = Flask(__name__, instance_path=instance_path)
-app.secret_key = 'supersecretkey'
+app.secret_key = os.environ.get('SECRET_KEY', 'supersecretkey')
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['PERMANENT_SESSION_LIFETIME'] = 1800  # 30 minut
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SECURE'] = False  # Zmienić na True w środowisku produkcyjnym
 
-# Inicjalizacja sesji Flask
-app.config['SESSION_TYPE'] = 'filesystem'
-app.config['SESSION_FILE_DIR'] = os.path.join(instance_path, 'flask_session')
+# Wyniki analiz trzymane są w bazie (AnalysisResult), a w sesji (ciasteczku)
+# zapisywany jest tylko identyfikator wyniku
+app.config['RESULT_TTL'] = int(os.environ.get('RESULT_TTL', app.config['PERMANENT_SESSION_LIFETIME']))
+app.config['RESULT_CLEANUP_INTERVAL'] = int(os.environ.get('RESULT_CLEANUP_INTERVAL', 300))
 
-# Sprawdź czy katalog sesji istnieje i jest pusty
-if os.path.exists(app.config['SESSION_FILE_DIR']):
-    # Usuń wszystkie pliki sesji
-    for file in os.listdir(app.config['SESSION_FILE_DIR']):
-        file_path = os.path.join(app.config['SESSION_FILE_DIR'], file)
-        try:
-            if os.path.isfile(file_path):
-                os.unlink(file_path)
-        except Exception as e:
-            print(f"Błąd podczas czyszczenia sesji: {e}")
-else:
-    # Jeśli katalog nie istnieje, utwórz go
-    os.makedirs(app.config['SESSION_FILE_DIR'])
-
-# Sprawdź i utwórz katalog uploaded_files jeśli nie istnieje
+# Katalog uploaded_files (tworzony w create_app)
 UPLOAD_FOLDER = 'uploaded_files'
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
 
 ALLOWED_EXTENSIONS = {'jpg', 'png', 'pdf', 'docx', 'odt', 'tiff', 'bmp', 'gif', 'pdf', 'epub', 'xlsx', 'pptx', 'mp3', 'wav', 'flac', 'mp4', 'avi', 'mov', 'mkv'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-EXIFTOOL_PATH = r"D:\LOAD\LOAD_APP_v2.1\uploaded_files\exiftool.exe"
+app.config['ALLOWED_EXTENSIONS'] = ALLOWED_EXTENSIONS
+app.config['ARCHIVE_UPLOAD_ENDPOINTS'] = ('analyze_bulk',)
+# Endpointy, w których odrzucony plik (typ, sygnatura, rozmiar) jest pomijany
+# i raportowany osobno zamiast przerywać całe żądanie
+app.config['BATCH_UPLOAD_ENDPOINTS'] = ('analyze_bulk',)
+# ExifTool: pełna ścieżka albo nazwa programu szukana w PATH
+app.config['EXIFTOOL_PATH'] = os.environ.get('EXIFTOOL_PATH', 'exiftool')
+
+# Pula procesów ExifTool (-stay_open) współdzielona przez wszystkie żądania
+# procesu; tworzona w create_app() po sprawdzeniu ścieżki. Bezczynne procesy
+# sprawdzane są w tle co EXIFTOOL_HEALTH_INTERVAL [s]
+app.config['EXIFTOOL_POOL_SIZE'] = int(os.environ.get('EXIFTOOL_POOL_SIZE', 4))
+app.config['EXIFTOOL_TIMEOUT'] = int(os.environ.get('EXIFTOOL_TIMEOUT', 120))
+app.config['EXIFTOOL_HEALTH_INTERVAL'] = int(os.environ.get('EXIFTOOL_HEALTH_INTERVAL', 30))
+exiftool_pool = None
+
+db = SQLAlchemy()
+
+def run_exiftool(args, timeout=None):
+    with stage('exiftool'):
+        return exiftool_pool.execute(args, timeout=timeout)
+
+# Cache metadanych adresowany treścią pliku (SHA-256)
+app.config['METADATA_CACHE_MAX_ENTRIES'] = int(os.environ.get('METADATA_CACHE_MAX_ENTRIES', 5000))
+app.config['METADATA_CACHE_MAX_BYTES'] = int(os.environ.get('METADATA_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Profil odczytu metadanych przy pierwszym wyświetleniu raportu, per rozszerzenie
+# (EXTRACTION_QUICK_EXTENSIONS="mp4,mov,..."); pozostałe typy czytane są w całości
+app.config['EXTRACTION_PROFILE_DEFAULTS'] = {
+    ext: PROFILE_QUICK
+    for ext in os.environ.get('EXTRACTION_QUICK_EXTENSIONS', ','.join(QUICK_EXTENSIONS)).split(',') if ext
+}
+
+# Magazyn plików adresowany treścią (bloby tylko do odczytu, pliki w
+# uploaded_files to twarde dowiązania) i retencja: bloby nieużywane dłużej
+# niż BLOB_RETENTION oraz najdawniej używane ponad BLOB_QUOTA_BYTES są usuwane
+app.config['BLOB_FOLDER'] = os.environ.get('BLOB_FOLDER', os.path.join(UPLOAD_FOLDER, '.blobs'))
+app.config['BLOB_QUOTA_BYTES'] = int(os.environ.get('BLOB_QUOTA_BYTES', 20 * 1024 ** 3))
+app.config['BLOB_RETENTION'] = int(os.environ.get('BLOB_RETENTION', 7 * 24 * 3600))
+app.config['BLOB_GC_INTERVAL'] = int(os.environ.get('BLOB_GC_INTERVAL', 600))
+# Magazyn tworzony w create_app(); blob_store.lock chroni dowiązywanie i usuwanie blobów
+blob_store = None
+
+class FileDigest(db.Model):
+    __tablename__ = 'file_digest'
+    path = db.Column(db.String(512), primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    size = db.Column(db.Integer, nullable=False)
+    mtime_ns = db.Column(db.Integer, nullable=False)
+
+class Blob(db.Model):
+    __tablename__ = 'blob'
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.Float, nullable=False)
+    last_used = db.Column(db.Float, nullable=False, index=True)
+
+class BlobVariant(db.Model):
+    # Wariant pochodny (np. plik bez metadanych) wyliczony z bloba source_sha256
+    __tablename__ = 'blob_variant'
+    source_sha256 = db.Column(db.String(64), primary_key=True)
+    operation = db.Column(db.String(255), primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    created_at = db.Column(db.Float, nullable=False)
+
+class MetadataCache(db.Model):
+    __tablename__ = 'metadata_cache'
+    sha256 = db.Column(db.String(64), primary_key=True)
+    kind = db.Column(db.String(32), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    last_access = db.Column(db.Float, nullable=False, index=True)
+
+class AnalysisJob(db.Model):
+    __tablename__ = 'analysis_job'
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(16), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    filepath = db.Column(db.String(512), nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+    case_name = db.Column(db.String(64))
+    created_at = db.Column(db.Float, nullable=False, index=True)
+    started_at = db.Column(db.Float)
+    finished_at = db.Column(db.Float)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'filename': self.filename,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+        }
+
+class AnalysisResult(db.Model):
+    __tablename__ = 'analysis_result'
+    id = db.Column(db.String(32), primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    filepath = db.Column(db.String(512), nullable=False)
+    sha256 = db.Column(db.String(64), index=True)
+    data = db.Column(db.Text, nullable=False)
+    origin_analysis = db.Column(db.Text)
+    profile = db.Column(db.String(16), nullable=False, default=PROFILE_FULL)
+    created_at = db.Column(db.Float, nullable=False, index=True)
+
+    @property
+    def record(self):
+        return MetadataRecord.from_json(self.data)
+
+class ChunkedUpload(db.Model):
+    __tablename__ = 'chunked_upload'
+    id = db.Column(db.String(32), primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    offset = db.Column(db.BigInteger, nullable=False, default=0)
+    expected_sha256 = db.Column(db.String(64))
+    sha256 = db.Column(db.String(64))
+    # Sesja, która rozpoczęła upload (uploader_id)
+    uploader = db.Column(db.String(32), index=True)
+    sniffed = db.Column(db.Boolean, nullable=False, default=False)
+    status = db.Column(db.String(16), nullable=False, index=True)
+    filepath = db.Column(db.String(512))
+    created_at = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float)
+
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'filename': self.filename,
+            'size': self.size,
+            'offset': self.offset,
+            'status': self.status,
+            'sha256': self.sha256,
+        }
+
+# Indeks metadanych spraw (case_index.py): kluczowe tagi w typowanych kolumnach
+# z indeksami, pełny tekst tagów w tabeli FTS5 metadata_index_fts (rowid = id)
+app.config['CASE_DEFAULT'] = os.environ.get('CASE_DEFAULT', 'default')
+app.config['CASE_INDEX_GPS_CELL'] = float(os.environ.get('CASE_INDEX_GPS_CELL', 0.01))
+app.config['CASE_INDEX_MAX_RESULTS'] = int(os.environ.get('CASE_INDEX_MAX_RESULTS', 1000))
+
+class IndexedFile(db.Model):
+    __tablename__ = 'metadata_index'
+    __table_args__ = (
+        db.UniqueConstraint('case_name', 'sha256', 'filename'),
+        db.Index('ix_metadata_index_case_serial', 'case_name', 'serial_number', 'taken_at'),
+        db.Index('ix_metadata_index_case_camera', 'case_name', 'make', 'model', 'taken_at'),
+        db.Index('ix_metadata_index_case_lens', 'case_name', 'lens_model', 'taken_at'),
+        db.Index('ix_metadata_index_case_software', 'case_name', 'software', 'taken_at'),
+        db.Index('ix_metadata_index_case_author', 'case_name', 'author', 'taken_at'),
+        db.Index('ix_metadata_index_case_gps', 'case_name', 'gps_cell', 'taken_at'),
+        db.Index('ix_metadata_index_case_sha256', 'case_name', 'sha256', 'taken_at'),
+        db.Index('ix_metadata_index_case_taken', 'case_name', 'taken_at'),
+        db.Index('ix_metadata_index_position', 'gps_lat', 'gps_lon'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    case_name = db.Column(db.String(64), nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    filepath = db.Column(db.String(512), nullable=False)
+    profile = db.Column(db.String(16), nullable=False, default=PROFILE_FULL)
+    indexed_at = db.Column(db.Float, nullable=False)
+    make = db.Column(db.String(255, collation='NOCASE'))
+    model = db.Column(db.String(255, collation='NOCASE'))
+    serial_number = db.Column(db.String(255, collation='NOCASE'))
+    lens_model = db.Column(db.String(255, collation='NOCASE'))
+    software = db.Column(db.String(255, collation='NOCASE'))
+    author = db.Column(db.String(255, collation='NOCASE'))
+    taken_at = db.Column(db.String(19))
+    modified_at = db.Column(db.String(19))
+    gps_lat = db.Column(db.Float)
+    gps_lon = db.Column(db.Float)
+    gps_cell = db.Column(db.String(32))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'case': self.case_name,
+            'filename': self.filename,
+            'path': os.path.relpath(self.filepath, app.config['UPLOAD_FOLDER']).replace(os.sep, '/'),
+            'sha256': self.sha256,
+            'profile': self.profile,
+            'indexed_at': self.indexed_at,
+            'make': self.make,
+            'model': self.model,
+            'serial_number': self.serial_number,
+            'lens_model': self.lens_model,
+            'software': self.software,
+            'author': self.author,
+            'taken_at': self.taken_at,
+            'modified_at': self.modified_at,
+            'gps': [self.gps_lat, self.gps_lon] if self.gps_lat is not None else None,
+            'gps_cell': self.gps_cell,
+        }
+
+# Skróty percepcyjne obrazów (near_duplicates.py) - po jednym wierszu na treść,
+# 64-bitowe wartości zapisane ze znakiem (INTEGER w SQLite)
+app.config['NEAR_DUPLICATE_DISTANCE'] = int(os.environ.get('NEAR_DUPLICATE_DISTANCE', 10))
+app.config['NEAR_DUPLICATE_MAX_RESULTS'] = int(os.environ.get('NEAR_DUPLICATE_MAX_RESULTS', 20))
+
+class ImageHash(db.Model):
+    __tablename__ = 'image_hash'
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    ahash = db.Column(db.BigInteger, nullable=False)
+    dhash = db.Column(db.BigInteger, nullable=False)
+    phash = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.Float, nullable=False)
+
+def add_missing_columns(table, columns):
+    # create_all nie dodaje kolumn do istniejących tabel
+    existing = {column['name'] for column in db.inspect(db.engine).get_columns(table)}
+    with db.engine.begin() as connection:
+        for name, definition in columns.items():
+            if name not in existing:
+                connection.execute(db.text(f"ALTER TABLE {table} ADD COLUMN {name} {definition}"))
+
+def init_database():
+    db.create_all()
+    add_missing_columns('analysis_result', {'profile': f"VARCHAR(16) NOT NULL DEFAULT '{PROFILE_FULL}'"})
+    add_missing_columns('analysis_job', {'case_name': "VARCHAR(64)"})
+    add_missing_columns('chunked_upload', {'uploader': "VARCHAR(32)"})
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(db.text("CREATE VIRTUAL TABLE IF NOT EXISTS metadata_index_fts USING fts5(filename, body, tokenize='unicode61 remove_diacritics 2')"))
+        app.config['CASE_INDEX_FTS'] = True
+    except Exception as e:
+        # SQLite bez FTS5: działają tylko zapytania po typowanych kolumnach
+        print(f"Wyszukiwanie pełnotekstowe niedostępne: {e}")
+        app.config['CASE_INDEX_FTS'] = False
+
+def prepare_folders():
+    for folder in (app.instance_path, app.config['UPLOAD_FOLDER']):
+        os.makedirs(folder, exist_ok=True)
+    # Sprawdzenie uprawnień do folderu
+    test_file = os.path.join(app.config['UPLOAD_FOLDER'], f"test_{os.getpid()}.txt")
+    try:
+        with open(test_file, 'w') as f:
+            f.write('Test')
+        os.remove(test_file)
+    except OSError as e:
+        raise RuntimeError(f"Błąd uprawnień do folderu {app.config['UPLOAD_FOLDER']}: {e}")
+
+def check_exiftool(path):
+    # Pełna ścieżka albo nazwa programu w PATH; zwraca ścieżkę do uruchomienia
+    executable = path if os.path.dirname(path) else shutil.which(path) or path
+    if not os.path.exists(executable):
+        raise RuntimeError(f"Plik ExifTool nie istnieje w ścieżce: {path}")
+    if not os.access(executable, os.X_OK):
+        raise RuntimeError(f"Plik ExifTool nie ma uprawnień do wykonywania: {path}")
+    return executable
+
+init_lock = threading.Lock()
+
+def create_app(config=None):
+    # Jednorazowa inicjalizacja aplikacji; config (słownik) nadpisuje ustawienia
+    # ze zmiennych środowiskowych. Kolejne wywołania zwracają gotową aplikację.
+    global exiftool_pool, blob_store
+    with init_lock:
+        if 'sqlalchemy' in app.extensions:
+            return app
+        app.config.update(config or {})
+        prepare_folders()
+        exiftool_pool = ExifToolPool(
+            check_exiftool(app.config['EXIFTOOL_PATH']),
+            size=app.config['EXIFTOOL_POOL_SIZE'],
+            timeout=app.config['EXIFTOOL_TIMEOUT'],
+            health_interval=app.config['EXIFTOOL_HEALTH_INTERVAL']
+        )
+        blob_store = BlobStore(app.config['BLOB_FOLDER'])
+        db.init_app(app)
+        # Metryki (/metrics), pomiary etapów i profiler próbkujący
+        metrics.init_app(app)
+        # Strumieniowe przyjmowanie plików z limitami rozmiaru i sprawdzaniem sygnatur
+        uploads.init_app(app)
+        with app.app_context():
+            init_database()
+    return app
+
+metrics.register(metrics.Gauge('load_exiftool_pool', "Stan puli procesów ExifTool.", lambda: exiftool_pool.stats(), 'state', per_process=True))
+metrics.register(metrics.Gauge('load_blob_store', "Zawartość magazynu plików.", lambda: blob_store_stats(), 'state'))
+
+def remember_digest(filepath, sha256, commit=True):
+    # INSERT ... ON CONFLICT zamiast odczytu i wstawienia - równoległe uploady
+    # tego samego pliku nie kończą się błędem UNIQUE
+    stat = os.stat(filepath)
+    insert = sqlite_insert(FileDigest).values(path=filepath, sha256=sha256, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    db.session.execute(insert.on_conflict_do_update(index_elements=[FileDigest.path], set_={
+        'sha256': insert.excluded.sha256, 'size': insert.excluded.size, 'mtime_ns': insert.excluded.mtime_ns,
+    }))
+    if commit:
+        db.session.commit()
+
+def register_blob(sha256):
+    now = time.time()
+    insert = sqlite_insert(Blob).values(sha256=sha256, size=blob_store.size(sha256), created_at=now, last_used=now)
+    db.session.execute(insert.on_conflict_do_update(index_elements=[Blob.sha256], set_={'last_used': now}))
+
+def store_blob(temp_path, sha256, filepath, commit=True):
+    # Plik tymczasowy trafia do magazynu (albo jest usuwany, jeśli ta treść już
+    # tam jest), a pod filepath pojawia się dowiązanie do bloba
+    with blob_store.lock:
+        blob_store.put_file(temp_path, sha256)
+        link_blob(sha256, filepath)
+    remember_digest(filepath, sha256, commit=commit)
+    return sha256
+
+def link_blob(sha256, filepath):
+    blob_store.link(sha256, filepath)
+    register_blob(sha256)
+
+def save_stream(stream, filepath, commit=True, head=b''):
+    # Zapis z jednoczesnym liczeniem SHA-256 (bez ponownego czytania z dysku);
+    # head - początek pliku przeczytany już wcześniej (np. do sprawdzenia sygnatury)
+    sha256, temp_path = blob_store.write_temp(stream, head)
+    return store_blob(temp_path, sha256, filepath, commit=commit)
+
+def store_stream(stream, filepath, commit=True):
+    # Plik przyjęty przez IngestFile jest już na dysku i ma policzony hash -
+    # wystarczy go przenieść do magazynu
+    if isinstance(stream, IngestFile):
+        sha256, temp_path = stream.commit()
+        return store_blob(temp_path, sha256, filepath, commit=commit)
+    return save_stream(stream, filepath, commit=commit)
+
+def save_upload(file, filepath):
+    with stage('upload_save'):
+        return store_stream(file.stream, filepath)
+
+def file_sha256(filepath):
+    # Hash z bazy, o ile plik nie zmienił się od ostatniego liczenia
+    stat = os.stat(filepath)
+    entry = db.session.get(FileDigest, filepath)
+    if entry is not None and entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns:
+        return entry.sha256
+    sha256 = hash_file(filepath)
+    remember_digest(filepath, sha256)
+    return sha256
+
+def evict_metadata_cache():
+    max_entries = app.config['METADATA_CACHE_MAX_ENTRIES']
+    max_bytes = app.config['METADATA_CACHE_MAX_BYTES']
+    count, total = db.session.query(db.func.count(MetadataCache.sha256), db.func.coalesce(db.func.sum(MetadataCache.size), 0)).one()
+    if count <= max_entries and total <= max_bytes:
+        return
+    # Usuwanie najdawniej używanych wpisów (LRU)
+    for entry in MetadataCache.query.order_by(MetadataCache.last_access).yield_per(100):
+        if count <= max_entries and total <= max_bytes:
+            break
+        count -= 1
+        total -= entry.size
+        db.session.delete(entry)
+    db.session.commit()
+
+def metadata_cache_kind(tags=None, profile=PROFILE_FULL):
+    prefix = 'json' if profile == PROFILE_FULL else profile
+    if not tags:
+        return prefix
+    return prefix + ':' + hashlib.sha1(','.join(sorted(tags)).encode('utf-8')).hexdigest()[:16]
+
+def default_profile(filename):
+    return app.config['EXTRACTION_PROFILE_DEFAULTS'].get(file_extension(filename), PROFILE_FULL)
+
+def requested_profile(filename=None):
+    # Profil z formularza/zapytania (?profile=quick|full) albo domyślny dla typu pliku
+    profile = request.values.get('profile')
+    if profile in PROFILE_ARGS:
+        return profile
+    return default_profile(filename) if filename else PROFILE_FULL
+
+def cached_metadata(sha256, kind='json'):
+    entry = db.session.get(MetadataCache, (sha256, kind))
+    if entry is None:
+        return None
+    entry.last_access = time.time()
+    return MetadataRecord.from_json(entry.data)
+
+def store_metadata(sha256, record, kind='json'):
+    # Upsert - ten sam odczyt mogą równolegle zapisywać inne żądania
+    data = record.to_json()
+    values = dict(data=data, size=len(data.encode('utf-8')), last_access=time.time())
+    db.session.execute(sqlite_insert(MetadataCache).values(sha256=sha256, kind=kind, **values).on_conflict_do_update(
+        index_elements=[MetadataCache.sha256, MetadataCache.kind], set_=values
+    ))
+
+def read_metadata(filepath, sha256=None, tags=None, profile=PROFILE_FULL):
+    # Zwraca MetadataRecord; tags ogranicza odczyt do wybranych tagów,
+    # profile wybiera szybki (quick) lub pełny (full) odczyt
+    sha256 = sha256 or file_sha256(filepath)
+    tags = sorted(tags) if tags else []
+    kind = metadata_cache_kind(tags, profile)
+    record = cached_metadata(sha256, kind)
+    if record is None and profile != PROFILE_FULL and not tags:
+        # Pełny odczyt z cache jest lepszy od szybkiego
+        record = cached_metadata(sha256, metadata_cache_kind())
+    if record is not None:
+        db.session.commit()
+    else:
+        process = run_exiftool(EXIFTOOL_JSON_ARGS + ["--System:all"] + profile_args(profile, tags) + [filepath])
+        if process.returncode != 0:
+            raise ExifToolError(process.stderr.strip() or f"ExifTool zakończył się kodem {process.returncode}")
+        record = MetadataRecord.from_exiftool_json(process.stdout)
+        store_metadata(sha256, record, kind)
+        db.session.commit()
+        evict_metadata_cache()
+    record = system_tags(filepath) + record
+    return record.select(tags=tags) if tags else record
 
-# Sprawdzenie czy plik ExifTool istnieje
-if not os.path.exists(EXIFTOOL_PATH):
-    print(f"Błąd: Plik ExifTool nie istnieje w ścieżce: {EXIFTOOL_PATH}")
-    exit(1)
+def read_metadata_batch(files, chunk_size=None, profile=PROFILE_FULL):
+    # files: {ścieżka: sha256}. Pliki spoza cache czytane są jednym
+    # wywołaniem ExifTool na paczkę, a paczki rozkładane na procesy puli.
+    chunk_size = chunk_size or app.config['BULK_EXIFTOOL_CHUNK']
+    kind = metadata_cache_kind(profile=profile)
+    records, errors = {}, {}
+    missing = []
+    for filepath, sha256 in files.items():
+        record = cached_metadata(sha256, kind)
+        if record is None and profile != PROFILE_FULL:
+            record = cached_metadata(sha256)
+        if record is not None:
+            records[filepath] = record
+        else:
+            missing.append(filepath)
+
+    def run_chunk(chunk):
+        process = run_exiftool(EXIFTOOL_JSON_ARGS + ["--System:all"] + profile_args(profile) + chunk)
+        try:
+            parsed = parse_exiftool_json(process.stdout)
+            # ExifTool zwraca SourceFile z ukośnikami "/" także na Windows
+            return {os.path.normpath(path): record for path, record in parsed.items()}, process.stderr
+        except ValueError:
+            return {}, process.stderr
+
+    chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+    if chunks:
+        with ThreadPoolExecutor(max_workers=min(len(chunks), app.config['EXIFTOOL_POOL_SIZE'])) as executor:
+            for chunk, (parsed, stderr) in zip(chunks, executor.map(run_chunk, chunks)):
+                for filepath in chunk:
+                    record = parsed.get(os.path.normpath(filepath))
+                    error = record.get('ExifTool:Error') if record is not None else None
+                    if record is None or error is not None:
+                        errors[filepath] = error.value if error is not None else (stderr.strip() or "Brak metadanych")
+                        continue
+                    store_metadata(files[filepath], record, kind)
+                    records[filepath] = record
+    db.session.commit()
+    evict_metadata_cache()
+    return {filepath: system_tags(filepath) + record for filepath, record in records.items()}, errors
+
+app.config['SANITIZE_CHUNK'] = int(os.environ.get('SANITIZE_CHUNK', 200))
+# Przedrostki plików pochodnych obok oryginału
+VARIANT_PREFIXES = ('clean_', 'export_')
+
+def variant_path(filepath, prefix):
+    return os.path.join(os.path.dirname(filepath), prefix + os.path.basename(filepath))
+
+def derive_variants(items, policy):
+    # items: [(ścieżka_źródła, ścieżka_wyniku)]. Warianty pochodne (oryginał
+    # pozostaje nietknięty) zapisywane są jednym wywołaniem ExifTool -o na paczkę,
+    # a paczki rozkładane na procesy puli. Każdy wynik powstaje w katalogu
+    # tymczasowym i dopiero gotowy trafia do magazynu i pod ścieżkę docelową.
+    # Ta sama polityka na tej samej treści liczona jest raz.
+    # Zwraca {ścieżka_wyniku: {'status': 'cleaned'|'failed', 'sha256'|'error': ...}}
+    operation = policy.operation
+    results, pending = {}, {}
+    for source, target in items:
+        try:
+            source_sha256 = file_sha256(source)
+        except OSError as e:
+            results[target] = {'status': 'failed', 'error': str(e)}
+            continue
+        variant = db.session.get(BlobVariant, (source_sha256, operation))
+        with blob_store.lock:
+            cached = variant is not None and blob_store.exists(variant.sha256)
+            if cached:
+                link_blob(variant.sha256, target)
+        if cached:
+            remember_digest(target, variant.sha256, commit=False)
+            results[target] = {'status': 'cleaned', 'sha256': variant.sha256, 'cached': True}
+        else:
+            pending.setdefault(source_sha256, (source, []))[1].append(target)
+
+    def run_chunk(chunk):
+        # Wejścia jako dowiązania o unikalnych nazwach (różne katalogi mogą mieć
+        # pliki o tej samej nazwie), wyniki w out/ pod tą samą nazwą
+        folder = tempfile.mkdtemp(dir=blob_store.temp_folder)
+        in_folder, out_folder = os.path.join(folder, 'in'), os.path.join(folder, 'out')
+        os.makedirs(in_folder)
+        os.makedirs(out_folder)
+        outcome, inputs = {}, {}
+        for index, (source_sha256, source) in enumerate(chunk):
+            path = os.path.join(in_folder, f"{index}{os.path.splitext(source)[1]}")
+            try:
+                link_or_copy(source, path)
+                inputs[source_sha256] = path
+            except OSError as e:
+                outcome[source_sha256] = (None, None, str(e))
+        if not inputs:
+            return folder, outcome
+        try:
+            process = run_exiftool(policy.args() + ["-o", os.path.join(out_folder, "%f.%e")] + list(inputs.values()))
+        except ExifToolError as e:
+            outcome.update((source_sha256, (None, None, str(e))) for source_sha256 in inputs)
+            return folder, outcome
+        errors = errors_by_file(process.stderr, inputs.values())
+        for source_sha256, path in inputs.items():
+            output = os.path.join(out_folder, os.path.basename(path))
+            if os.path.exists(output):
+                outcome[source_sha256] = (output, hash_file(output), None)
+            else:
+                outcome[source_sha256] = (None, None, errors.get(path) or process.stderr.strip() or f"ExifTool zakończył się kodem {process.returncode}")
+        return folder, outcome
+
+    work = [(source_sha256, source) for source_sha256, (source, _) in pending.items()]
+    chunk_size = app.config['SANITIZE_CHUNK']
+    chunks = [work[i:i + chunk_size] for i in range(0, len(work), chunk_size)]
+    if chunks:
+        with ThreadPoolExecutor(max_workers=min(len(chunks), app.config['EXIFTOOL_POOL_SIZE'])) as executor:
+            for folder, outcome in executor.map(run_chunk, chunks):
+                try:
+                    for source_sha256, (output, sha256, error) in outcome.items():
+                        targets = pending[source_sha256][1]
+                        if output is None:
+                            results.update((target, {'status': 'failed', 'error': error}) for target in targets)
+                            continue
+                        db.session.merge(BlobVariant(source_sha256=source_sha256, operation=operation, sha256=sha256, created_at=time.time()))
+                        store_blob(output, sha256, targets[0], commit=False)
+                        for target in targets[1:]:
+                            with blob_store.lock:
+                                link_blob(sha256, target)
+                            remember_digest(target, sha256, commit=False)
+                        results.update((target, {'status': 'cleaned', 'sha256': sha256}) for target in targets)
+                finally:
+                    shutil.rmtree(folder, ignore_errors=True)
+    db.session.commit()
+    return results
+
+def derive_variant(source_path, policy, filepath):
+    # Pojedynczy plik; zwraca opis błędu albo None
+    return derive_variants([(source_path, filepath)], policy)[filepath].get('error')
+
+def stored_path(name):
+    # Ścieżka w uploaded_files wskazana przez klienta; katalogi magazynu
+    # (.blobs, .incoming) i ścieżki spoza katalogu są niedostępne
+    if not isinstance(name, str) or not name:
+        return None
+    parts = name.replace('\\', '/').split('/')
+    if any(part.startswith('.') for part in parts):
+        return None
+    return safe_join(app.config['UPLOAD_FOLDER'], *parts)
+
+def blob_store_stats():
+    count, total = db.session.query(db.func.count(Blob.sha256), db.func.coalesce(db.func.sum(Blob.size), 0)).one()
+    return {'blobs': count, 'bytes': total, 'quota_bytes': app.config['BLOB_QUOTA_BYTES']}
+
+def remove_blob(blob):
+    # Usuwa blob razem z jego dowiązaniami w uploaded_files. Zwraca False, gdy
+    # blob ma dowiązania nieznane bazie (np. upload w toku) i musi zostać.
+    with blob_store.lock:
+        path = blob_store.path(blob.sha256)
+        views = FileDigest.query.filter_by(sha256=blob.sha256).all()
+        links = [view for view in views if blob_store.is_link(blob.sha256, view.path)]
+        if os.path.exists(path) and os.stat(path).st_nlink > 1 + len(links):
+            return False
+        for view in views:
+            if view in links or os.path.exists(view.path) and hash_file(view.path) == blob.sha256:
+                remove_view(view.path)
+                folder = os.path.dirname(view.path)
+                # Puste katalogi paczek i zadań (bulk_*, job_*)
+                if os.path.abspath(folder) != os.path.abspath(app.config['UPLOAD_FOLDER']):
+                    try:
+                        os.rmdir(folder)
+                    except OSError:
+                        pass
+            db.session.delete(view)
+        BlobVariant.query.filter(db.or_(BlobVariant.source_sha256 == blob.sha256, BlobVariant.sha256 == blob.sha256)).delete()
+        blob_store.remove(blob.sha256)
+        db.session.delete(blob)
+    return True
+
+def collect_blobs():
+    # Bloby potrzebne oczekującym zadaniom i zapisanym wynikom analiz są pomijane
+    now = time.time()
+    cutoff = now - app.config['BLOB_RETENTION']
+    quota = app.config['BLOB_QUOTA_BYTES']
+    protected = {sha256 for (sha256,) in db.session.query(AnalysisJob.sha256).filter(AnalysisJob.status.in_(('queued', 'running')))}
+    protected |= {sha256 for (sha256,) in db.session.query(AnalysisResult.sha256).filter(AnalysisResult.sha256.isnot(None))}
+    total = blob_store_stats()['bytes']
+    removed = 0
+    # Od najdawniej używanych (LRU)
+    for blob in Blob.query.order_by(Blob.last_used).all():
+        if blob.last_used >= cutoff and total <= quota:
+            break
+        if blob.sha256 in protected:
+            continue
+        size = blob.size
+        if remove_blob(blob):
+            total -= size
+            removed += 1
+    # Porzucone uploady wznawialne
+    for upload in ChunkedUpload.query.filter(ChunkedUpload.status == 'uploading', db.func.coalesce(ChunkedUpload.updated_at, ChunkedUpload.created_at) < cutoff).all():
+        discard_upload(upload)
+    db.session.commit()
+    return removed
+
+def collect_blobs_loop():
+    # Pętla działa w każdym workerze gunicorna; sprząta tylko ten, który zajmie
+    # blokadę - pozostałe pomijają ten przebieg
+    while True:
+        time.sleep(app.config['BLOB_GC_INTERVAL'])
+        if not blob_store.gc_lock.acquire(blocking=False):
+            continue
+        try:
+            with app.app_context():
+                collect_blobs()
+        except Exception as e:
+            print(f"Błąd podczas sprzątania magazynu plików: {e}")
+        finally:
+            blob_store.gc_lock.release()
+
+def save_result(filename, filepath, sha256, record, origin_analysis, profile=PROFILE_FULL, case_name=None):
+    with stage('result_store'):
+        return _save_result(filename, filepath, sha256, record, origin_analysis, profile, case_name)
+
+def _save_result(filename, filepath, sha256, record, origin_analysis, profile=PROFILE_FULL, case_name=None):
+    result = AnalysisResult(
+        id=uuid.uuid4().hex,
+        filename=filename,
+        filepath=filepath,
+        sha256=sha256,
+        data=record.to_json(),
+        origin_analysis=origin_analysis,
+        profile=profile,
+        created_at=time.time()
+    )
+    db.session.add(result)
+    index_files(case_name or requested_case(), [(filename, filepath, sha256, record, profile)])
+    db.session.commit()
+    session['result_id'] = result.id
+    return result
+
+def requested_case():
+    # Sprawa z formularza/zapytania (?case=...) albo domyślna
+    case_name = ' '.join((request.values.get('case') or '').split())[:64]
+    return case_name or app.config['CASE_DEFAULT']
+
+def index_files(case_name, items):
+    # items: [(nazwa, ścieżka, sha256, MetadataRecord, profil)]. Dodaje lub
+    # odświeża wpisy indeksu sprawy (bez commit); istniejące wpisy wczytywane paczkami.
+    # Brakujące wpisy wstawiane z ON CONFLICT DO NOTHING - ten sam plik mogą
+    # równolegle indeksować inne żądania - i wczytywane ponownie
+    existing = load_index_entries(case_name, {item[2] for item in items})
+    now = time.time()
+    missing = {(sha256, filename): dict(case_name=case_name, sha256=sha256, filename=filename,
+                                        filepath=filepath, profile=profile, indexed_at=now)
+               for filename, filepath, sha256, _, profile in items if (sha256, filename) not in existing}
+    if missing:
+        db.session.execute(sqlite_insert(IndexedFile).on_conflict_do_nothing(
+            index_elements=[IndexedFile.case_name, IndexedFile.sha256, IndexedFile.filename]
+        ), list(missing.values()))
+        existing.update(load_index_entries(case_name, {sha256 for sha256, _ in missing}))
+    entries = []
+    for filename, filepath, sha256, record, profile in items:
+        entry = existing[(sha256, filename)]
+        entry.filepath = filepath
+        update_index_entry(entry, record, profile)
+        entries.append((entry, record))
+    db.session.flush()
+    index_text(entries)
+    return [entry for entry, _ in entries]
+
+def load_index_entries(case_name, hashes):
+    # {(sha256, nazwa): IndexedFile} dla treści sprawy, wczytywane paczkami
+    entries = {}
+    hashes = sorted(hashes)
+    for i in range(0, len(hashes), 500):
+        for entry in IndexedFile.query.filter(IndexedFile.case_name == case_name, IndexedFile.sha256.in_(hashes[i:i + 500])):
+            entries[(entry.sha256, entry.filename)] = entry
+    return entries
+
+def update_index_entry(entry, record, profile):
+    entry.profile = profile
+    entry.indexed_at = time.time()
+    for column, value in case_index.index_fields(record, app.config['CASE_INDEX_GPS_CELL']).items():
+        setattr(entry, column, value)
+
+def index_text(entries):
+    if not app.config['CASE_INDEX_FTS'] or not entries:
+        return
+    db.session.execute(db.text("DELETE FROM metadata_index_fts WHERE rowid = :id"), [{'id': entry.id} for entry, _ in entries])
+    db.session.execute(db.text("INSERT INTO metadata_index_fts (rowid, filename, body) VALUES (:id, :filename, :body)"), [
+        {'id': entry.id, 'filename': entry.filename, 'body': case_index.document_text(record)} for entry, record in entries
+    ])
+
+def reindex_content(sha256, record):
+    # Po pełnym odczycie wpisy tej treści zaindeksowane z odczytu quick dostają komplet tagów
+    entries = [(entry, record) for entry in IndexedFile.query.filter_by(sha256=sha256, profile=PROFILE_QUICK)]
+    for entry, _ in entries:
+        update_index_entry(entry, record, PROFILE_FULL)
+    index_text(entries)
 
-# Sprawdzenie czy plik jest plikiem wykonywalnym
-if not os.access(EXIFTOOL_PATH, os.X_OK):
-    print(f"Błąd: Plik ExifTool nie ma uprawnień do wykonywania: {EXIFTOOL_PATH}")
-    exit(1)
+def analysis_engine():
+    # Silnik analizy obrazu (OpenCV) ładowany przy pierwszej analizie albo w warm_up()
+    import image_analysis
+    return image_analysis
 
-db = SQLAlchemy(app)
+hash_index = HashIndex()
+
+def refresh_hash_index():
+    # Dociąga skróty zapisane od ostatniego odczytu (także przez inne procesy)
+    rows = db.session.query(ImageHash.id, ImageHash.sha256, ImageHash.ahash, ImageHash.dhash, ImageHash.phash)
+    for row_id, sha256, *values in rows.filter(ImageHash.id > hash_index.last_id).order_by(ImageHash.id):
+        hash_index.add(sha256, dict(zip(HASH_NAMES, map(to_unsigned, values))), row_id)
+
+def store_hashes(items):
+    # items: {sha256: skróty albo None}; zapisuje skróty nowych treści (bez commit).
+    # ON CONFLICT DO NOTHING - tę samą treść mogą równolegle zapisywać inne żądania
+    now = time.time()
+    rows = [dict(sha256=sha256, created_at=now, **{name: to_signed(hashes[name]) for name in HASH_NAMES})
+            for sha256, hashes in sorted(items.items()) if hashes]
+    if rows:
+        db.session.execute(sqlite_insert(ImageHash).on_conflict_do_nothing(index_elements=[ImageHash.sha256]), rows)
+
+def files_by_content(hashes, case_name=None):
+    # {sha256: [{'case', 'filename', 'path'}]} z indeksu spraw
+    files = {}
+    hashes = sorted(hashes)
+    for i in range(0, len(hashes), 500):
+        query = IndexedFile.query.filter(IndexedFile.sha256.in_(hashes[i:i + 500]))
+        if case_name is not None:
+            query = query.filter(IndexedFile.case_name == case_name)
+        for entry in query.order_by(IndexedFile.indexed_at, IndexedFile.id):
+            item = entry.to_dict()
+            files.setdefault(entry.sha256, []).append({key: item[key] for key in ('case', 'filename', 'path')})
+    return files
+
+def near_duplicates(sha256, hashes, distance=None, limit=None):
+    # Bliskie duplikaty treści wśród wszystkich dotąd przeanalizowanych obrazów
+    if not hashes:
+        return []
+    with stage('near_duplicates'):
+        refresh_hash_index()
+        distance = app.config['NEAR_DUPLICATE_DISTANCE'] if distance is None else distance
+        matches = hash_index.search(hashes, distance, exclude=sha256)[:limit or app.config['NEAR_DUPLICATE_MAX_RESULTS']]
+        files = files_by_content(key for key, _ in matches)
+    return [{'sha256': key, 'distances': distances, 'files': files.get(key, [])} for key, distances in matches]
+
+def current_result():
+    result_id = session.get('result_id')
+    if not result_id:
+        return None
+    return db.session.get(AnalysisResult, result_id)
+
+def full_result_record(result):
+    # Wynik zapisany po szybkim odczycie uzupełniany jest pełnym przy pierwszej
+    # potrzebie (rozwinięcie sekcji raportu, pobranie TXT/PDF)
+    if result.profile == PROFILE_FULL:
+        return result.record
+    filepath = result.filepath
+    if not os.path.exists(filepath) or file_sha256(filepath) != result.sha256:
+        # Pod tą nazwą wgrano w międzyczasie inny plik - odczyt z bloba
+        filepath = blob_store.path(result.sha256)
+    try:
+        with stage('metadata_full'):
+            record = read_metadata(filepath, result.sha256)
+    except (ExifToolError, OSError) as e:
+        print(f"Błąd podczas pełnego odczytu metadanych: {e}")
+        return result.record
+    if filepath != result.filepath:
+        # Tagi System (nazwa, katalog, daty) z pierwotnego odczytu, nie z bloba
+        record = result.record.select(groups=['System']) + record.select(groups=[group for group in record.groups() if group != 'System'])
+    result.data = record.to_json()
+    result.profile = PROFILE_FULL
+    reindex_content(result.sha256, record)
+    db.session.commit()
+    return record
+
+def cleanup_results():
+    # Usuwanie wyników starszych niż RESULT_TTL (w tle, zamiast czyszczenia przy starcie)
+    while True:
+        time.sleep(app.config['RESULT_CLEANUP_INTERVAL'])
+        try:
+            with app.app_context():
+                cutoff = time.time() - app.config['RESULT_TTL']
+                AnalysisResult.query.filter(AnalysisResult.created_at < cutoff).delete()
+                db.session.commit()
+        except Exception as e:
+            print(f"Błąd podczas czyszczenia wyników: {e}")
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -87,32 +869,27 @@ def analyze():
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
             filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-            if not os.path.exists(filepath):
-                flash(f"Plik {filepath} nie istnieje lub jest niedostępny.", "danger")
-                return redirect(url_for('analyze'))
+            sha256 = save_upload(file, filepath)
+            profile = requested_profile(filename)
             try:
                 # Najpierw sprawdź metadane
-                process = subprocess.run(
-                    [EXIFTOOL_PATH, filepath],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    encoding='utf-8'
-                )
-                if process.returncode != 0:
-                    flash(f"Błąd odczytu metadanych: {process.stderr}", "danger")
+                try:
+                    record = read_metadata(filepath, sha256, profile=profile)
+                except ExifToolError as e:
+                    flash(f"Błąd odczytu metadanych: {e}", "danger")
                     return redirect(url_for('analyze'))
                 
-                metadata = process.stdout.splitlines()
-                origin_analysis = analyze_image_origin(filepath)
+                with stage('origin_analysis'):
+                    origin_analysis, hashes = analysis_engine().analyze_image(filepath)
+                # Porównanie z wcześniej przeanalizowanymi obrazami (ponowne kodowanie, zmiana rozmiaru)
+                duplicates = near_duplicates(sha256, hashes)
+                store_hashes({sha256: hashes})
                 
-                # Zapisz metadane do sesji
-                session['metadata'] = metadata
-                session['filename'] = filename
-                session['filepath'] = filepath
+                # Zapisz wynik w bazie, w sesji tylko jego ID
+                save_result(filename, filepath, sha256, record, origin_analysis, profile)
                 
-                return render_template('report.html', filename=filename, metadata=metadata, origin_analysis=origin_analysis)
+                return render_template('report.html', filename=filename, metadata=record.lines(), record=record, origin_analysis=origin_analysis,
+                                       profile=profile, full_metadata_url=url_for('result_metadata'), near_duplicates=duplicates)
             except Exception as e:
                 flash(f"Błąd podczas analizy pliku: {e}", "danger")
                 return redirect(url_for('analyze'))
@@ -121,53 +898,515 @@ def analyze():
             return redirect(request.url)
     return render_template('analyze.html')
 
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-import cv2
-import numpy as np
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+app.config['BULK_MAX_FILES'] = int(os.environ.get('BULK_MAX_FILES', 10000))
+app.config['BULK_EXIFTOOL_CHUNK'] = int(os.environ.get('BULK_EXIFTOOL_CHUNK', 500))
+app.config['BULK_ANALYSIS_WORKERS'] = int(os.environ.get('BULK_ANALYSIS_WORKERS', os.cpu_count() or 1))
+
+def unique_name(name, used):
+    # Unikalna nazwa w obrębie paczki (różne katalogi archiwum mogą mieć pliki o tej samej nazwie)
+    base, ext = os.path.splitext(name)
+    candidate, counter = name, 1
+    while candidate in used:
+        counter += 1
+        candidate = f"{base}_{counter}{ext}"
+    used.add(candidate)
+    return candidate
+
+def iter_bulk_members(files):
+    # Zwraca (nazwa, strumień, rozmiar) dla każdego pliku z uploadu lub z archiwum,
+    # bez rozpakowywania całości do pamięci. Rozmiar członka archiwum pochodzi
+    # z nagłówka - zipfile i tarfile nie odczytają więcej, niż on deklaruje;
+    # pliki z uploadu (rozmiar None) ogranicza już IngestFile. Pliki, które
+    # IngestFile odrzucił, zwracane są bez otwierania - jako pominięte
+    for file in files:
+        lower = file.filename.lower()
+        if isinstance(file.stream, IngestFile) and file.stream.rejected:
+            yield file.filename, file.stream, None
+        elif lower.endswith('.zip'):
+            with zipfile.ZipFile(file.stream) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir():
+                        with archive.open(info) as member:
+                            yield info.filename, member, info.file_size
+        elif lower.endswith(ARCHIVE_EXTENSIONS):
+            # Tryb strumieniowy "r|*" nie wymaga przewijania pliku
+            with tarfile.open(fileobj=file.stream, mode='r|*') as archive:
+                for member in archive:
+                    if member.isfile():
+                        yield member.name, archive.extractfile(member), member.size
+        else:
+            yield file.filename, file.stream, None
+
+def discard_batch(batch_folder, sha256s):
+    # Przerwana paczka: jej katalog z dowiązaniami i bloby, które zapisała tylko ona
+    # (bez wiersza Blob i bez innych dowiązań) - inaczej nie usunęłoby ich nawet GC
+    db.session.rollback()
+    shutil.rmtree(batch_folder, ignore_errors=True)
+    with blob_store.lock:
+        for sha256 in set(sha256s):
+            path = blob_store.path(sha256)
+            if db.session.get(Blob, sha256) is None and os.path.exists(path) and os.stat(path).st_nlink == 1:
+                blob_store.remove(sha256)
 
-def analyze_image_origin(filepath):
+@app.route('/analyze-bulk', methods=['POST'])
+def analyze_bulk():
+    files = [file for file in request.files.getlist('files') + request.files.getlist('file') if file.filename]
+    if not files:
+        return jsonify({'error': "Nie wybrano plików."}), 400
+
+    batch_id = uuid.uuid4().hex
+    batch_folder = os.path.join(app.config['UPLOAD_FOLDER'], f"bulk_{batch_id}")
+    os.makedirs(batch_folder)
+    results, stored, used = [], {}, set()
     try:
-        image = cv2.imread(filepath)
-        if image is None:
-            return "Nie udało się wczytać obrazu."
-        blur = cv2.Laplacian(image, cv2.CV_64F).var()
-        edges = cv2.Canny(image, 100, 200)
-        edge_density = np.sum(edges) / (image.shape[0] * image.shape[1])
-        if blur < 100 or edge_density > 0.3:
-            return "Obraz prawdopodobnie wygenerowany przez AI."
+        for name, stream, size in iter_bulk_members(files):
+            filename = secure_filename(os.path.basename(name))
+            if isinstance(stream, IngestFile) and stream.rejected:
+                results.append({'name': name, 'status': 'skipped', 'error': stream.rejected})
+                continue
+            if not filename or not allowed_file(filename):
+                results.append({'name': name, 'status': 'skipped', 'error': "Niedozwolony typ pliku."})
+                continue
+            limit = uploads.size_limit(file_extension(filename))
+            if size is not None and size > limit:
+                results.append({'name': name, 'status': 'skipped', 'error': f"Plik przekracza limit {limit // uploads.MB} MB dla typu .{file_extension(filename)}."})
+                continue
+            if len(stored) >= app.config['BULK_MAX_FILES']:
+                results.append({'name': name, 'status': 'skipped', 'error': "Przekroczono limit plików w paczce."})
+                continue
+            head = b''
+            if not isinstance(stream, IngestFile):
+                # Członkowie archiwum: sygnatura sprawdzana przed zapisem
+                head = stream.read(SNIFF_BYTES)
+                if not sniff(file_extension(filename), head):
+                    results.append({'name': name, 'status': 'skipped', 'error': "Zawartość pliku nie odpowiada rozszerzeniu."})
+                    continue
+            filepath = os.path.join(batch_folder, unique_name(filename, used))
+            if head:
+                stored[filepath] = save_stream(stream, filepath, commit=False, head=head)
+            else:
+                stored[filepath] = store_stream(stream, filepath, commit=False)
+            results.append({'name': name, 'path': filepath, 'sha256': stored[filepath]})
+        db.session.commit()
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError) as e:
+        discard_batch(batch_folder, stored.values())
+        return jsonify({'error': f"Nieprawidłowe archiwum: {e}"}), 400
+    except BaseException:
+        discard_batch(batch_folder, stored.values())
+        raise
+
+    profile = requested_profile()
+    records, errors = read_metadata_batch(stored, profile=profile)
+    with stage('origin_analysis'):
+        origins = analysis_engine().analyze_many(stored, workers=app.config['BULK_ANALYSIS_WORKERS'], hashes=True)
+    case_name = requested_case()
+    with stage('case_index'):
+        index_files(case_name, [
+            (os.path.basename(filepath), filepath, sha256, records[filepath], profile)
+            for filepath, sha256 in stored.items() if filepath in records
+        ])
+        store_hashes({sha256: origins[filepath][1] for filepath, sha256 in stored.items() if filepath in origins})
+        db.session.commit()
+
+    summary = {'total': len(results), 'analyzed': 0, 'failed': 0, 'skipped': 0}
+    for result in results:
+        filepath = result.pop('path', None)
+        if filepath is None:
+            summary['skipped'] += 1
+            continue
+        result['filename'] = os.path.basename(filepath)
+        origin_analysis, hashes = origins.get(filepath, (None, None))
+        result['origin_analysis'] = origin_analysis
+        # Także względem innych plików z tej paczki
+        result['near_duplicates'] = near_duplicates(result['sha256'], hashes)
+        if filepath in errors:
+            result['status'] = 'error'
+            result['error'] = errors[filepath]
+            summary['failed'] += 1
         else:
-            return "Obraz wygląda na wykonany przez człowieka."
-    except Exception as e:
-        return f"Błąd analizy obrazu: {e}"
+            result['status'] = 'ok'
+            result['metadata'] = {f"{tag.group}:{tag.tag}": tag.value for tag in records[filepath]}
+            summary['analyzed'] += 1
+    return jsonify({'batch_id': batch_id, 'case': case_name, 'summary': summary, 'files': results})
+
+# Kolejka zadań dla długich analiz (duże wideo, TIFF)
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_QUEUE_SIZE'] = int(os.environ.get('JOB_QUEUE_SIZE', 100))
+# Dzierżawa zadania: 'running' dłużej niż JOB_TIMEOUT [s] uznawane jest za porzucone
+# (np. worker wymieniony przez max_requests albo zabity) i wraca do kolejki;
+# wygasłe dzierżawy sprawdzane co JOB_RECOVERY_INTERVAL [s]
+app.config['JOB_TIMEOUT'] = int(os.environ.get('JOB_TIMEOUT', 1800))
+app.config['JOB_RECOVERY_INTERVAL'] = int(os.environ.get('JOB_RECOVERY_INTERVAL', 60))
+PROCESS_STARTED = time.time()
+
+def server_started():
+    # Start serwera: gunicorn (gunicorn.conf.py) ustawia go raz dla wszystkich workerów
+    return float(os.environ.get('LOAD_SERVER_STARTED') or PROCESS_STARTED)
+
+def run_analysis_job(job_id):
+    with app.app_context():
+        job = db.session.get(AnalysisJob, job_id)
+        if job is None or job.status not in ('queued', 'running'):
+            return
+        # Warunkowy UPDATE: przy kilku procesach serwera to samo zadanie może trafić
+        # do kilku kolejek (odzyskiwanie po restarcie, wygasła dzierżawa), wykona je tylko jeden
+        lease = time.time()
+        claimed = AnalysisJob.query.filter(
+            AnalysisJob.id == job_id,
+            AnalysisJob.status == job.status,
+            db.func.coalesce(AnalysisJob.started_at, 0) == (job.started_at or 0)
+        ).update({'status': 'running', 'started_at': lease}, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            return
+        try:
+            record = read_metadata(job.filepath, job.sha256)
+            with stage('origin_analysis'):
+                origin_analysis, hashes = analysis_engine().analyze_image(job.filepath)
+            duplicates = near_duplicates(job.sha256, hashes)
+            store_hashes({job.sha256: hashes})
+            outcome = {'status': 'done', 'result': json.dumps({'metadata': record.to_rows(), 'origin_analysis': origin_analysis, 'near_duplicates': duplicates}, ensure_ascii=False)}
+            index_files(job.case_name or app.config['CASE_DEFAULT'], [(job.filename, job.filepath, job.sha256, record, PROFILE_FULL)])
+        except Exception as e:
+            db.session.rollback()
+            outcome = {'status': 'failed', 'error': str(e)}
+        # Wynik zapisuje tylko właściciel dzierżawy - po jej wygaśnięciu zadanie
+        # mógł przejąć inny wątek lub proces
+        AnalysisJob.query.filter(
+            AnalysisJob.id == job_id, AnalysisJob.status == 'running', AnalysisJob.started_at == lease
+        ).update(dict(outcome, finished_at=time.time()), synchronize_session=False)
+        db.session.commit()
+
+job_runner = JobRunner(run_analysis_job, workers=app.config['JOB_WORKERS'], max_pending=app.config['JOB_QUEUE_SIZE'])
+metrics.register(metrics.Gauge('load_job_queue', "Stan kolejki zadań analizy.", lambda: job_runner.stats(), 'state', per_process=True))
+
+def abandoned_jobs():
+    # Zadania 'running' przerwane restartem serwera albo z wygasłą dzierżawą
+    # (proces, który je wykonywał, zniknął bez restartu całego serwera)
+    expired = time.time() - app.config['JOB_TIMEOUT']
+    return (AnalysisJob.status == 'running') & ((AnalysisJob.started_at < server_started()) | (AnalysisJob.started_at < expired))
+
+def recover_jobs():
+    # Na starcie oczekujące i porzucone zadania wracają do kolejki (blokująco,
+    # w osobnym wątku), potem co JOB_RECOVERY_INTERVAL zadania z wygasłą dzierżawą
+    startup = True
+    while True:
+        try:
+            with app.app_context():
+                condition = abandoned_jobs()
+                if startup:
+                    condition = (AnalysisJob.status == 'queued') | condition
+                pending = [job.id for job in AnalysisJob.query.filter(condition).order_by(AnalysisJob.created_at)]
+            for job_id in pending:
+                job_runner.submit(job_id, block=True)
+        except Exception as e:
+            print(f"Błąd podczas odzyskiwania zadań: {e}")
+        startup = False
+        time.sleep(app.config['JOB_RECOVERY_INTERVAL'])
 
+@app.before_request
+def start_job_runner():
+    # Start przy pierwszym żądaniu albo w warm_up(), a nie przy imporcie (reloader
+    # w trybie debug importuje app dwukrotnie, a gunicorn importuje ją przed fork)
+    if job_runner.start():
+        threading.Thread(target=recover_jobs, name="job-recovery", daemon=True).start()
+        threading.Thread(target=cleanup_results, name="result-cleanup", daemon=True).start()
+        threading.Thread(target=collect_blobs_loop, name="blob-gc", daemon=True).start()
+        exiftool_pool.start_health_checks()
 
 
+def warm_up():
+    # Rozgrzanie procesu serwera (w gunicorn każdego workera, po fork): własne
+    # połączenia z bazą zamiast odziedziczonych, indeks skrótów percepcyjnych,
+    # procesy ExifTool, OpenCV, ReportLab i wątki w tle. Zwraca czasy kroków [s].
+    create_app()
+
+    def database():
+        with app.app_context():
+            db.engine.dispose(close=False)
+            refresh_hash_index()
+
+    steps = (
+        ('database', database),
+        ('exiftool', exiftool_pool.warm_up),
+        ('analysis', lambda: analysis_engine().warm_up()),
+        ('reports', lambda: (reports.report_styles(), reports.table_style())),
+        ('background', start_job_runner),
+    )
+    timings = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - start
+    return timings
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        return jsonify({'error': "Nie wybrano pliku."}), 400
+    if not allowed_file(file.filename):
+        return jsonify({'error': "Niedozwolony typ pliku."}), 400
+    if job_runner.stats()['pending'] >= app.config['JOB_QUEUE_SIZE']:
+        return jsonify({'error': "Kolejka zadań jest pełna, spróbuj ponownie później."}), 503, {'Retry-After': '30'}
+
+    job_id = uuid.uuid4().hex
+    filename = secure_filename(file.filename)
+    job_folder = os.path.join(app.config['UPLOAD_FOLDER'], f"job_{job_id}")
+    os.makedirs(job_folder)
+    filepath = os.path.join(job_folder, filename)
+    sha256 = save_upload(file, filepath)
+    return enqueue_analysis(filename, filepath, sha256, job_id)
+
+def enqueue_analysis(filename, filepath, sha256, job_id=None):
+    job_id = job_id or uuid.uuid4().hex
+    job = AnalysisJob(id=job_id, status='queued', filename=filename, filepath=filepath, sha256=sha256,
+                      case_name=requested_case(), created_at=time.time())
+    db.session.add(job)
+    db.session.commit()
+    try:
+        job_runner.submit(job_id)
+    except QueueFull:
+        job.status = 'failed'
+        job.error = "Kolejka zadań jest pełna."
+        db.session.commit()
+        return jsonify({'error': "Kolejka zadań jest pełna, spróbuj ponownie później."}), 503, {'Retry-After': '30'}
+    response = job.to_dict()
+    response['status_url'] = url_for('job_status', job_id=job_id)
+    return jsonify(response), 202, {'Location': response['status_url']}
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = db.session.get(AnalysisJob, job_id)
+    if job is None:
+        return jsonify({'error': "Nie znaleziono zadania."}), 404
+    response = job.to_dict()
+    if job.status == 'queued':
+        response['queue'] = job_runner.stats()
+    if job.status == 'done':
+        result = json.loads(job.result)
+        response['origin_analysis'] = result['origin_analysis']
+        response['near_duplicates'] = result.get('near_duplicates', [])
+        response['metadata'] = {f"{row[0]}:{row[1]}": row[4] for row in result['metadata']}
+        response['report_url'] = url_for('job_report', job_id=job_id)
+    return jsonify(response)
+
+@app.route('/jobs/<job_id>/report', methods=['GET'])
+def job_report(job_id):
+    job = db.session.get(AnalysisJob, job_id)
+    if job is None or job.status != 'done':
+        flash("Wynik analizy nie jest jeszcze dostępny.", "warning")
+        return redirect(url_for('analyze'))
+    result = json.loads(job.result)
+    record = MetadataRecord.from_rows(result['metadata'])
+    save_result(job.filename, job.filepath, job.sha256, record, result['origin_analysis'], case_name=job.case_name)
+    return render_template('report.html', filename=job.filename, metadata=record.lines(), record=record, origin_analysis=result['origin_analysis'])
+
+# Wznawialny upload dużych plików w kawałkach:
+#   POST  /uploads               {filename, size, sha256?} -> 201, Location
+#   PATCH /uploads/<id>          nagłówek Upload-Offset, treść = kolejny kawałek
+#   HEAD  /uploads/<id>          aktualny Upload-Offset (wznowienie po przerwaniu)
+#   POST  /uploads/<id>/analyze  zlecenie analizy gotowego pliku
+def upload_response(upload, status=200):
+    body = upload.to_dict()
+    body['upload_url'] = url_for('upload_status', upload_id=upload.id)
+    if upload.status == 'complete':
+        body['analyze_url'] = url_for('analyze_upload', upload_id=upload.id)
+    headers = {'Upload-Offset': str(upload.offset), 'Upload-Length': str(upload.size), 'Cache-Control': 'no-store'}
+    return jsonify(body), status, headers
+
+def uploader_id():
+    # Losowy identyfikator sesji (w ciasteczku) przesyłającej pliki
+    if 'uploader' not in session:
+        session['uploader'] = uuid.uuid4().hex
+    return session['uploader']
+
+def known_blob(sha256, size, filename):
+    # Sama suma SHA-256 wystarcza tylko dla treści, którą ta sesja już przesłała;
+    # inaczej znajomość (lub odgadnięcie) hasha dawałaby dostęp do cudzego pliku
+    if db.session.get(Blob, sha256) is None or not blob_store.exists(sha256) or blob_store.size(sha256) != size:
+        return False
+    sent_before = ChunkedUpload.query.filter_by(uploader=uploader_id(), sha256=sha256, status='complete').first()
+    if sent_before is None:
+        return False
+    with open(blob_store.path(sha256), 'rb') as f:
+        return sniff(file_extension(filename), f.read(SNIFF_BYTES))
+
+def discard_upload(upload):
+    uploads.remove_part(app.config['INCOMING_FOLDER'], upload.id)
+    uploads.forget_hasher(upload.id)
+    db.session.delete(upload)
+    db.session.commit()
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    data = request.get_json(silent=True) or request.form
+    filename = secure_filename(data.get('filename', ''))
+    try:
+        size = int(data.get('size', -1))
+    except (TypeError, ValueError):
+        size = -1
+    expected = (data.get('sha256') or '').lower() or None
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': "Niedozwolony typ pliku."}), 415
+    if size <= 0:
+        return jsonify({'error': "Nie podano rozmiaru pliku."}), 400
+    limit = uploads.size_limit(file_extension(filename))
+    if size > limit:
+        return jsonify({'error': f"Plik przekracza limit {limit // uploads.MB} MB dla tego typu."}), 413
+
+    upload = ChunkedUpload(id=uuid.uuid4().hex, filename=filename, size=size, offset=0, expected_sha256=expected,
+                           uploader=uploader_id(), status='uploading', created_at=time.time())
+    if expected and known_blob(expected, size, filename):
+        # Ta sesja przesłała już tę treść i jest ona w magazynie - nie trzeba jej przesyłać
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        with blob_store.lock:
+            link_blob(expected, filepath)
+        remember_digest(filepath, expected, commit=False)
+        upload.offset = size
+        upload.sha256 = expected
+        upload.sniffed = True
+        upload.filepath = filepath
+        upload.status = 'complete'
+        db.session.add(upload)
+        db.session.commit()
+        response, status, headers = upload_response(upload, 201)
+        headers['Location'] = url_for('upload_status', upload_id=upload.id)
+        return response, status, headers
+
+    os.makedirs(app.config['INCOMING_FOLDER'], exist_ok=True)
+    open(uploads.part_path(app.config['INCOMING_FOLDER'], upload.id), 'wb').close()
+    db.session.add(upload)
+    db.session.commit()
+    response, status, headers = upload_response(upload, 201)
+    headers['Location'] = url_for('upload_status', upload_id=upload.id)
+    return response, status, headers
+
+@app.route('/uploads/<upload_id>', methods=['GET', 'HEAD'])
+def upload_status(upload_id):
+    upload = db.session.get(ChunkedUpload, upload_id)
+    if upload is None:
+        return jsonify({'error': "Nie znaleziono uploadu."}), 404
+    return upload_response(upload)
+
+@app.route('/uploads/<upload_id>', methods=['PATCH'])
+def upload_chunk(upload_id):
+    upload = db.session.get(ChunkedUpload, upload_id)
+    if upload is None:
+        return jsonify({'error': "Nie znaleziono uploadu."}), 404
+    if upload.status != 'uploading':
+        return upload_response(upload, 409)
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'error': "Brak nagłówka Upload-Offset."}), 400
+    # Sprawdzenie offsetu i zapis kawałka pod blokadą uploadu - równoległy
+    # PATCH (ponowienie klienta, inny worker) dostaje 409 z aktualnym offsetem
+    lock = uploads.part_lock(app.config['INCOMING_FOLDER'], upload.id)
+    if not lock.acquire(blocking=False):
+        return upload_response(upload, 409)
+    try:
+        return receive_chunk(upload, offset)
+    finally:
+        lock.release()
+
+def receive_chunk(upload, offset):
+    db.session.refresh(upload)
+    if upload.status != 'uploading' or offset != upload.offset:
+        # Klient wznawia od złego miejsca - odsyłamy aktualny offset
+        return upload_response(upload, 409)
+
+    part_path = uploads.part_path(app.config['INCOMING_FOLDER'], upload.id)
+    try:
+        with stage('upload_receive'):
+            upload.offset = uploads.append_chunk(upload.id, part_path, offset, upload.size, request.stream)
+    except RequestEntityTooLarge:
+        return jsonify({'error': "Przesłano więcej danych niż zadeklarowany rozmiar pliku."}), 413
+    finally:
+        upload.updated_at = time.time()
+        db.session.commit()
+
+    if not upload.sniffed and (upload.offset >= SNIFF_BYTES or upload.offset == upload.size):
+        with open(part_path, 'rb') as f:
+            head = f.read(SNIFF_BYTES)
+        if not sniff(file_extension(upload.filename), head):
+            discard_upload(upload)
+            return jsonify({'error': "Zawartość pliku nie odpowiada rozszerzeniu."}), 415
+        upload.sniffed = True
+        db.session.commit()
+
+    if upload.offset == upload.size:
+        sha256 = uploads.finish_hasher(upload.id, part_path, upload.offset)
+        if upload.expected_sha256 and upload.expected_sha256 != sha256:
+            discard_upload(upload)
+            return jsonify({'error': "Suma SHA-256 nie zgadza się z zadeklarowaną."}), 422
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], upload.filename)
+        store_blob(part_path, sha256, filepath, commit=False)
+        upload.sha256 = sha256
+        upload.filepath = filepath
+        upload.status = 'complete'
+        db.session.commit()
+        uploads.remove_part(app.config['INCOMING_FOLDER'], upload.id)
+    return upload_response(upload)
+
+@app.route('/uploads/<upload_id>/analyze', methods=['POST'])
+def analyze_upload(upload_id):
+    upload = db.session.get(ChunkedUpload, upload_id)
+    if upload is None or upload.status != 'complete':
+        return jsonify({'error': "Upload nie został zakończony."}), 409
+    if job_runner.stats()['pending'] >= app.config['JOB_QUEUE_SIZE']:
+        return jsonify({'error': "Kolejka zadań jest pełna, spróbuj ponownie później."}), 503, {'Retry-After': '30'}
+    return enqueue_analysis(upload.filename, upload.filepath, upload.sha256)
+
+@app.errorhandler(RequestEntityTooLarge)
+@app.errorhandler(UnsupportedMediaType)
+def upload_rejected(e):
+    if request.endpoint in ('analyze', 'remove_metadata', 'metadata_tools'):
+        flash(e.description, "danger")
+        return redirect(url_for('analyze'))
+    return jsonify({'error': e.description}), e.code
+
 @app.route('/remove-metadata/', methods=['GET'])
 def remove_metadata():
     filename = request.args.get('filename')
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    if not os.path.exists(filepath):
-        flash(f"Plik {filepath} nie istnieje.", "danger")
+    filepath = stored_path(filename)
+    if filepath is None or not os.path.isfile(filepath):
+        flash(f"Plik {filename} nie istnieje.", "danger")
         return redirect(url_for('analyze'))
     try:
-        clean_filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"clean_{filename}")
-        process = subprocess.run(
-            [EXIFTOOL_PATH, "-all=", "-overwrite_original", filepath],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding='utf-8'
-        )
-        if process.returncode == 0:
+        # Oryginał zostaje bez zmian, oczyszczona kopia trafia do clean_<nazwa>
+        clean_filepath = variant_path(filepath, 'clean_')
+        error = derive_variant(filepath, SanitizePolicy.create(remove_all=True), clean_filepath)
+        if error is None:
             flash("Metadane zostały pomyślnie usunięte.", "success")
         else:
-            flash(f"Błąd podczas usuwania metadanych: {process.stderr}", "danger")
+            flash(f"Błąd podczas usuwania metadanych: {error}", "danger")
         return redirect(url_for('report', filename=filename))
     except Exception as e:
         flash(f"Błąd podczas usuwania metadanych: {e}", "danger")
         return redirect(url_for('analyze'))
 
+@app.route('/result/metadata', methods=['GET'])
+def result_metadata():
+    # Pełne metadane bieżącego wyniku (doczytywane przy rozwinięciu sekcji raportu);
+    # ?group=<grupa> zwraca tylko jedną grupę
+    result = current_result()
+    if result is None:
+        return jsonify({'error': "Brak metadanych w sesji"}), 404
+    record = full_result_record(result)
+    group = request.args.get('group')
+    if group:
+        record = record.select(groups=[group])
+    return jsonify({
+        'filename': result.filename,
+        'profile': result.profile,
+        'groups': {
+            name: [{'tag': tag.tag, 'desc': tag.desc, 'value': tag.value} for tag in tags]
+            for name, tags in record.by_group().items()
+        },
+    })
+
 @app.route('/download-txt/', methods=['GET'])
 def download_txt():
     filename = request.args.get('filename')
@@ -175,194 +1414,84 @@ def download_txt():
         flash("Nie podano nazwy pliku", "danger")
         return redirect(url_for('report', filename=filename))
     
-    # Sprawdź czy metadane są w sesji
-    if 'metadata' not in session:
+    # Wynik analizy wskazany w sesji
+    result = current_result()
+    if result is None:
         flash("Brak metadanych w sesji", "danger")
         return redirect(url_for('report', filename=filename))
     
-    # Użyj metadanych z sesji
-    metadata = session['metadata']
-    filepath = session.get('filepath')
+    record = full_result_record(result)
     
-    try:
-        # Tworzenie pliku TXT
-        txt_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{filename}_report.txt")
-        with open(txt_path, 'w', encoding='utf-8') as f:
-            f.write("# Raport Metadanych\n\n")
-            f.write(f"Plik: {filename}\n\n")
-            f.write("=== Metadane ===\n\n")
-            for line in metadata:
-                f.write(f"- {line}\n")
-        
-        if not os.path.exists(txt_path):
-            flash("Błąd: TXT nie został utworzony", "danger")
-            return redirect(url_for('report', filename=filename))
-            
-        return send_file(txt_path, as_attachment=True, download_name=f"{filename}_report.txt")
-    except Exception as e:
-        print(f"Błąd podczas generowania TXT: {str(e)}")
-        flash(f"Błąd podczas generowania TXT: {str(e)}", "danger")
-        return redirect(url_for('report', filename=filename))
+    # Raport generowany strumieniowo, bez zapisu do uploaded_files
+    return Response(
+        iter_txt_report(filename, record),
+        mimetype='text/plain; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename="{secure_filename(filename)}_report.txt"'}
+    )
 
 @app.route('/metadata-tools/', methods=['GET', 'POST'])
 def metadata_tools():
     filename = request.args.get('filename')
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    clean_filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"clean_{filename}")
-    
-    if not os.path.exists(filepath):
-        flash(f"Plik {filepath} nie istnieje.", "danger")
+    filepath = stored_path(filename)
+    if filepath is None or not os.path.isfile(filepath):
+        flash(f"Plik {filename} nie istnieje.", "danger")
         return redirect(url_for('analyze'))
+    clean_filepath = variant_path(filepath, 'clean_')
     
     if request.method == 'POST':
         action = request.form.get('action')
         category = request.form.get('category')
         try:
             if action == "remove_all":
-                process = subprocess.run(
-                    [EXIFTOOL_PATH, "-all=", "-overwrite_original", filepath],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    encoding='utf-8'
-                )
-                if process.returncode != 0:
-                    flash(f"Błąd podczas usuwania metadanych: {process.stderr}", "danger")
+                error = derive_variant(filepath, SanitizePolicy.create(remove_all=True), clean_filepath)
+                if error is not None:
+                    flash(f"Błąd podczas usuwania metadanych: {error}", "danger")
                     return redirect(url_for('metadata_tools', filename=filename))
                 flash("Wszystkie metadane zostały usunięte.", "success")
                 return redirect(url_for('metadata_tools', filename=filename))
             elif action == "remove_category":
                 if category:
-                    process = subprocess.run(
-                        [EXIFTOOL_PATH, f"-{category}=" , "-overwrite_original", filepath],
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        text=True,
-                        encoding='utf-8'
-                    )
-                    if process.returncode != 0:
-                        flash(f"Błąd podczas usuwania kategorii: {process.stderr}", "danger")
+                    # Kolejne kategorie usuwane są z już oczyszczonej kopii
+                    source = clean_filepath if os.path.exists(clean_filepath) else filepath
+                    error = derive_variant(source, SanitizePolicy.create(groups=[category]), clean_filepath)
+                    if error is not None:
+                        flash(f"Błąd podczas usuwania kategorii: {error}", "danger")
                         return redirect(url_for('metadata_tools', filename=filename))
                     flash(f"Kategoria {category} została usunięta.", "success")
                     return redirect(url_for('metadata_tools', filename=filename))
                 else:
                     flash("Nie wybrano kategorii do usunięcia.", "warning")
                     return redirect(url_for('metadata_tools', filename=filename))
-        except Exception as e:
-            flash(f"Błąd podczas przetwarzania metadanych: {str(e)}", "danger")
-            return redirect(url_for('metadata_tools', filename=filename))
-    else:
-        # Pobierz metadane
-        try:
-            process = subprocess.run(
-                [EXIFTOOL_PATH, filepath],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8'
-            )
-            if process.returncode != 0:
-                flash(f"Błąd podczas odczytu metadanych: {process.stderr}", "danger")
-                metadata = []
             else:
-                metadata = process.stdout.split('\n')
-                metadata = [line.strip() for line in metadata if line.strip()]
-        except Exception as e:
-            flash(f"Błąd podczas odczytu metadanych: {str(e)}", "danger")
-            metadata = []
-        
-        # Sprawdź czy plik czysty istnieje
-        if os.path.exists(clean_filepath):
-            clean_process = subprocess.run(
-                [EXIFTOOL_PATH, clean_filepath],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8'
-            )
-            clean_metadata = clean_process.stdout.split('\n')
-            clean_metadata = [line.strip() for line in clean_metadata if line.strip()]
-        else:
-            clean_metadata = []
-        
-        return render_template(
-            'metadata_tools.html',
-            filename=filename,
-            metadata=metadata,
-            clean_metadata=clean_metadata
-        )
-    
-    if request.method == 'POST':
-        action = request.form.get('action')
-        category = request.form.get('category')
-        try:
-            if action == "remove_all":
-                process = subprocess.run(
-                    [EXIFTOOL_PATH, "-all=", "-overwrite_original", filepath],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    encoding='utf-8'
-                )
-                if process.returncode != 0:
-                    flash(f"Błąd podczas usuwania metadanych: {process.stderr}", "danger")
-                    return redirect(url_for('metadata_tools', filename=filename))
-                flash("Wszystkie metadane zostały usunięte.", "success")
-                return redirect(url_for('metadata_tools', filename=filename))
-            elif action == "remove_category" and category:
-                process = subprocess.run(
-                    [EXIFTOOL_PATH, f"-{category}=" , "-overwrite_original", filepath],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    encoding='utf-8'
-                )
-                if process.returncode != 0:
-                    flash(f"Błąd podczas usuwania kategorii: {process.stderr}", "danger")
-                    return redirect(url_for('metadata_tools', filename=filename))
-                flash(f"Kategoria {category} została usunięta.", "success")
+                flash("Nieznana operacja.", "warning")
                 return redirect(url_for('metadata_tools', filename=filename))
         except Exception as e:
             flash(f"Błąd podczas przetwarzania metadanych: {str(e)}", "danger")
             return redirect(url_for('metadata_tools', filename=filename))
     else:
+        # Pobierz metadane
         try:
-            process = subprocess.run(
-                [EXIFTOOL_PATH, filepath],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8'
-            )
-            if process.returncode != 0:
-                flash(f"Błąd podczas odczytu metadanych: {process.stderr}", "danger")
-                metadata = []
-            else:
-                metadata = process.stdout.split('\n')
-                metadata = [line.strip() for line in metadata if line.strip()]
+            record = read_metadata(filepath)
         except Exception as e:
             flash(f"Błąd podczas odczytu metadanych: {str(e)}", "danger")
-            metadata = []
+            record = MetadataRecord()
         
         # Sprawdź czy plik czysty istnieje
+        clean_record = MetadataRecord()
         if os.path.exists(clean_filepath):
-            clean_process = subprocess.run(
-                [EXIFTOOL_PATH, clean_filepath],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8'
-            )
-            clean_metadata = clean_process.stdout.split('\n')
-            clean_metadata = [line.strip() for line in clean_metadata if line.strip()]
-        else:
-            clean_metadata = []
+            try:
+                clean_record = read_metadata(clean_filepath)
+            except Exception as e:
+                flash(f"Błąd podczas odczytu metadanych: {str(e)}", "danger")
         
         return render_template(
             'metadata_tools.html',
             filename=filename,
-            metadata=metadata,
-            clean_metadata=clean_metadata
+            metadata=record.lines(),
+            clean_metadata=clean_record.lines(),
+            record=record,
+            clean_record=clean_record,
+            categories=[group for group in record.groups() if group != 'System']
         )
 
 @app.route('/download-pdf/', methods=['GET'])
@@ -372,128 +1501,285 @@ def download_pdf():
         flash("Nie podano nazwy pliku", "danger")
         return redirect(url_for('report', filename=filename))
     
-    # Sprawdź czy metadane są w sesji
-    if 'metadata' not in session:
+    # Wynik analizy wskazany w sesji
+    result = current_result()
+    if result is None:
         flash("Brak metadanych w sesji", "danger")
         return redirect(url_for('report', filename=filename))
     
-    # Użyj metadanych z sesji
-    metadata = session['metadata']
+    record = full_result_record(result)
     
     try:
-        # Tworzenie tymczasowego pliku PDF
-        temp_path = tempfile.mkdtemp()
-        pdf_path = os.path.join(temp_path, f"{filename}_report.pdf")
-        
-        # Ustawienia dokumentu
-        doc = SimpleDocTemplate(pdf_path, pagesize=A4,
-                               rightMargin=72, leftMargin=72,
-                               topMargin=72, bottomMargin=72)
-        
-        # Stylizacja
-        styles = getSampleStyleSheet()
-        styles.add(ParagraphStyle(name='Metadata', fontSize=10, leading=14))
-        styles.add(ParagraphStyle(name='Title', fontSize=24, leading=24, alignment=TA_CENTER))
-        styles.add(ParagraphStyle(name='Subtitle', fontSize=16, leading=16))
-        
-        # Treść dokumentu
-        elements = []
-        
-        # Tytuł
-        elements.append(Paragraph("Raport Metadanych", styles['Title']))
-        elements.append(Spacer(1, 20))
-        
-        # Nazwa pliku
-        elements.append(Paragraph(f"Plik: {filename}", styles['Subtitle']))
-        elements.append(Spacer(1, 12))
-        
-        # Linia podziału
-        elements.append(Spacer(1, 12))
-        elements.append(Paragraph("-" * 60, styles['Normal']))
-        elements.append(Spacer(1, 20))
-        
-        # Sekcja metadanych
-        elements.append(Paragraph("Metadane:", styles['Normal']))
-        elements.append(Spacer(1, 12))
-        
-        # Tabela metadanych
-        data = []
-        for line in metadata:
-            data.append([Paragraph(line, styles['Metadata'])])
-        
-        table = Table(data)
-        table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12)
-        ]))
-        
-        elements.append(table)
-        
-        # Generowanie PDF
-        doc.build(elements)
-        
-        # Sprawdzenie czy plik został utworzony
-        if not os.path.exists(pdf_path):
-            flash("Błąd: PDF nie został utworzony", "danger")
-            return redirect(url_for('report', filename=filename))
-            
-        # Wysłanie pliku
-        return send_file(pdf_path, as_attachment=True, download_name=f"{filename}_report.pdf")
-        
+        # PDF budowany w pamięci i wysyłany bez pliku tymczasowego
+        with stage('report_pdf'):
+            buffer = build_pdf_report(filename, record)
+        return Response(
+            iter_buffer(buffer),
+            mimetype='application/pdf',
+            headers={
+                'Content-Disposition': f'attachment; filename="{secure_filename(filename)}_report.pdf"',
+                'Content-Length': str(buffer.getbuffer().nbytes)
+            }
+        )
     except Exception as e:
         print(f"Błąd podczas generowania PDF: {str(e)}")
         flash(f"Błąd podczas generowania PDF: {str(e)}", "danger")
         return redirect(url_for('report', filename=filename))
-    finally:
-        # Usunięcie tymczasowego katalogu
-        if os.path.exists(temp_path):
-            shutil.rmtree(temp_path)
-            print(f"Tymczasowy katalog {temp_path} został usunięty")
-        flash("Plik nie istnieje.", "danger")
+
+@app.route('/download-clean/', methods=['GET'])
+def download_clean():
+    # Kopia pliku bez metadanych, oznaczona komentarzem LENS OSINT ANALYZER DATA
+    filename = request.args.get('filename')
+    filepath = stored_path(filename)
+    if filepath is None or not os.path.isfile(filepath):
+        flash(f"Plik {filename} nie istnieje.", "danger")
         return redirect(url_for('analyze'))
+    export_filepath = variant_path(filepath, 'export_')
     try:
-        process = subprocess.run(
-            [EXIFTOOL_PATH, "-all=", f"-comment=LENS OSINT ANALYZER DATA", "-overwrite_original", original_filepath],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding='utf-8'
-        )
-        if process.returncode != 0:
-            flash(f"Błąd podczas przetwarzania pliku: {process.stderr}", "danger")
+        error = derive_variant(filepath, SanitizePolicy.create(remove_all=True, comment=DEFAULT_COMMENT), export_filepath)
+        if error is not None:
+            flash(f"Błąd podczas przetwarzania pliku: {error}", "danger")
             return redirect(url_for('metadata_tools', filename=filename))
-        return send_file(original_filepath, as_attachment=True)
+        return send_file(os.path.abspath(export_filepath), as_attachment=True, download_name=os.path.basename(filepath))
     except Exception as e:
         flash(f"Błąd podczas pobierania pliku: {e}", "danger")
         return redirect(url_for('metadata_tools', filename=filename))
 
+@app.route('/sanitize', methods=['POST'])
+def sanitize():
+    # Czyszczenie wielu zapisanych plików jedną polityką, np. całego katalogu sprawy:
+    # {"files": ["a.jpg", "bulk_<id>/b.jpg"], "folder": "bulk_<id>",
+    #  "policy": {"all": true, "groups": [...], "tags": [...], "comment": "..."}}
+    # Wyniki trafiają obok oryginałów jako clean_<nazwa>
+    data = request.get_json(silent=True) or {}
+    try:
+        policy = SanitizePolicy.from_dict(data.get('policy', 'all'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    names = list(data.get('files') or [])
+    if data.get('folder'):
+        folder = stored_path(data['folder'])
+        if folder is None or not os.path.isdir(folder):
+            return jsonify({'error': "Katalog nie istnieje."}), 404
+        names += [
+            os.path.relpath(os.path.join(folder, name), app.config['UPLOAD_FOLDER']).replace(os.sep, '/')
+            for name in sorted(os.listdir(folder))
+            if not name.startswith(VARIANT_PREFIXES) and allowed_file(name) and os.path.isfile(os.path.join(folder, name))
+        ]
+    if not names:
+        return jsonify({'error': "Nie wybrano plików."}), 400
+    if len(names) > app.config['BULK_MAX_FILES']:
+        return jsonify({'error': "Przekroczono limit plików w paczce."}), 413
+
+    files, items = [], []
+    for name in names:
+        filepath = stored_path(name)
+        if filepath is None or not os.path.isfile(filepath):
+            files.append({'name': name, 'status': 'failed', 'error': "Plik nie istnieje."})
+            continue
+        target = variant_path(filepath, 'clean_')
+        files.append({'name': name, 'target': target})
+        items.append((filepath, target))
+    with stage('sanitize'):
+        results = derive_variants(items, policy)
+
+    summary = {'total': len(files), 'cleaned': 0, 'failed': 0}
+    for entry in files:
+        target = entry.pop('target', None)
+        if target is not None:
+            entry.update(results[target])
+            if entry['status'] == 'cleaned':
+                entry['output'] = os.path.relpath(target, app.config['UPLOAD_FOLDER']).replace(os.sep, '/')
+        summary[entry['status']] += 1
+    return jsonify({'policy': policy.to_dict(), 'summary': summary, 'files': files})
+
+# Zapytania do indeksu spraw. Parametr case wybiera sprawę (domyślnie
+# CASE_DEFAULT, "*" - wszystkie sprawy).
+INDEX_FILTERS = {
+    'make': IndexedFile.make,
+    'model': IndexedFile.model,
+    'serial': IndexedFile.serial_number,
+    'lens': IndexedFile.lens_model,
+    'software': IndexedFile.software,
+    'author': IndexedFile.author,
+    'sha256': IndexedFile.sha256,
+    'gps_cell': IndexedFile.gps_cell,
+}
+
+def index_case_filter(query):
+    case_name = request.args.get('case') or app.config['CASE_DEFAULT']
+    return query if case_name == '*' else query.filter(IndexedFile.case_name == case_name)
+
+def int_arg(name, default, maximum):
+    value = request.args.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Parametr {name} musi być liczbą.")
+    return max(0, min(value, maximum))
+
+@app.route('/index/search', methods=['GET'])
+def index_search():
+    # ?q=<zapytanie FTS5>&make=&model=&serial=&lens=&software=&author=&sha256=&gps_cell=
+    #  &since=2023-05-01&until=2023-05-31&bbox=minSzer,minDł,maxSzer,maxDł&limit=&offset=
+    query = index_case_filter(IndexedFile.query)
+    try:
+        for name, column in INDEX_FILTERS.items():
+            if request.args.get(name):
+                query = query.filter(column == request.args[name])
+        if request.args.get('since'):
+            query = query.filter(IndexedFile.taken_at >= case_index.date_bound(request.args['since']))
+        if request.args.get('until'):
+            query = query.filter(IndexedFile.taken_at <= case_index.date_bound(request.args['until'], end=True))
+        if request.args.get('bbox'):
+            min_lat, min_lon, max_lat, max_lon = case_index.parse_bbox(request.args['bbox'])
+            query = query.filter(IndexedFile.gps_lat.between(min_lat, max_lat), IndexedFile.gps_lon.between(min_lon, max_lon))
+        limit = int_arg('limit', 100, app.config['CASE_INDEX_MAX_RESULTS'])
+        offset = int_arg('offset', 0, 10 ** 9)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    text_query = request.args.get('q', '').strip()
+    if text_query:
+        if not app.config['CASE_INDEX_FTS']:
+            return jsonify({'error': "Wyszukiwanie pełnotekstowe jest niedostępne (SQLite bez FTS5)."}), 501
+        query = query.filter(db.text("metadata_index.id IN (SELECT rowid FROM metadata_index_fts WHERE metadata_index_fts MATCH :q)")).params(q=text_query)
+    try:
+        with stage('index_query'):
+            total = query.count()
+            entries = query.order_by(IndexedFile.indexed_at.desc(), IndexedFile.id.desc()).offset(offset).limit(limit).all()
+            snippets = {}
+            if text_query and entries:
+                rows = db.session.execute(db.text(
+                    "SELECT rowid, snippet(metadata_index_fts, 1, '[', ']', '…', 12) FROM metadata_index_fts "
+                    "WHERE metadata_index_fts MATCH :q AND rowid IN (" + ','.join(str(entry.id) for entry in entries) + ")"
+                ), {'q': text_query})
+                snippets = dict(rows.all())
+    except OperationalError:
+        db.session.rollback()
+        return jsonify({'error': "Nieprawidłowe zapytanie pełnotekstowe."}), 400
+    files = []
+    for entry in entries:
+        item = entry.to_dict()
+        if entry.id in snippets:
+            item['snippet'] = snippets[entry.id]
+        files.append(item)
+    return jsonify({'total': total, 'offset': offset, 'limit': limit, 'files': files})
+
+@app.route('/index/correlate', methods=['GET'])
+def index_correlate():
+    # Grupy plików o wspólnej wartości pola: ?field=serial|camera|lens|software|author|gps|sha256
+    #   &min_count=2&limit=50&files=20
+    # albo pliki powiązane z jednym plikiem: ?sha256=<hash>[&field=...]
+    fields = [request.args['field']] if request.args.get('field') else list(CORRELATION_FIELDS)
+    if any(field not in CORRELATION_FIELDS for field in fields):
+        return jsonify({'error': f"Nieznane pole; dostępne: {', '.join(CORRELATION_FIELDS)}."}), 400
+    try:
+        min_count = max(2, int_arg('min_count', 2, 10 ** 9))
+        limit = int_arg('limit', 50, app.config['CASE_INDEX_MAX_RESULTS'])
+        per_group = int_arg('files', 20, app.config['CASE_INDEX_MAX_RESULTS'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    with stage('index_query'):
+        if request.args.get('sha256'):
+            return jsonify(related_files(request.args['sha256'], [field for field in fields if field != 'sha256'], per_group))
+        if not request.args.get('field'):
+            return jsonify({'error': "Podaj pole korelacji (field) albo plik (sha256)."}), 400
+        field = fields[0]
+        columns = [getattr(IndexedFile, name) for name in CORRELATION_FIELDS[field]]
+        count = db.func.count(IndexedFile.id)
+        query = index_case_filter(db.session.query(*columns, count)).filter(*[column.isnot(None) for column in columns])
+        rows = query.group_by(*columns).having(count >= min_count).order_by(count.desc()).limit(limit).all()
+        groups = []
+        for row in rows:
+            values, total = row[:-1], row[-1]
+            matches = index_case_filter(IndexedFile.query).filter(*[column == value for column, value in zip(columns, values)])
+            group = {
+                'value': values[0] if len(values) == 1 else dict(zip(CORRELATION_FIELDS[field], values)),
+                'count': total,
+                'files': [entry.to_dict() for entry in matches.order_by(IndexedFile.taken_at, IndexedFile.id).limit(per_group)],
+            }
+            if field == 'gps':
+                group['center'] = case_index.cell_center(values[0], app.config['CASE_INDEX_GPS_CELL'])
+            groups.append(group)
+    return jsonify({'field': field, 'min_count': min_count, 'groups': groups})
+
+def related_files(sha256, fields, per_group):
+    # Pliki dzielące z danym plikiem numer seryjny, aparat, autora, komórkę GPS...
+    entries = index_case_filter(IndexedFile.query).filter(IndexedFile.sha256 == sha256).all()
+    if not entries:
+        return {'error': "Pliku nie ma w indeksie."}
+    related = {}
+    for field in fields:
+        names = CORRELATION_FIELDS[field]
+        values = {tuple(getattr(entry, name) for name in names) for entry in entries}
+        values = [value for value in values if all(item is not None for item in value)]
+        files = []
+        for value in values:
+            matches = index_case_filter(IndexedFile.query).filter(IndexedFile.sha256 != sha256,
+                                                                   *[getattr(IndexedFile, name) == item for name, item in zip(names, value)])
+            files += [entry.to_dict() for entry in matches.order_by(IndexedFile.taken_at, IndexedFile.id).limit(per_group)]
+        if files:
+            related[field] = files[:per_group]
+    return {'sha256': sha256, 'files': [entry.to_dict() for entry in entries], 'related': related}
+
+@app.route('/index/near-duplicates', methods=['GET'])
+def index_near_duplicates():
+    # Bliskie duplikaty jednego pliku wśród wszystkich dowodów: ?sha256=<hash>&distance=10&limit=20
+    try:
+        distance = int_arg('distance', app.config['NEAR_DUPLICATE_DISTANCE'], MAX_DISTANCE)
+        limit = int_arg('limit', app.config['NEAR_DUPLICATE_MAX_RESULTS'], app.config['CASE_INDEX_MAX_RESULTS'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    row = ImageHash.query.filter_by(sha256=request.args.get('sha256', '')).first()
+    if row is None:
+        return jsonify({'error': "Brak skrótów percepcyjnych dla tego pliku."}), 404
+    hashes = {name: to_unsigned(getattr(row, name)) for name in HASH_NAMES}
+    return jsonify({
+        'sha256': row.sha256,
+        'hashes': {name: to_hex(value) for name, value in hashes.items()},
+        'distance': distance,
+        'matches': near_duplicates(row.sha256, hashes, distance, limit),
+    })
+
+@app.route('/index/clusters', methods=['GET'])
+def index_clusters():
+    # Grupy bliskich duplikatów w całej sprawie: ?case=<sprawa>&distance=10&limit=50
+    try:
+        distance = int_arg('distance', app.config['NEAR_DUPLICATE_DISTANCE'], MAX_DISTANCE)
+        limit = int_arg('limit', 50, app.config['CASE_INDEX_MAX_RESULTS'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    case_name = request.args.get('case') or app.config['CASE_DEFAULT']
+    with stage('near_duplicates'):
+        contents = index_case_filter(db.session.query(IndexedFile.sha256))
+        rows = db.session.query(ImageHash.sha256, ImageHash.ahash, ImageHash.dhash, ImageHash.phash).filter(ImageHash.sha256.in_(contents))
+        hashes = {sha256: dict(zip(HASH_NAMES, map(to_unsigned, values))) for sha256, *values in rows}
+        groups = cluster(hashes, distance)
+        shown = groups[:limit]
+        files = files_by_content({sha256 for group in shown for sha256 in group}, None if case_name == '*' else case_name)
+    clusters = [{
+        'count': len(group),
+        'members': [{
+            'sha256': sha256,
+            'phash': to_hex(hashes[sha256]['phash']),
+            'files': files.get(sha256, []),
+        } for sha256 in group],
+    } for group in shown]
+    return jsonify({'case': case_name, 'distance': distance, 'images': len(hashes), 'total': len(groups), 'clusters': clusters})
+
 @app.route('/report')
 def report():
     reports = []
     return render_template('report.html', reports=reports)
 
 if __name__ == '__main__':
-    if not os.path.exists(UPLOAD_FOLDER):
-        try:
-            os.makedirs(UPLOAD_FOLDER)
-            print(f"Utworzono folder {UPLOAD_FOLDER}")
-        except Exception as e:
-            print(f"Błąd podczas tworzenia folderu {UPLOAD_FOLDER}: {e}")
-            exit(1)
-    
-    # Sprawdzenie uprawnień do folderu
+    # Serwer deweloperski (FLASK_DEBUG=1 - tryb debug); produkcyjnie gunicorn
+    # z gunicorn.conf.py, który ładuje wsgi.py i rozgrzewa każdy proces
     try:
-        test_file = os.path.join(UPLOAD_FOLDER, 'test.txt')
-        with open(test_file, 'w') as f:
-            f.write('Test')
-        os.remove(test_file)
-        print(f"Folder {UPLOAD_FOLDER} ma poprawne uprawnienia")
-    except Exception as e:
-        print(f"Błąd uprawnień do folderu {UPLOAD_FOLDER}: {e}")
+        create_app()
+    except RuntimeError as e:
+        print(f"Błąd: {e}")
         exit(1)
-    
-    app.run(debug=True)
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1')
@@ -0,0 +1,251 @@
+"""Benchmark obciążeniowy endpointów /analyze, /metadata-tools/, /download-pdf/ i /download-txt/.
+
+Działa offline: używa klienta testowego Flask i zastępczego ExifTool
+(benchmarks/stub_exiftool.py), a pliki wejściowe generuje syntetycznie.
+
+Uruchomienie:
+    python benchmarks/bench_endpoints.py --requests 200 --concurrency 8 --json wynik.json
+    python benchmarks/bench_endpoints.py --compare poprzedni.json
+
+Wynik (JSON) zawiera p50/p95/p99, średnią, przepustowość i szczytowe RSS,
+więc przebiegi z różnych wersji można porównywać.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ENDPOINTS = ('analyze', 'metadata_tools', 'download_pdf', 'download_txt')
+
+# Minimalne szablony, gdy katalog templates nie jest dostępny
+FALLBACK_TEMPLATES = {
+    name: "{{ filename }}\n{% for line in metadata or [] %}{{ line }}\n{% endfor %}{{ origin_analysis }}"
+    for name in ('index.html', 'analyze.html', 'report.html', 'metadata_tools.html')
+}
+
+
+def stub_exiftool(folder):
+    # Opakowanie uruchamiające stub tym samym interpreterem Pythona
+    script = os.path.join(ROOT, 'benchmarks', 'stub_exiftool.py')
+    if os.name == 'nt':
+        path = os.path.join(folder, 'exiftool.bat')
+        with open(path, 'w') as f:
+            f.write(f'@"{sys.executable}" "{script}" %*\n')
+    else:
+        path = os.path.join(folder, 'exiftool')
+        with open(path, 'w') as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+        os.chmod(path, 0o755)
+    return path
+
+
+def make_fixtures(formats, megapixels, seed=0):
+    rng = np.random.default_rng(seed)
+    fixtures = []
+    for mp in megapixels:
+        width = int((mp * 1_000_000 * 4 / 3) ** 0.5)
+        height = int(width * 3 / 4)
+        small = rng.integers(0, 255, (height // 32 + 1, width // 32 + 1, 3), dtype=np.uint8)
+        image = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+        for fmt in formats:
+            ok, encoded = cv2.imencode(f'.{fmt}', image)
+            if not ok:
+                raise RuntimeError(f"Nie udało się zakodować {fmt}")
+            fixtures.append((f"bench_{mp}mp.{fmt}", encoded.tobytes()))
+    return fixtures
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(samples, errors, wall):
+    result = {}
+    for endpoint in ENDPOINTS:
+        values = samples[endpoint]
+        result[endpoint] = {
+            'count': len(values),
+            'errors': errors[endpoint],
+            'mean_ms': statistics.fmean(values) * 1000 if values else None,
+            'p50_ms': percentile(values, 50) * 1000 if values else None,
+            'p95_ms': percentile(values, 95) * 1000 if values else None,
+            'p99_ms': percentile(values, 99) * 1000 if values else None,
+            'throughput_rps': len(values) / wall if wall else None,
+        }
+    return result
+
+
+def peak_rss():
+    if resource is None:
+        return None
+    value = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return value if sys.platform == 'darwin' else value * 1024
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmark(args):
+    workdir = tempfile.mkdtemp(prefix='load_bench_')
+    os.environ['EXIFTOOL_PATH'] = stub_exiftool(workdir)
+    os.environ['INSTANCE_PATH'] = os.path.join(workdir, 'instance')
+    os.environ.setdefault('EXIFTOOL_POOL_SIZE', str(args.pool_size))
+    os.chdir(workdir)
+
+    from jinja2 import ChoiceLoader, DictLoader
+    import app as app_module
+
+    flask_app = app_module.create_app()
+    flask_app.config['TESTING'] = True
+    flask_app.jinja_loader = ChoiceLoader([flask_app.jinja_loader, DictLoader(FALLBACK_TEMPLATES)])
+
+    fixtures = make_fixtures(args.formats.split(','), [float(mp) for mp in args.sizes.split(',')])
+    endpoints = args.endpoints.split(',')
+    samples = {endpoint: [] for endpoint in ENDPOINTS}
+    errors = {endpoint: 0 for endpoint in ENDPOINTS}
+    lock = threading.Lock()
+    counter = iter(range(args.requests))
+
+    def timed(endpoint, call, expected=200):
+        start = time.perf_counter()
+        response = call()
+        elapsed = time.perf_counter() - start
+        data = response.get_data()
+        with lock:
+            if response.status_code == expected and data:
+                samples[endpoint].append(elapsed)
+            else:
+                errors[endpoint] += 1
+        return response
+
+    def client_loop():
+        # Każdy wątek ma własnego klienta (i własną sesję)
+        client = flask_app.test_client()
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            name, data = fixtures[index % len(fixtures)]
+            if not args.cache_hits:
+                # Unikalne bajty na końcu pliku wymuszają odczyt przez ExifTool zamiast cache
+                data = data + index.to_bytes(8, 'big')
+            filename = f"{index}_{name}"
+            timed('analyze', lambda: client.post(
+                '/analyze', data={'file': (io.BytesIO(data), filename)}, content_type='multipart/form-data'))
+            if 'metadata_tools' in endpoints:
+                timed('metadata_tools', lambda: client.get('/metadata-tools/', query_string={'filename': filename}))
+            if 'download_pdf' in endpoints:
+                timed('download_pdf', lambda: client.get('/download-pdf/', query_string={'filename': filename}))
+            if 'download_txt' in endpoints:
+                timed('download_txt', lambda: client.get('/download-txt/', query_string={'filename': filename}))
+
+    # Rozgrzewka: start procesów ExifTool i pierwsze zapytania do bazy
+    warm = flask_app.test_client()
+    name, data = fixtures[0]
+    warm.post('/analyze', data={'file': (io.BytesIO(data), f"warmup_{name}")}, content_type='multipart/form-data')
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client_loop) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    return {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'timestamp': time.time(),
+        },
+        'config': {
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'formats': args.formats,
+            'sizes_mp': args.sizes,
+            'endpoints': endpoints,
+            'cache_hits': args.cache_hits,
+            'pool_size': args.pool_size,
+            'stub_delay_ms': float(os.environ.get('STUB_EXIFTOOL_DELAY_MS', 0)),
+        },
+        'wall_seconds': wall,
+        'throughput_rps': sum(len(values) for values in samples.values()) / wall,
+        'peak_rss_bytes': peak_rss(),
+        'endpoints': summarize(samples, errors, wall),
+    }
+
+
+def print_report(result, baseline=None):
+    print(f"Czas: {result['wall_seconds']:.2f} s, przepustowość: {result['throughput_rps']:.1f} req/s, "
+          f"szczytowe RSS: {(result['peak_rss_bytes'] or 0) / 2**20:.0f} MiB")
+    print(f"{'endpoint':<16}{'n':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}")
+    for endpoint, stats in result['endpoints'].items():
+        if not stats['count'] and not stats['errors']:
+            continue
+        line = (f"{endpoint:<16}{stats['count']:>6}{stats['errors']:>5}"
+                f"{stats['p50_ms'] or 0:>10.1f}{stats['p95_ms'] or 0:>10.1f}{stats['p99_ms'] or 0:>10.1f}"
+                f"{stats['throughput_rps'] or 0:>9.1f}")
+        base = (baseline or {}).get('endpoints', {}).get(endpoint)
+        if base and base.get('p95_ms') and stats['p95_ms']:
+            line += f"   p95 {(stats['p95_ms'] / base['p95_ms'] - 1) * 100:+.0f}% vs baseline"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=100, help="Liczba analizowanych plików")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--formats', default='jpg,png,tiff')
+    parser.add_argument('--sizes', default='1,4,12', help="Rozdzielczości fixtur w Mpx")
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--cache-hits', action='store_true', help="Powtarzaj te same bajty (trafienia w cache metadanych)")
+    parser.add_argument('--json', dest='json_path')
+    parser.add_argument('--compare', help="Plik JSON z poprzedniego przebiegu")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    if args.json_path:
+        args.json_path = os.path.abspath(args.json_path)
+
+    result = run_benchmark(args)
+    print_report(result, baseline)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
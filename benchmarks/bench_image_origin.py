@@ -0,0 +1,146 @@
+"""Porównanie silnika analizy pochodzenia obrazu z pierwotną implementacją.
+
+Uruchomienie:
+    python benchmarks/bench_image_origin.py [obraz ...] [--sizes 12,24,48] [--json wynik.json]
+
+Bez podanych obrazów generowane są syntetyczne JPEG-i o zadanych rozmiarach (w Mpx).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import image_analysis  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def legacy_scores(filepath):
+    # Pierwotna wersja z app.py: pełna rozdzielczość, 3 kanały, CV_64F
+    image = cv2.imread(filepath)
+    if image is None:
+        return None
+    blur = cv2.Laplacian(image, cv2.CV_64F).var()
+    edges = cv2.Canny(image, 100, 200)
+    edge_density = np.sum(edges) / (image.shape[0] * image.shape[1])
+    return {'blur': float(blur), 'edge_density': float(edge_density)}
+
+
+def engine_scores(filepath):
+    scores = image_analysis.origin_scores(filepath)
+    return {'blur': scores['blur'], 'edge_density': scores['edge_density'], 'reduction': scores['reduction']}
+
+
+METHODS = {'legacy': legacy_scores, 'engine': engine_scores}
+
+
+def make_fixture(folder, megapixels, seed):
+    # Zdjęciopodobny obraz: gładkie tło, kształty, szum i lekkie rozmycie
+    rng = np.random.default_rng(seed)
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    small = rng.integers(0, 255, (height // 64 + 1, width // 64 + 1, 3), dtype=np.uint8)
+    image = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    for _ in range(40):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.circle(image, center, int(rng.integers(10, width // 8)), color, -1)
+    noise = rng.normal(0, 6, image.shape).astype(np.float32)
+    image = np.clip(image + noise, 0, 255).astype(np.uint8)
+    image = cv2.GaussianBlur(image, (3, 3), 0)
+    path = os.path.join(folder, f"fixture_{megapixels}mp.jpg")
+    cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 92])
+    return path
+
+
+def _measure(method, filepath):
+    start = time.perf_counter()
+    scores = METHODS[method](filepath)
+    elapsed = time.perf_counter() - start
+    peak_rss = None
+    if resource is not None:
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != 'darwin':
+            peak_rss *= 1024
+    return elapsed, scores, peak_rss
+
+
+def measure(method, filepath, repeat):
+    # Każdy pomiar w świeżym procesie, żeby szczytowe RSS dotyczyło tylko tej metody
+    ctx = multiprocessing.get_context('spawn')
+    times, scores, peak = [], None, None
+    for _ in range(repeat):
+        with ctx.Pool(1) as pool:
+            elapsed, scores, rss = pool.apply(_measure, (method, filepath))
+        times.append(elapsed)
+        peak = max(peak or 0, rss or 0) or None
+    return min(times), scores, peak
+
+
+def verdict(scores):
+    return image_analysis.verdict(scores) if scores else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('images', nargs='*')
+    parser.add_argument('--sizes', default='12,24,48', help="Rozmiary syntetycznych obrazów w Mpx")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--batch-workers', type=int, default=os.cpu_count())
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        images = args.images
+        if not images:
+            # Fixtury też w osobnym procesie - ru_maxrss jest dziedziczone przez procesy potomne
+            with multiprocessing.get_context('spawn').Pool(1) as pool:
+                images = [pool.apply(make_fixture, (folder, float(size), index)) for index, size in enumerate(args.sizes.split(','))]
+        rows = []
+        for filepath in images:
+            row = {'image': os.path.basename(filepath), 'size_bytes': os.path.getsize(filepath)}
+            for method in METHODS:
+                elapsed, scores, peak = measure(method, filepath, args.repeat)
+                row[method] = {'seconds': elapsed, 'peak_rss': peak, 'scores': scores, 'verdict': verdict(scores)}
+            row['speedup'] = row['legacy']['seconds'] / row['engine']['seconds']
+            row['same_verdict'] = row['legacy']['verdict'] == row['engine']['verdict']
+            rows.append(row)
+            print(f"{row['image']:<24} legacy {row['legacy']['seconds']*1000:8.1f} ms  "
+                  f"engine {row['engine']['seconds']*1000:8.1f} ms  x{row['speedup']:.1f}  "
+                  f"blur {row['legacy']['scores']['blur']:.1f}/{row['engine']['scores']['blur']:.1f}  "
+                  f"edges {row['legacy']['scores']['edge_density']:.2f}/{row['engine']['scores']['edge_density']:.2f}  "
+                  f"werdykt {'zgodny' if row['same_verdict'] else 'RÓŻNY'}")
+
+        batch = images * max(1, (4 * (args.batch_workers or 1)) // len(images))
+        start = time.perf_counter()
+        for filepath in batch:
+            legacy_scores(filepath)
+        sequential = time.perf_counter() - start
+        start = time.perf_counter()
+        image_analysis.analyze_many(batch, workers=args.batch_workers)
+        parallel = time.perf_counter() - start
+        print(f"Paczka {len(batch)} obrazów: legacy sekwencyjnie {sequential:.2f} s, "
+              f"analyze_many ({args.batch_workers} proc.) {parallel:.2f} s")
+
+    result = {
+        'images': rows,
+        'batch': {'files': len(batch), 'workers': args.batch_workers, 'legacy_seconds': sequential, 'engine_seconds': parallel},
+    }
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
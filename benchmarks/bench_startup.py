@@ -0,0 +1,169 @@
+"""Benchmark startu aplikacji: import, create_app(), rozgrzewanie i pierwsze żądania.
+
+Każdy przebieg to nowy proces Pythona z pustym katalogiem roboczym (nowa baza,
+puste uploaded_files), więc mierzony jest zimny start. Tryb "cold" obsługuje
+pierwsze żądanie bez rozgrzewania (jak serwer deweloperski), tryb "warm" wywołuje
+najpierw app.warm_up() (jak worker gunicorn w post_fork). Działa offline:
+zastępczy ExifTool (benchmarks/stub_exiftool.py) i syntetyczny plik JPEG.
+
+Uruchomienie:
+    python benchmarks/bench_startup.py --runs 5 --json start.json
+    python benchmarks/bench_startup.py --root /sciezka/do/innej/wersji --compare start.json
+
+--root pozwala zmierzyć inną kopię repozytorium (np. git worktree ze starszą
+wersją); dla wersji bez create_app()/warm_up() te kroki są pomijane.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_endpoints import ROOT, git_revision, make_fixtures, stub_exiftool
+
+MODES = ('cold', 'warm')
+METRICS = ('import_ms', 'create_app_ms', 'warm_up_ms', 'ready_ms', 'first_request_ms', 'second_request_ms', 'first_response_ms')
+
+# Kod wykonywany w nowym procesie: argv = katalog repozytorium, plik wejściowy, tryb
+PROBE = r'''
+import io, json, sys, time
+sys.path.insert(0, sys.argv[1])
+result = {}
+start = time.perf_counter()
+import app
+result['import_ms'] = (time.perf_counter() - start) * 1000
+result['heavy_modules'] = sorted(name for name in ('cv2', 'numpy', 'reportlab') if name in sys.modules)
+flask_app = app.app
+if hasattr(app, 'create_app'):
+    start = time.perf_counter()
+    flask_app = app.create_app()
+    result['create_app_ms'] = (time.perf_counter() - start) * 1000
+if sys.argv[3] == 'warm' and hasattr(app, 'warm_up'):
+    start = time.perf_counter()
+    steps = app.warm_up()
+    result['warm_up_ms'] = (time.perf_counter() - start) * 1000
+    result['warm_up_steps_ms'] = {name: seconds * 1000 for name, seconds in steps.items()}
+client = flask_app.test_client()
+with open(sys.argv[2], 'rb') as f:
+    data = f.read()
+for key in ('first_request_ms', 'second_request_ms'):
+    start = time.perf_counter()
+    response = client.post('/analyze-bulk', data={'file': (io.BytesIO(data), 'bench.jpg')}, content_type='multipart/form-data')
+    result[key] = (time.perf_counter() - start) * 1000
+    if response.status_code != 200:
+        raise SystemExit(f"/analyze-bulk: {response.status_code} {response.get_data(as_text=True)[:200]}")
+print(json.dumps(result))
+'''
+
+
+def run_probe(root, fixture, mode, exiftool):
+    workdir = tempfile.mkdtemp(prefix='load_start_')
+    env = dict(os.environ, EXIFTOOL_PATH=exiftool, INSTANCE_PATH=os.path.join(workdir, 'instance'))
+    try:
+        completed = subprocess.run([sys.executable, '-c', PROBE, root, fixture, mode],
+                                   cwd=workdir, env=env, capture_output=True, text=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Przebieg {mode} nie powiódł się:\n{completed.stderr[-2000:]}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['ready_ms'] = result['import_ms'] + result.get('create_app_ms', 0) + result.get('warm_up_ms', 0)
+    result['first_response_ms'] = result['ready_ms'] + result['first_request_ms']
+    return result
+
+
+def summarize(runs):
+    summary = {}
+    for metric in METRICS:
+        values = [run[metric] for run in runs if metric in run]
+        summary[metric] = {
+            'median': statistics.median(values),
+            'min': min(values),
+            'max': max(values),
+        } if values else None
+    steps = [run['warm_up_steps_ms'] for run in runs if 'warm_up_steps_ms' in run]
+    if steps:
+        summary['warm_up_steps_ms'] = {name: statistics.median(step[name] for step in steps) for name in steps[0]}
+    summary['heavy_modules'] = runs[0]['heavy_modules']
+    return summary
+
+
+def run_benchmark(args):
+    workdir = tempfile.mkdtemp(prefix='load_start_bench_')
+    exiftool = stub_exiftool(workdir)
+    name, data = make_fixtures(['jpg'], [args.size])[0]
+    fixture = os.path.join(workdir, name)
+    with open(fixture, 'wb') as f:
+        f.write(data)
+    try:
+        modes = {}
+        for mode in args.modes.split(','):
+            modes[mode] = summarize([run_probe(args.root, fixture, mode, exiftool) for _ in range(args.runs)])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        'meta': {
+            'revision': git_revision(),
+            'root': args.root,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'timestamp': time.time(),
+        },
+        'config': {
+            'runs': args.runs,
+            'size_mp': args.size,
+            'exiftool_pool_size': int(os.environ.get('EXIFTOOL_POOL_SIZE', 4)),
+        },
+        'modes': modes,
+    }
+
+
+def print_report(result, baseline=None):
+    for mode, summary in result['modes'].items():
+        print(f"[{mode}] moduły ładowane przy imporcie: {', '.join(summary['heavy_modules']) or '-'}")
+        print(f"{'krok':<20}{'mediana ms':>12}{'min ms':>10}{'max ms':>10}")
+        for metric in METRICS:
+            stats = summary[metric]
+            if stats is None:
+                continue
+            line = f"{metric:<20}{stats['median']:>12.1f}{stats['min']:>10.1f}{stats['max']:>10.1f}"
+            base = (baseline or {}).get('modes', {}).get(mode, {}).get(metric)
+            if base and base['median']:
+                line += f"   {(stats['median'] / base['median'] - 1) * 100:+.0f}% vs baseline"
+            print(line)
+        for name, value in summary.get('warm_up_steps_ms', {}).items():
+            print(f"  warm_up.{name:<11}{value:>12.1f}")
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help="Liczba zimnych startów na tryb")
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--size', type=float, default=4, help="Rozdzielczość pliku testowego w Mpx")
+    parser.add_argument('--root', default=ROOT, help="Katalog mierzonej wersji aplikacji")
+    parser.add_argument('--json', dest='json_path')
+    parser.add_argument('--compare', help="Plik JSON z poprzedniego przebiegu")
+    args = parser.parse_args()
+    args.root = os.path.abspath(args.root)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    result = run_benchmark(args)
+    print_report(result, baseline)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
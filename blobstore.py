@@ -0,0 +1,213 @@
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+# Magazyn plików adresowany treścią: każda unikalna zawartość zapisana jest
+# raz, jako plik tylko do odczytu w katalogach dzielonych po prefiksie hasha
+# (ab/cd/abcd...). Pliki widoczne dla aplikacji (uploaded_files/<nazwa>,
+# katalogi paczek i zadań, clean_<nazwa>) są twardymi dowiązaniami do blobów,
+# więc powtórny upload tej samej treści nie zajmuje miejsca na dysku.
+
+CHUNK_SIZE = 1024 * 1024
+READ_ONLY = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+
+
+def _unlink(path):
+    try:
+        os.remove(path)
+    except PermissionError:
+        # Windows nie usuwa plików tylko do odczytu
+        os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+        os.remove(path)
+
+
+class BlobStore:
+    def __init__(self, root, shard_depth=2, shard_width=2):
+        self.root = root
+        self.shard_depth = shard_depth
+        self.shard_width = shard_width
+        self.temp_folder = os.path.join(root, 'tmp')
+        os.makedirs(self.temp_folder, exist_ok=True)
+        # Dowiązywanie i usuwanie blobów nie mogą się przeplatać - także
+        # między procesami (workery gunicorna dzielą magazyn)
+        self.lock = FileLock(os.path.join(root, '.lock'))
+        # Sprzątanie magazynu w jednym procesie naraz
+        self.gc_lock = FileLock(os.path.join(root, '.gc.lock'))
+
+    def path(self, sha256):
+        shards = [sha256[i * self.shard_width:(i + 1) * self.shard_width] for i in range(self.shard_depth)]
+        return os.path.join(self.root, *shards, sha256)
+
+    def exists(self, sha256):
+        return os.path.exists(self.path(sha256))
+
+    def size(self, sha256):
+        return os.path.getsize(self.path(sha256))
+
+    def put_file(self, source, sha256):
+        # Przenosi gotowy plik (o znanym hashu) do magazynu. Jeśli ta treść już
+        # tam jest, plik źródłowy jest usuwany. Zwraca (ścieżka, czy_nowy).
+        target = self.path(sha256)
+        if os.path.exists(target):
+            _unlink(source)
+            return target, False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.chmod(source, READ_ONLY)
+        os.replace(source, target)
+        return target, True
+
+    def write_temp(self, stream, head=b''):
+        # Zapis strumienia do pliku tymczasowego magazynu z liczeniem SHA-256
+        # w locie. Zwraca (sha256, ścieżka_tymczasowa) - do przekazania put_file.
+        digest = hashlib.sha256(head)
+        fd, temp_path = tempfile.mkstemp(dir=self.temp_folder)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(head)
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            _unlink(temp_path)
+            raise
+        return digest.hexdigest(), temp_path
+
+    def temp_path(self, suffix=''):
+        return os.path.join(self.temp_folder, uuid.uuid4().hex + suffix)
+
+    def link(self, sha256, linkpath):
+        # Podmienia linkpath na dowiązanie do bloba (atomowo - przez plik tymczasowy);
+        # gdy twarde dowiązanie jest niemożliwe (inny system plików, FAT), kopiuje
+        source = self.path(sha256)
+        if self.is_link(sha256, linkpath):
+            # rename() między dowiązaniami do tego samego pliku nic nie robi
+            return linkpath
+        os.makedirs(os.path.dirname(linkpath) or '.', exist_ok=True)
+        temp_path = f"{linkpath}.{uuid.uuid4().hex}.tmp"
+        link_or_copy(source, temp_path)
+        try:
+            os.replace(temp_path, linkpath)
+        except PermissionError:
+            _unlink(linkpath)
+            os.replace(temp_path, linkpath)
+        return linkpath
+
+    def is_link(self, sha256, linkpath):
+        try:
+            return os.path.samefile(self.path(sha256), linkpath)
+        except OSError:
+            return False
+
+    def remove(self, sha256):
+        path = self.path(sha256)
+        if os.path.exists(path):
+            _unlink(path)
+        # Puste katalogi shardów
+        folder = os.path.dirname(path)
+        for _ in range(self.shard_depth):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                break
+            folder = os.path.dirname(folder)
+
+
+class FileLock:
+    # Blokada na pliku wykluczająca wątki i procesy. Wątki czekają na
+    # threading.Lock, procesy na flock (na Windows msvcrt.locking).
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def acquire(self, blocking=True):
+        if not self._thread_lock.acquire(blocking):
+            return False
+        try:
+            f = open(self.path, 'a+b')
+            try:
+                if not _lock_file(f, blocking):
+                    f.close()
+                    self._thread_lock.release()
+                    return False
+            except BaseException:
+                f.close()
+                raise
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        self._file = f
+        return True
+
+    def release(self):
+        f, self._file = self._file, None
+        try:
+            _unlock_file(f)
+        finally:
+            f.close()
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def _lock_file(f, blocking):
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(0.05)
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def link_or_copy(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def remove_view(path):
+    if os.path.exists(path):
+        _unlink(path)
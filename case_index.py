@@ -0,0 +1,134 @@
+import math
+import re
+
+# Indeks metadanych sprawy: z rekordu MetadataRecord wyciągane są kluczowe
+# pola (aparat, numer seryjny, oprogramowanie, autor, daty, GPS) do typowanych
+# kolumn z indeksami oraz tekst wszystkich tagów do wyszukiwania pełnotekstowego
+# (FTS5). Korelacje ("które pliki mają ten sam numer seryjny / komórkę GPS /
+# autora") to GROUP BY po zaindeksowanej kolumnie, bez skanowania raportów.
+
+# Kolumna -> tagi w kolejności pierwszeństwa
+FIELD_TAGS = {
+    'make': ('Make', 'DeviceManufacturer'),
+    'model': ('Model', 'DeviceModel'),
+    'serial_number': ('SerialNumber', 'InternalSerialNumber', 'BodySerialNumber', 'CameraSerialNumber'),
+    'lens_model': ('LensModel', 'Lens', 'LensID'),
+    'software': ('Software', 'CreatorTool', 'Producer', 'Encoder', 'EncodedBy'),
+    'author': ('Artist', 'Author', 'Creator', 'By-line', 'OwnerName', 'LastModifiedBy'),
+    'taken_at': ('DateTimeOriginal', 'CreateDate', 'MediaCreateDate', 'CreationDate', 'Date'),
+    'modified_at': ('ModifyDate', 'MetadataDate'),
+}
+DATE_FIELDS = ('taken_at', 'modified_at')
+GPS_TAGS = ('GPSPosition', 'GPSCoordinates')
+MAX_VALUE_LENGTH = 255
+
+# Pola dostępne w korelacjach: nazwa w API -> kolumny
+CORRELATION_FIELDS = {
+    'serial': ('serial_number',),
+    'camera': ('make', 'model'),
+    'lens': ('lens_model',),
+    'software': ('software',),
+    'author': ('author',),
+    'gps': ('gps_cell',),
+    'sha256': ('sha256',),
+}
+
+_DATE = re.compile(r'^(\d{4})[:\-](\d{2})[:\-](\d{2})(?:[ T](\d{2}):(\d{2})(?::(\d{2}))?)?')
+_DMS = re.compile(r"""(\d+(?:\.\d+)?)\s*deg\s*(?:(\d+(?:\.\d+)?)'\s*)?(?:(\d+(?:\.\d+)?)"\s*)?([NSEW])?""")
+
+
+def clean_value(value):
+    if value is None:
+        return None
+    text = ' '.join(str(value).split())
+    if not text or text.lower() in ('unknown', 'none', 'n/a', '-'):
+        return None
+    return text[:MAX_VALUE_LENGTH]
+
+
+def normalize_date(value):
+    # "2023:05:17 10:22:41+02:00" -> "2023-05-17 10:22:41" (sortowalny tekst, czas lokalny zapisu)
+    match = _DATE.match(str(value or ''))
+    if not match:
+        return None
+    year, month, day, hour, minute, second = match.groups()
+    if year == '0000' or month == '00' or day == '00':
+        return None
+    return f"{year}-{month}-{day} {hour or '00'}:{minute or '00'}:{second or '00'}"
+
+
+def parse_coordinates(tag):
+    # Wartość surowa (-n) to "szer dł [wys]"; gdy jej brak - tekst "52 deg 13' 47.12" N, ..."
+    numbers = str(tag.raw).replace(',', ' ').split()
+    try:
+        lat, lon = float(numbers[0]), float(numbers[1])
+    except (IndexError, ValueError):
+        parts = _DMS.findall(str(tag.value))
+        if len(parts) < 2:
+            return None
+        coordinates = []
+        for degrees, minutes, seconds, ref in parts[:2]:
+            coordinate = float(degrees) + float(minutes or 0) / 60 + float(seconds or 0) / 3600
+            coordinates.append(-coordinate if ref in ('S', 'W') else coordinate)
+        lat, lon = coordinates
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or (lat == 0 and lon == 0):
+        return None
+    return lat, lon
+
+
+def gps_cell(lat, lon, size):
+    # Komórka siatki o boku `size` stopni (0.01° to ok. 1 km)
+    return f"{math.floor(lat / size)}:{math.floor(lon / size)}"
+
+
+def index_fields(record, cell_size):
+    fields = {}
+    for column, names in FIELD_TAGS.items():
+        value = None
+        for name in names:
+            tag = record.get(name)
+            if tag is not None and tag.group != 'System':
+                value = normalize_date(tag.value) if column in DATE_FIELDS else clean_value(tag.value)
+                if value:
+                    break
+        fields[column] = value
+    fields['gps_lat'] = fields['gps_lon'] = fields['gps_cell'] = None
+    for name in GPS_TAGS:
+        tag = record.get(name)
+        coordinates = parse_coordinates(tag) if tag is not None else None
+        if coordinates:
+            fields['gps_lat'], fields['gps_lon'] = coordinates
+            fields['gps_cell'] = gps_cell(*coordinates, cell_size)
+            break
+    return fields
+
+
+def document_text(record):
+    # Treść do FTS5: "Grupa:Tag wartość" dla każdego tagu poza grupą System
+    return '\n'.join(f"{tag.group}:{tag.tag} {tag.value}" for tag in record if tag.group != 'System')
+
+
+def date_bound(text, end=False):
+    # Granica zakresu dat z zapytania; sama data jako koniec zakresu obejmuje cały dzień
+    date = normalize_date(text)
+    if date is None:
+        raise ValueError(f"Nieprawidłowa data: {text}")
+    if end and len(text.strip()) <= 10:
+        date = date[:10] + ' 23:59:59'
+    return date
+
+
+def cell_center(cell, size):
+    lat_index, lon_index = (int(part) for part in cell.split(':'))
+    return [round((lat_index + 0.5) * size, 6), round((lon_index + 0.5) * size, 6)]
+
+
+def parse_bbox(text):
+    # "minSzer,minDł,maxSzer,maxDł"
+    try:
+        values = [float(part) for part in text.split(',')]
+    except ValueError:
+        raise ValueError("Nieprawidłowy obszar bbox.")
+    if len(values) != 4 or values[0] > values[2] or values[1] > values[3]:
+        raise ValueError("Obszar bbox musi mieć postać minSzer,minDł,maxSzer,maxDł.")
+    return values
@@ -0,0 +1,280 @@
+import atexit
+import itertools
+import queue
+import subprocess
+import threading
+import time
+
+# Pula długo działających procesów ExifTool w trybie -stay_open.
+# Każdy proces czyta argumenty z stdin (-@ -), a koniec polecenia oznaczamy
+# markerem -execute<N>, dzięki czemu odpowiedź można jednoznacznie przypisać
+# do zlecenia i nie płacimy za start interpretera Perla przy każdym żądaniu.
+
+
+class ExifToolError(Exception):
+    pass
+
+
+class ExifToolTimeout(ExifToolError):
+    pass
+
+
+def _pump(pipe, lines):
+    # Wątek czytający potok linia po linii (działa również na Windows,
+    # gdzie select() nie obsługuje potoków)
+    try:
+        for line in iter(pipe.readline, b''):
+            lines.put(line)
+    except (OSError, ValueError):
+        pass
+    finally:
+        lines.put(None)
+
+
+class ExifToolWorker:
+    def __init__(self, executable, common_args=None):
+        self.executable = executable
+        self.common_args = list(common_args or [])
+        self.process = None
+        self.last_used = 0.0
+        self.jobs_done = 0
+        self.restarts = -1
+        self._seq = itertools.count(1)
+
+    def start(self):
+        args = [self.executable, '-stay_open', 'True', '-@', '-']
+        if self.common_args:
+            args += ['-common_args'] + self.common_args
+        startupinfo = None
+        if hasattr(subprocess, 'STARTUPINFO'):
+            # Bez okna konsoli dla każdego procesu na Windows
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        self.process = subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            startupinfo=startupinfo
+        )
+        self._stdout = queue.Queue()
+        self._stderr = queue.Queue()
+        for pipe, lines in ((self.process.stdout, self._stdout), (self.process.stderr, self._stderr)):
+            threading.Thread(target=_pump, args=(pipe, lines), daemon=True).start()
+        self.last_used = time.monotonic()
+        self.restarts += 1
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self, timeout=5):
+        if self.process is None:
+            return
+        try:
+            if self.process.poll() is None:
+                self.process.stdin.write(b'-stay_open\nFalse\n')
+                self.process.stdin.flush()
+                self.process.wait(timeout=timeout)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            self.kill()
+        finally:
+            self.process = None
+
+    def kill(self):
+        if self.process is None:
+            return
+        try:
+            self.process.kill()
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        self.process = None
+
+    def restart(self):
+        self.kill()
+        self.start()
+
+    def _read_until(self, lines, is_marker, deadline):
+        collected = []
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ExifToolTimeout("Przekroczono limit czasu odpowiedzi ExifTool")
+            try:
+                line = lines.get(timeout=remaining)
+            except queue.Empty:
+                raise ExifToolTimeout("Przekroczono limit czasu odpowiedzi ExifTool")
+            if line is None:
+                raise ExifToolError("Proces ExifTool zakończył się nieoczekiwanie")
+            text = line.decode('utf-8', errors='replace').rstrip('\r\n')
+            if is_marker(text):
+                return collected, text
+            collected.append(text)
+
+    def execute(self, args, timeout):
+        for arg in args:
+            if '\n' in arg or '\r' in arg:
+                raise ValueError("Argumenty ExifTool nie mogą zawierać znaków nowej linii")
+        if not self.alive():
+            self.restart()
+        seq = next(self._seq)
+        ready = f'{{ready{seq}}}'
+        post = f'=post{seq}'
+        command = list(args) + ['-echo4', f'=${{status}}{post}', f'-execute{seq}']
+        self.process.stdin.write(('\n'.join(command) + '\n').encode('utf-8'))
+        self.process.stdin.flush()
+
+        deadline = time.monotonic() + timeout
+        out, _ = self._read_until(self._stdout, lambda text: text == ready, deadline)
+        err, marker = self._read_until(self._stderr, lambda text: text.endswith(post), deadline)
+
+        # ${status} jest dostępny od ExifTool 12.10, dla starszych wersji
+        # wnioskujemy kod wyjścia z komunikatów błędów
+        status = marker[1:-len(post)]
+        if status.isdigit():
+            returncode = int(status)
+        else:
+            returncode = 1 if any(line.startswith('Error') for line in err) else 0
+
+        self.last_used = time.monotonic()
+        self.jobs_done += 1
+        stdout = '\n'.join(out) + ('\n' if out else '')
+        stderr = '\n'.join(err) + ('\n' if err else '')
+        return subprocess.CompletedProcess([self.executable] + list(args), returncode, stdout, stderr)
+
+
+class ExifToolPool:
+    def __init__(self, executable, size=2, timeout=60, health_interval=30, common_args=None):
+        self.executable = executable
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self.common_args = common_args if common_args is not None else ['-charset', 'filename=utf8']
+        self._workers = []
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stopped = threading.Event()
+        self._health_thread = None
+        atexit.register(self.close)
+
+    def _checkout(self):
+        if self._closed:
+            raise ExifToolError("Pula ExifTool została zamknięta")
+        # Procesy tworzymy leniwie, aż do rozmiaru puli
+        with self._lock:
+            if self._idle.empty() and len(self._workers) < self.size:
+                worker = ExifToolWorker(self.executable, self.common_args)
+                worker.start()
+                self._workers.append(worker)
+                return worker
+        worker = self._idle.get()
+        if not worker.alive():
+            worker.restart()
+        elif time.monotonic() - worker.last_used > self.health_interval:
+            self._ensure_healthy(worker)
+        return worker
+
+    def warm_up(self, count=None):
+        # Uruchamia procesy z wyprzedzeniem (np. przy starcie workera serwera),
+        # żeby pierwsze żądania nie czekały na start Perla. Zwraca liczbę procesów.
+        with self._lock:
+            started = []
+            while len(self._workers) < min(count or self.size, self.size):
+                worker = ExifToolWorker(self.executable, self.common_args)
+                worker.start()
+                self._workers.append(worker)
+                started.append(worker)
+        # Procesy startują równolegle; -ver czeka, aż każdy będzie gotowy
+        for worker in started:
+            self._ensure_healthy(worker)
+            self._idle.put(worker)
+        return len(self._workers)
+
+    def _checkin(self, worker):
+        if self._closed:
+            worker.stop()
+        else:
+            self._idle.put(worker)
+
+    def _ensure_healthy(self, worker):
+        try:
+            result = worker.execute(['-ver'], timeout=min(self.timeout, 10))
+            if result.returncode != 0 or not result.stdout.strip():
+                worker.restart()
+        except (ExifToolError, OSError, ValueError):
+            worker.restart()
+
+    def execute(self, args, timeout=None):
+        timeout = timeout or self.timeout
+        worker = self._checkout()
+        try:
+            try:
+                return worker.execute(args, timeout)
+            except ExifToolTimeout:
+                # Zawieszony proces zabijamy, żeby nie blokował kolejnych zleceń
+                worker.restart()
+                raise
+            except (ExifToolError, OSError):
+                # Proces padł w trakcie pracy - restart i jedna ponowna próba
+                worker.restart()
+                return worker.execute(args, timeout)
+        finally:
+            self._checkin(worker)
+
+    def health_check(self):
+        # Bezczynne procesy: martwe są restartowane, nieużywane dłużej niż
+        # health_interval sprawdzane przez -ver. Zwraca liczbę sprawdzonych.
+        checked = []
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if not worker.alive():
+                worker.restart()
+            elif time.monotonic() - worker.last_used > self.health_interval:
+                self._ensure_healthy(worker)
+            checked.append(worker)
+        for worker in checked:
+            self._idle.put(worker)
+        return len(checked)
+
+    def start_health_checks(self):
+        # Wątek w tle wywołujący health_check() co health_interval, żeby zawieszony
+        # lub martwy proces nie czekał na pierwsze żądanie. False, gdy już działa.
+        with self._lock:
+            if self._health_thread is not None or self._closed or not self.health_interval:
+                return False
+            self._health_thread = threading.Thread(target=self._health_loop, name="exiftool-health", daemon=True)
+            self._health_thread.start()
+            return True
+
+    def _health_loop(self):
+        while not self._stopped.wait(self.health_interval):
+            try:
+                self.health_check()
+            except Exception as e:
+                print(f"Błąd podczas sprawdzania procesów ExifTool: {e}")
+
+    def stats(self):
+        with self._lock:
+            workers = list(self._workers)
+        return {
+            'size': self.size,
+            'started': len(workers),
+            'idle': self._idle.qsize(),
+            'alive': sum(1 for worker in workers if worker.alive()),
+            'jobs_done': sum(worker.jobs_done for worker in workers),
+            'restarts': sum(max(worker.restarts, 0) for worker in workers),
+        }
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._stopped.set()
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            worker.stop()
@@ -0,0 +1,49 @@
+import os
+import time
+
+# Tryb produkcyjny: gunicorn -c gunicorn.conf.py
+# Aplikacja (wsgi.py -> create_app) ładowana jest raz w procesie głównym
+# (preload_app), a workery powstają przez fork i dzielą jej strony pamięci.
+# Każdy worker po fork otwiera własne połączenia z bazą i rozgrzewa pulę
+# ExifTool oraz silnik analizy (app.warm_up), zanim przyjmie pierwsze żądanie.
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('LOAD_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('LOAD_WORKERS', min(os.cpu_count() or 1, 4)))
+# Wątki w workerze: uploady i ExifTool to głównie czekanie na I/O
+worker_class = 'gthread'
+threads = int(os.environ.get('LOAD_THREADS', 4))
+# Długie analizy (duże wideo, paczki) mieszczą się w limicie żądania
+timeout = int(os.environ.get('LOAD_TIMEOUT', 300))
+graceful_timeout = 30
+preload_app = True
+# Okresowa wymiana workerów (wycieki pamięci w bibliotekach natywnych)
+max_requests = int(os.environ.get('LOAD_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+# Wspólny dla wszystkich workerów czas startu serwera - zadania 'running'
+# sprzed niego zostały przerwane restartem i wracają do kolejki
+os.environ['LOAD_SERVER_STARTED'] = str(time.time())
+
+# Metryki workerów sumowane przez /metrics (metrics.MultiProcessMetrics)
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(
+    os.environ.get('INSTANCE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')), 'metrics'))
+
+
+def on_starting(server):
+    # Pliki metryk z poprzedniego uruchomienia serwera
+    from metrics import MultiProcessMetrics
+
+    MultiProcessMetrics(os.environ['PROMETHEUS_MULTIPROC_DIR']).clear()
+
+
+def on_reload(server):
+    os.environ['LOAD_SERVER_STARTED'] = str(time.time())
+
+
+def post_fork(server, worker):
+    from app import warm_up
+
+    timings = warm_up()
+    server.log.info("Worker %s rozgrzany: %s", worker.pid,
+                    ', '.join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items()))
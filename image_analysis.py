@@ -0,0 +1,368 @@
+import os
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+# Silnik analizy pochodzenia obrazu.
+# Zamiast pełnej rozdzielczości w kolorze obraz dekodowany jest od razu
+# w skali szarości i w zmniejszonej rozdzielczości (IMREAD_REDUCED_GRAYSCALE_*,
+# dla JPEG skalowanie odbywa się już w dekoderze DCT), a Laplasjan i Canny
+# liczone są kafelkami, więc szczytowe zużycie pamięci nie rośnie z rozmiarem zdjęcia.
+
+VERDICT_AI = "Obraz prawdopodobnie wygenerowany przez AI."
+VERDICT_HUMAN = "Obraz wygląda na wykonany przez człowieka."
+# Próg wariancji Laplasjanu w skali pełnej rozdzielczości (jak w pierwotnej
+# wersji); wynik z obrazu zmniejszonego N razy dzielony jest przez N
+BLUR_THRESHOLD = 100
+EDGE_DENSITY_THRESHOLD = 0.3
+
+# Docelowa liczba pikseli po zmniejszeniu (ok. 4 Mpx)
+MAX_PIXELS = 4_000_000
+TILE_SIZE = 1024
+# Zakładka między kafelkami - Laplasjan potrzebuje 1 px, Canny (Sobel + NMS) kilku
+TILE_MARGIN = 8
+
+# Wideo: liczba próbkowanych klatek, maks. rozmiar klatki do analizy
+# i odległość (w klatkach), od której zamiast grab() wykonywany jest seek
+VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
+VIDEO_SAMPLES = 24
+VIDEO_FRAME_PIXELS = 1_000_000
+VIDEO_SEEK_THRESHOLD = 48
+
+REDUCED_GRAYSCALE = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+
+
+# TIFF: znaczniki ImageWidth/ImageLength i formaty ich wartości (SHORT, LONG, LONG8)
+TIFF_IMAGE_WIDTH = 256
+TIFF_IMAGE_LENGTH = 257
+TIFF_VALUE_FORMATS = {3: 'H', 4: 'I', 16: 'Q'}
+
+
+def tiff_dimensions(f, head):
+    # Wymiary z pierwszego IFD (klasyczny TIFF i BigTIFF)
+    order = '<' if head[:2] == b'II' else '>'
+    version = struct.unpack(order + 'H', head[2:4])[0]
+    if version == 42:
+        offset = struct.unpack(order + 'I', head[4:8])[0]
+        count_format, entry_format = 'H', 'HHI4s'
+    elif version == 43:
+        offset = struct.unpack(order + 'Q', head[8:16])[0]
+        count_format, entry_format = 'Q', 'HHQ8s'
+    else:
+        return None
+    f.seek(offset)
+    count = struct.unpack(order + count_format, f.read(struct.calcsize(count_format)))[0]
+    entry_size = struct.calcsize(order + entry_format)
+    entries = f.read(min(count, 4096) * entry_size)
+    dimensions = {}
+    for start in range(0, len(entries) - entry_size + 1, entry_size):
+        tag, kind, _, value = struct.unpack(order + entry_format, entries[start:start + entry_size])
+        if tag in (TIFF_IMAGE_WIDTH, TIFF_IMAGE_LENGTH) and kind in TIFF_VALUE_FORMATS:
+            # Wartość mieszcząca się w polu zapisana jest od jego początku
+            value_format = TIFF_VALUE_FORMATS[kind]
+            dimensions[tag] = struct.unpack(order + value_format, value[:struct.calcsize(value_format)])[0]
+    if TIFF_IMAGE_WIDTH in dimensions and TIFF_IMAGE_LENGTH in dimensions:
+        return dimensions[TIFF_IMAGE_WIDTH], dimensions[TIFF_IMAGE_LENGTH]
+    return None
+
+
+def image_dimensions(filepath):
+    # Odczyt wymiarów z nagłówka (JPEG/PNG/TIFF) bez dekodowania obrazu
+    try:
+        with open(filepath, 'rb') as f:
+            head = f.read(26)
+            if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+                return struct.unpack('>II', head[16:24])
+            if head[:2] in (b'II', b'MM'):
+                return tiff_dimensions(f, head)
+            if not head.startswith(b'\xff\xd8'):
+                return None
+            f.seek(2)
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    return None
+                code = marker[1]
+                if code == 0xFF:
+                    f.seek(-1, os.SEEK_CUR)
+                    continue
+                if code in (0x01, 0xD8) or 0xD0 <= code <= 0xD7:
+                    continue
+                length = struct.unpack('>H', f.read(2))[0]
+                if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+                    height, width = struct.unpack('>xHH', f.read(5))
+                    return width, height
+                f.seek(length - 2, os.SEEK_CUR)
+    except (OSError, struct.error):
+        return None
+
+
+def reduction_factor(filepath, max_pixels=MAX_PIXELS):
+    dimensions = image_dimensions(filepath)
+    if dimensions:
+        pixels = dimensions[0] * dimensions[1]
+    else:
+        # Dla innych formatów szacujemy z rozmiaru pliku (ok. 3 bajty na piksel)
+        pixels = os.path.getsize(filepath) // 3
+    for factor in (1, 2, 4):
+        if pixels / (factor * factor) <= max_pixels:
+            return factor
+    return 8
+
+
+def decode_gray(filepath, max_pixels=MAX_PIXELS):
+    factor = reduction_factor(filepath, max_pixels) if max_pixels else 1
+    return cv2.imread(filepath, REDUCED_GRAYSCALE[factor]), factor
+
+
+def tiled_scores(gray, tile=TILE_SIZE, margin=TILE_MARGIN):
+    # Wariancja Laplasjanu składana z sum i sum kwadratów poszczególnych kafelków
+    height, width = gray.shape[:2]
+    count = 0
+    total = 0.0
+    total_sq = 0.0
+    edge_pixels = 0
+    for y in range(0, height, tile):
+        for x in range(0, width, tile):
+            y0, x0 = max(y - margin, 0), max(x - margin, 0)
+            y1, x1 = min(y + tile + margin, height), min(x + tile + margin, width)
+            th, tw = min(tile, height - y), min(tile, width - x)
+            window = gray[y0:y1, x0:x1]
+            inner = (slice(y - y0, y - y0 + th), slice(x - x0, x - x0 + tw))
+
+            laplacian = cv2.Laplacian(window, cv2.CV_32F)[inner]
+            mean, std = cv2.meanStdDev(laplacian)
+            n = th * tw
+            count += n
+            total += float(mean[0, 0]) * n
+            total_sq += (float(std[0, 0]) ** 2 + float(mean[0, 0]) ** 2) * n
+
+            edges = cv2.Canny(window, 100, 200)[inner]
+            edge_pixels += cv2.countNonZero(edges)
+    mean = total / count
+    blur = total_sq / count - mean * mean
+    # Ta sama skala co w pierwotnej wersji: suma wartości krawędzi (255) na piksel
+    edge_density = edge_pixels * 255 / count
+    return blur, edge_density
+
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def perceptual_hashes(gray):
+    # 64-bitowe skróty percepcyjne z już zdekodowanego obrazu w skali szarości:
+    # aHash (8x8 względem średniej), dHash (różnice sąsiednich kolumn 9x8)
+    # i pHash (znak niskich częstotliwości DCT 32x32 względem mediany)
+    small = cv2.resize(gray, (8, 8), interpolation=cv2.INTER_AREA).astype(np.float32)
+    wide = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    dct = cv2.dct(cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32))[:8, :8]
+    return {
+        'ahash': _bits_to_int(small > small.mean()),
+        'dhash': _bits_to_int(wide[:, 1:] > wide[:, :-1]),
+        'phash': _bits_to_int(dct > np.median(dct.ravel()[1:])),
+    }
+
+
+def origin_scores(filepath, max_pixels=MAX_PIXELS):
+    gray, factor = decode_gray(filepath, max_pixels)
+    if gray is None:
+        return None
+    blur, edge_density = tiled_scores(gray)
+    return {
+        'blur': full_resolution_blur(blur, factor),
+        'edge_density': edge_density,
+        'width': gray.shape[1],
+        'height': gray.shape[0],
+        'reduction': factor,
+        'hashes': perceptual_hashes(gray),
+    }
+
+
+def full_resolution_blur(blur, factor):
+    # Zmniejszenie wyostrza obraz w jednostkach pikseli, więc wariancja Laplasjanu
+    # rośnie z krotnością zmniejszenia (dla zdjęć ok. 2,5x przy 2x, 3,5-5x przy 4x).
+    # Dzielenie przez krotność sprowadza wynik w okolice skali pełnej rozdzielczości
+    # i usuwa skok wyniku na granicach przedziałów REDUCED_GRAYSCALE.
+    return blur / factor
+
+
+def verdict(scores):
+    if scores['blur'] < BLUR_THRESHOLD or scores['edge_density'] > EDGE_DENSITY_THRESHOLD:
+        return VERDICT_AI
+    return VERDICT_HUMAN
+
+
+class RunningStats:
+    # Średnia i wariancja liczone przyrostowo (Welford) - stała pamięć niezależnie od liczby klatek
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    def to_dict(self):
+        return {
+            'mean': self.mean,
+            'std': (self.m2 / self.count) ** 0.5 if self.count else 0.0,
+            'min': self.minimum,
+            'max': self.maximum,
+        }
+
+
+def frame_to_gray(frame, max_pixels=VIDEO_FRAME_PIXELS):
+    # (klatka w skali szarości, krotność zmniejszenia)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    height, width = gray.shape[:2]
+    if height * width <= max_pixels:
+        return gray, 1
+    scale = (max_pixels / (height * width)) ** 0.5
+    gray = cv2.resize(gray, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+    return gray, 1 / scale
+
+
+def sample_video_frames(filepath, samples=VIDEO_SAMPLES):
+    # Zwraca kolejne próbkowane klatki (numer, klatka). Klatki pomiędzy próbkami
+    # przy dużym kroku są pomijane przez seek, a przy małym przez grab()
+    # bez konwersji do obrazu (retrieve() tylko dla próbek).
+    capture = cv2.VideoCapture(filepath)
+    try:
+        if not capture.isOpened():
+            return
+        total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        if total > 0:
+            step = total / samples
+            targets = sorted({min(total - 1, int((index + 0.5) * step)) for index in range(samples)})
+        else:
+            # Nieznana liczba klatek (np. uszkodzony indeks) - co sekundę
+            fps = capture.get(cv2.CAP_PROP_FPS) or 25
+            targets = [int(index * fps) for index in range(samples)]
+        position = 0
+        for target in targets:
+            if target - position > VIDEO_SEEK_THRESHOLD:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, target)
+                position = target
+            while position < target:
+                if not capture.grab():
+                    return
+                position += 1
+            if not capture.grab():
+                return
+            position += 1
+            ok, frame = capture.retrieve()
+            if ok and frame is not None:
+                yield target, frame
+    finally:
+        capture.release()
+
+
+def video_origin_scores(filepath, samples=VIDEO_SAMPLES):
+    blur, edges = RunningStats(), RunningStats()
+    flagged = 0
+    for _, frame in sample_video_frames(filepath, samples):
+        gray, factor = frame_to_gray(frame)
+        frame_blur, frame_edges = tiled_scores(gray)
+        frame_blur = full_resolution_blur(frame_blur, factor)
+        blur.add(frame_blur)
+        edges.add(frame_edges)
+        if verdict({'blur': frame_blur, 'edge_density': frame_edges}) == VERDICT_AI:
+            flagged += 1
+    if not blur.count:
+        return None
+    return {'frames': blur.count, 'flagged': flagged, 'blur': blur.to_dict(), 'edge_density': edges.to_dict()}
+
+
+def analyze_video_origin(filepath, samples=VIDEO_SAMPLES):
+    try:
+        scores = video_origin_scores(filepath, samples)
+        if scores is None:
+            return "Nie udało się wczytać wideo."
+        share = scores['flagged'] / scores['frames']
+        if share > 0.5:
+            result = "Wideo prawdopodobnie wygenerowane przez AI."
+        else:
+            result = "Wideo wygląda na nagrane przez człowieka."
+        return f"{result} (przeanalizowano klatek: {scores['frames']}, oznaczonych jako AI: {share:.0%})"
+    except Exception as e:
+        return f"Błąd analizy wideo: {e}"
+
+
+def analyze_image(filepath):
+    # Werdykt i skróty percepcyjne z jednego dekodowania: (werdykt, skróty albo None)
+    if os.path.splitext(filepath)[1].lower().lstrip('.') in VIDEO_EXTENSIONS:
+        return analyze_video_origin(filepath), None
+    try:
+        scores = origin_scores(filepath)
+        if scores is None:
+            return "Nie udało się wczytać obrazu.", None
+        return verdict(scores), scores['hashes']
+    except Exception as e:
+        return f"Błąd analizy obrazu: {e}", None
+
+
+def analyze_image_origin(filepath):
+    return analyze_image(filepath)[0]
+
+
+def warm_up():
+    # Pierwsze wywołania OpenCV ładują biblioteki i inicjalizują pulę wątków -
+    # wykonywane przy starcie workera zamiast przy pierwszym żądaniu
+    gray = np.zeros((64, 64), dtype=np.uint8)
+    gray[16:48, 16:48] = 255
+    tiled_scores(gray)
+    perceptual_hashes(gray)
+
+
+def _init_worker():
+    # Każdy proces liczy jeden obraz naraz - bez wewnętrznych wątków OpenCV
+    cv2.setNumThreads(1)
+
+
+def get_executor(workers=None):
+    # Jedna pula na proces; blokada chroni przed utworzeniem dwóch pul
+    # przez równoczesne pierwsze żądania
+    global _executor, _executor_workers
+    workers = workers or os.cpu_count() or 1
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+            _executor_workers = workers
+        return _executor
+
+
+def analyze_many(paths, workers=None, hashes=False):
+    # Wyniki dla wielu obrazów liczone w puli procesów: {ścieżka: werdykt},
+    # a z hashes=True {ścieżka: (werdykt, skróty percepcyjne)}
+    paths = list(paths)
+    function = analyze_image if hashes else analyze_image_origin
+    if not paths:
+        return {}
+    if len(paths) == 1:
+        return {paths[0]: function(paths[0])}
+    workers = workers or os.cpu_count() or 1
+    executor = get_executor(workers)
+    chunksize = max(1, len(paths) // (workers * 4))
+    return dict(zip(paths, executor.map(function, paths, chunksize=chunksize)))
@@ -0,0 +1,72 @@
+import queue
+import threading
+import traceback
+
+# Ograniczona pula wątków wykonujących długie analizy w tle.
+# Kolejka ma stały rozmiar - gdy jest pełna, submit() zgłasza QueueFull,
+# a endpoint odpowiada 503 zamiast przyjmować kolejne pliki bez końca.
+# Stan zadań trzyma wywołujący (tabela w bazie), tutaj krążą tylko ID.
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobRunner:
+    def __init__(self, handler, workers=2, max_pending=100):
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self._queue = queue.Queue(maxsize=max(1, int(max_pending)))
+        self._threads = []
+        self._lock = threading.Lock()
+        self._active = 0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return False
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._loop, name=f"job-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            return True
+
+    def submit(self, job_id, block=False, timeout=None):
+        self.start()
+        try:
+            self._queue.put(job_id, block=block, timeout=timeout)
+        except queue.Full:
+            raise QueueFull("Kolejka zadań jest pełna")
+
+    def _loop(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                self._queue.task_done()
+                return
+            with self._lock:
+                self._active += 1
+            try:
+                self.handler(job_id)
+            except Exception:
+                print(f"Błąd zadania {job_id}:\n{traceback.format_exc()}")
+            finally:
+                with self._lock:
+                    self._active -= 1
+                self._queue.task_done()
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'pending': self._queue.qsize(),
+            'capacity': self._queue.maxsize,
+            'active': self._active,
+        }
+
+    def stop(self):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join(timeout=5)
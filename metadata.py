@@ -0,0 +1,164 @@
+import json
+import os
+from collections import namedtuple
+from datetime import datetime
+
+# Ustrukturyzowany rekord metadanych budowany raz na plik z wyjścia
+# `exiftool -j -G1 -l` i współdzielony przez szablony, raporty TXT/PDF
+# oraz wybór kategorii w narzędziach metadanych.
+
+EXIFTOOL_JSON_ARGS = ["-j", "-G1", "-l"]
+
+# Profile odczytu. "quick" służy do pierwszego wyświetlenia raportu: -fast2
+# pomija MakerNotes, podglądy i przeszukiwanie końca pliku (np. atomów mdat
+# w dużych wideo), a odczyt ograniczony jest do najważniejszych tagów.
+# "full" zwraca komplet tagów i doczytywany jest dopiero, gdy jest potrzebny.
+PROFILE_QUICK = 'quick'
+PROFILE_FULL = 'full'
+PROFILE_ARGS = {
+    PROFILE_QUICK: ["-fast2"],
+    PROFILE_FULL: [],
+}
+QUICK_TAGS = (
+    'FileType', 'MIMEType', 'ImageSize', 'Megapixels', 'Orientation',
+    'Make', 'Model', 'LensModel', 'SerialNumber', 'Software', 'CreatorTool', 'Producer', 'Encoder',
+    'Artist', 'Author', 'Creator', 'Copyright', 'Title', 'Description', 'Comment',
+    'DateTimeOriginal', 'CreateDate', 'ModifyDate', 'MediaCreateDate',
+    'Duration', 'VideoFrameRate', 'CompressorName', 'AudioFormat', 'PageCount',
+    'GPS:all', 'GPSCoordinates', 'GPSPosition',
+)
+# Typy, dla których domyślny jest szybki odczyt (duże pliki, kosztowne skanowanie)
+QUICK_EXTENSIONS = ('mp4', 'mov', 'mkv', 'avi', 'tiff', 'wav', 'flac')
+
+
+def profile_args(profile, tags=None):
+    tags = tags or (QUICK_TAGS if profile == PROFILE_QUICK else ())
+    return PROFILE_ARGS[profile] + [f"-{tag}" for tag in tags]
+
+# group - grupa ExifTool (rodzina 1, np. IFD0, ExifIFD, XMP-dc)
+# tag   - nazwa tagu (np. Make)
+# desc  - opis do wyświetlenia (np. Camera Model Name)
+# raw   - wartość surowa (-n), liczba lub tekst
+# value - wartość czytelna (print conversion)
+MetadataTag = namedtuple('MetadataTag', ['group', 'tag', 'desc', 'raw', 'value'])
+
+
+def _printable(value):
+    if isinstance(value, list):
+        return ', '.join(_printable(item) for item in value)
+    if isinstance(value, bool):
+        return 'True' if value else 'False'
+    return str(value)
+
+
+class MetadataRecord:
+    def __init__(self, tags=None):
+        self.tags = list(tags or [])
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __iter__(self):
+        return iter(self.tags)
+
+    @classmethod
+    def from_exiftool_item(cls, item):
+        tags = []
+        for key, entry in item.items():
+            if key == 'SourceFile':
+                continue
+            group, _, tag = key.rpartition(':')
+            if isinstance(entry, dict):
+                value = entry.get('val')
+                raw = entry.get('num', value)
+                desc = entry.get('desc') or tag
+            else:
+                value = raw = entry
+                desc = tag
+            tags.append(MetadataTag(group, tag, desc, raw, _printable(value)))
+        return cls(tags)
+
+    @classmethod
+    def from_exiftool_json(cls, text):
+        items = json.loads(text) if text.strip() else []
+        return cls.from_exiftool_item(items[0]) if items else cls()
+
+    def to_rows(self):
+        # Zwarta postać do zapisu w cache / bazie
+        return [list(tag) for tag in self.tags]
+
+    @classmethod
+    def from_rows(cls, rows):
+        return cls(MetadataTag(*row) for row in rows)
+
+    def to_json(self):
+        return json.dumps(self.to_rows(), ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_rows(json.loads(text))
+
+    def __add__(self, other):
+        return MetadataRecord(self.tags + list(other))
+
+    def groups(self):
+        seen = []
+        for tag in self.tags:
+            if tag.group and tag.group not in seen:
+                seen.append(tag.group)
+        return seen
+
+    def by_group(self):
+        grouped = {}
+        for tag in self.tags:
+            grouped.setdefault(tag.group, []).append(tag)
+        return grouped
+
+    def select(self, groups=None, tags=None):
+        groups = set(groups) if groups else None
+        tags = set(tags) if tags else None
+        return MetadataRecord(
+            tag for tag in self.tags
+            if (groups is None or tag.group in groups)
+            and (tags is None or tag.tag in tags or f"{tag.group}:{tag.tag}" in tags)
+        )
+
+    def get(self, name, default=None):
+        # name w postaci "Tag" lub "Grupa:Tag"
+        group, _, tag = name.rpartition(':')
+        for item in self.tags:
+            if item.tag == tag and (not group or item.group == group):
+                return item
+        return default
+
+    def lines(self):
+        # Format zgodny z domyślnym wyjściem tekstowym ExifTool
+        return [f"{tag.desc:<32}: {tag.value}" for tag in self.tags]
+
+
+def parse_exiftool_json(text):
+    # Wynik dla wielu plików naraz: {SourceFile: MetadataRecord}
+    items = json.loads(text) if text.strip() else []
+    return {item.get('SourceFile'): MetadataRecord.from_exiftool_item(item) for item in items}
+
+
+def format_file_size(size):
+    for unit in ('bytes', 'kB', 'MB', 'GB'):
+        if size < 2000 or unit == 'GB':
+            return f"{size} {unit}" if unit == 'bytes' else f"{size:.1f} {unit}"
+        size /= 1000
+
+
+def system_tags(filepath):
+    # Tagi grupy System zależą od ścieżki, a nie od treści pliku,
+    # więc nie trafiają do cache i są liczone przy każdym odczycie
+    stat = os.stat(filepath)
+    modified = datetime.fromtimestamp(stat.st_mtime).astimezone()
+    offset = modified.strftime('%z')
+    modified_text = modified.strftime('%Y:%m:%d %H:%M:%S') + f"{offset[:3]}:{offset[3:]}"
+    return MetadataRecord([
+        MetadataTag('System', 'FileName', 'File Name', os.path.basename(filepath), os.path.basename(filepath)),
+        MetadataTag('System', 'Directory', 'Directory', os.path.dirname(filepath) or '.', os.path.dirname(filepath) or '.'),
+        MetadataTag('System', 'FileSize', 'File Size', stat.st_size, format_file_size(stat.st_size)),
+        MetadataTag('System', 'FileModifyDate', 'File Modification Date/Time', modified_text, modified_text),
+    ])
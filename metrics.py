@@ -0,0 +1,346 @@
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request, template_rendered, before_render_template
+
+# Pomiary czasu etapów (zapis pliku, ExifTool, analiza obrazu, zapis wyniku,
+# renderowanie szablonu) w histogramach w formacie Prometheus, log wolnych
+# żądań z rozbiciem na etapy oraz opcjonalny profiler próbkujący.
+# Metryki są per proces; przy kilku procesach (gunicorn) z ustawionym
+# PROMETHEUS_MULTIPROC_DIR każdy proces zapisuje tam co METRICS_FLUSH_INTERVAL
+# stan swoich histogramów i gauge'y per proces, a /metrics sumuje pliki
+# wszystkich procesów - wynik nie zależy od tego, który worker odpowiedział.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list(extra or [])
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def snapshot(self):
+        # {etykiety: [liczniki kubełków, liczba, suma]}
+        with self._lock:
+            return {key: [list(series[0]), series[1], series[2]] for key, series in self._series.items()}
+
+    def render(self, series=None):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        if series is None:
+            series = self.snapshot()
+        for key, (counts, count, total) in sorted(series.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', repr(bound))])} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Gauge:
+    # Wartość odczytywana w chwili zbierania metryk: fn() -> liczba lub {etykieta: liczba};
+    # per_process - stan tego procesu (np. pula ExifTool), w trybie wieloprocesowym
+    # sumowany po działających procesach, a nie wspólny (np. zawartość bazy)
+    def __init__(self, name, help_text, fn, labelname=None, per_process=False):
+        self.name = name
+        self.help_text = help_text
+        self.fn = fn
+        self.labelname = labelname
+        self.per_process = per_process
+
+    def value(self):
+        try:
+            return self.fn()
+        except Exception:
+            return None
+
+    def render(self, value=None):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        if value is None:
+            value = self.value()
+        if value is None:
+            return lines
+        if isinstance(value, dict):
+            for label, item in sorted(value.items()):
+                lines.append(f"{self.name}{_format_labels((self.labelname,), (label,))} {item}")
+        else:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+REGISTRY = []
+
+STAGE_SECONDS = Histogram('load_stage_seconds', "Czas etapów przetwarzania żądania.", ('stage',))
+REQUEST_SECONDS = Histogram('load_request_seconds', "Czas obsługi żądań HTTP.", ('endpoint', 'method', 'status'))
+REGISTRY.extend([STAGE_SECONDS, REQUEST_SECONDS])
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render_metrics():
+    if multiprocess is not None:
+        return multiprocess.render()
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def _process_alive(pid):
+    if os.name == 'nt':
+        # os.kill(pid, 0) wysłałby na Windows CTRL_C_EVENT
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class MultiProcessMetrics:
+    # Pliki metrics_<pid>.json w folder. Histogramy procesów, które się zakończyły,
+    # zostają w sumie (liczniki nie maleją po wymianie workera); katalog czyści
+    # gunicorn przy starcie serwera (clear()).
+    def __init__(self, folder, interval=1.0):
+        self.folder = folder
+        self.interval = interval
+        self.pid = None
+        self._lock = threading.Lock()
+
+    def path(self, pid):
+        return os.path.join(self.folder, f"metrics_{pid}.json")
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self.folder, 'metrics_*.json')):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def ensure_started(self):
+        # Wątek zapisu w każdym procesie osobno - po fork wątki procesu głównego nie istnieją
+        if self.pid == os.getpid():
+            return
+        with self._lock:
+            if self.pid == os.getpid():
+                return
+            os.makedirs(self.folder, exist_ok=True)
+            self.pid = os.getpid()
+            threading.Thread(target=self._run, name="metrics-flush", daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def flush(self):
+        data = {
+            'histograms': {metric.name: [[list(key)] + series for key, series in metric.snapshot().items()]
+                           for metric in REGISTRY if isinstance(metric, Histogram)},
+            'gauges': {metric.name: metric.value() for metric in REGISTRY if isinstance(metric, Gauge) and metric.per_process},
+        }
+        path = self.path(os.getpid())
+        with self._lock:
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(path + '.tmp', path)
+
+    def collect(self):
+        histograms, gauges = {}, {}
+        for path in glob.glob(os.path.join(self.folder, 'metrics_*.json')):
+            try:
+                pid = int(os.path.basename(path)[len('metrics_'):-len('.json')])
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, items in data.get('histograms', {}).items():
+                merged = histograms.setdefault(name, {})
+                for key, counts, count, total in items:
+                    series = merged.setdefault(tuple(key), [[0] * len(counts), 0, 0.0])
+                    series[0] = [a + b for a, b in zip(series[0], counts)]
+                    series[1] += count
+                    series[2] += total
+            if pid != os.getpid() and not _process_alive(pid):
+                continue
+            for name, value in data.get('gauges', {}).items():
+                if isinstance(value, dict):
+                    merged = gauges.setdefault(name, {})
+                    for label, item in value.items():
+                        merged[label] = merged.get(label, 0) + item
+                elif value is not None:
+                    gauges[name] = gauges.get(name, 0) + value
+        return histograms, gauges
+
+    def render(self):
+        self.ensure_started()
+        self.flush()
+        histograms, gauges = self.collect()
+        lines = []
+        for metric in REGISTRY:
+            if isinstance(metric, Histogram):
+                lines.extend(metric.render(histograms.get(metric.name, {})))
+            elif isinstance(metric, Gauge) and metric.per_process:
+                lines.extend(metric.render(gauges.get(metric.name, {})))
+            else:
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+multiprocess = None
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def record_stage(name, elapsed):
+    STAGE_SECONDS.observe(elapsed, stage=name)
+    if has_request_context():
+        # Etapy powtarzane w jednym żądaniu (np. paczka plików) są sumowane
+        stages = g.setdefault('stages', {})
+        stages[name] = stages.get(name, 0.0) + elapsed
+
+
+class SamplingProfiler:
+    # Próbkuje stos wskazanego wątku co `interval` sekund przez sys._current_frames();
+    # wynik w formacie "collapsed stacks" (flamegraph.pl / speedscope)
+    def __init__(self, thread_id, interval=0.005, max_depth=64):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def init_app(app):
+    app.config.setdefault('SLOW_REQUEST_THRESHOLD', float(os.environ.get('SLOW_REQUEST_THRESHOLD', 2.0)))
+    app.config.setdefault('PROFILING_ENABLED', os.environ.get('PROFILING_ENABLED', '') == '1')
+    app.config.setdefault('PROFILING_INTERVAL', float(os.environ.get('PROFILING_INTERVAL', 0.005)))
+    app.config.setdefault('PROFILE_FOLDER', os.path.join(app.instance_path, 'profiles'))
+    app.config.setdefault('METRICS_MULTIPROC_DIR', os.environ.get('PROMETHEUS_MULTIPROC_DIR') or None)
+    app.config.setdefault('METRICS_FLUSH_INTERVAL', float(os.environ.get('METRICS_FLUSH_INTERVAL', 1.0)))
+    global multiprocess
+    if app.config['METRICS_MULTIPROC_DIR']:
+        multiprocess = MultiProcessMetrics(app.config['METRICS_MULTIPROC_DIR'], app.config['METRICS_FLUSH_INTERVAL'])
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        if multiprocess is not None:
+            multiprocess.ensure_started()
+        # Profilowanie na żądanie: ?_profile=1 lub nagłówek X-Profile: 1 (tylko gdy PROFILING_ENABLED);
+        # pole "profile" to profil odczytu metadanych (quick/full), nie profiler
+        if app.config['PROFILING_ENABLED'] and '1' in (request.args.get('_profile'), request.headers.get('X-Profile')):
+            g.profiler = SamplingProfiler(threading.get_ident(), app.config['PROFILING_INTERVAL']).start()
+
+    @app.after_request
+    def finish_request_timer(response):
+        start = g.pop('request_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        endpoint = request.endpoint or 'unknown'
+        REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+        stages = g.get('stages', {}).items()
+        if stages:
+            response.headers['Server-Timing'] = ', '.join(
+                f"{name};dur={duration * 1000:.1f}" for name, duration in stages)
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.stop()
+            os.makedirs(app.config['PROFILE_FOLDER'], exist_ok=True)
+            profile_path = os.path.join(app.config['PROFILE_FOLDER'], f"{endpoint}_{int(time.time() * 1000)}.txt")
+            with open(profile_path, 'w', encoding='utf-8') as f:
+                f.write(profiler.collapsed())
+            response.headers['X-Profile-Report'] = os.path.basename(profile_path)
+
+        if elapsed >= app.config['SLOW_REQUEST_THRESHOLD']:
+            breakdown = ', '.join(f"{name}={duration * 1000:.0f}ms" for name, duration in stages) or "brak etapów"
+            app.logger.warning(f"Wolne żądanie {request.method} {request.path} ({endpoint}): "
+                               f"{elapsed * 1000:.0f} ms, status {response.status_code}; {breakdown}")
+        return response
+
+    def before_render(sender, template, context, **extra):
+        g.render_start = time.perf_counter()
+
+    def after_render(sender, template, context, **extra):
+        start = g.pop('render_start', None)
+        if start is not None:
+            record_stage('render', time.perf_counter() - start)
+
+    before_render_template.connect(before_render, app, weak=False)
+    template_rendered.connect(after_render, app, weak=False)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,190 @@
+import functools
+import itertools
+import threading
+
+# Wykrywanie bliskich duplikatów (ponowne kodowanie, zmiana rozmiaru, drobne
+# edycje) po 64-bitowych skrótach percepcyjnych z image_analysis.perceptual_hashes.
+# Wyszukiwanie po odległości Hamminga pHash w indeksie wieloczęściowym
+# (multi-index hashing): zapytanie sprawdza kilka kubełków zamiast każdego pliku.
+# NumPy potrzebny jest tylko do grupowania całej sprawy i importowany leniwie.
+
+HASH_NAMES = ('ahash', 'dhash', 'phash')
+HASH_MASK = (1 << 64) - 1
+
+try:
+    _popcount = int.bit_count
+except AttributeError:
+    def _popcount(value):
+        return bin(value).count('1')
+
+
+def hamming(a, b):
+    return _popcount(a ^ b)
+
+
+def to_signed(value):
+    # SQLite przechowuje INTEGER jako 64 bity ze znakiem
+    value &= HASH_MASK
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value):
+    return value & HASH_MASK
+
+
+def to_hex(value):
+    return f"{to_unsigned(value):016x}"
+
+
+def distances(a, b):
+    return {name: hamming(a[name], b[name]) for name in HASH_NAMES}
+
+
+CHUNKS = 4
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+# Największy obsługiwany promień: części różnią się wtedy o najwyżej 3 bity
+MAX_DISTANCE = 15
+
+
+@functools.lru_cache(maxsize=None)
+def chunk_masks(radius):
+    # Maski części w odległości <= radius // CHUNKS od sprawdzanej części. Z zasady
+    # szufladkowej skrót w odległości <= radius ma co najmniej jedną taką część.
+    probe = min(radius, MAX_DISTANCE) // CHUNKS
+    masks = [0]
+    for count in range(1, probe + 1):
+        for positions in itertools.combinations(range(CHUNK_BITS), count):
+            masks.append(sum(1 << position for position in positions))
+    return tuple(masks)
+
+
+def chunks(value):
+    return [(value >> (index * CHUNK_BITS)) & CHUNK_MASK for index in range(CHUNKS)]
+
+
+class MultiIndex:
+    # Skrót dzielony na CHUNKS części, każda z osobną tablicą {wartość części: [pozycje]};
+    # zapytanie sprawdza kubełki sąsiadujące z częściami i weryfikuje kandydatów
+    def __init__(self):
+        self.values = []
+        self.keys = []
+        self.tables = [{} for _ in range(CHUNKS)]
+
+    def add(self, value, key):
+        position = len(self.values)
+        self.values.append(value)
+        self.keys.append(key)
+        for table, chunk in zip(self.tables, chunks(value)):
+            table.setdefault(chunk, []).append(position)
+
+    def search(self, value, radius):
+        # [(odległość, klucz)] dla skrótów w promieniu radius (najwyżej MAX_DISTANCE)
+        radius = min(radius, MAX_DISTANCE)
+        candidates = set()
+        for table, chunk in zip(self.tables, chunks(value)):
+            for mask in chunk_masks(radius):
+                bucket = table.get(chunk ^ mask)
+                if bucket:
+                    candidates.update(bucket)
+        found = []
+        for position in candidates:
+            distance = hamming(value, self.values[position])
+            if distance <= radius:
+                found.append((distance, self.keys[position]))
+        return found
+
+
+@functools.lru_cache(maxsize=1)
+def _popcount_table():
+    import numpy as np
+    return np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def popcount(values):
+    import numpy as np
+    return _popcount_table()[values.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+def near_pairs(values, radius):
+    # Wszystkie pary (i, j), i < j, skrótów z tablicy uint64 w odległości <= radius;
+    # to samo sprawdzanie kubełków co w MultiIndex, ale wektorowo dla całego zbioru
+    import numpy as np
+
+    radius = min(radius, MAX_DISTANCE)
+    count = len(values)
+    positions = np.arange(count)
+    pairs = []
+    for index in range(CHUNKS):
+        chunk = ((values >> np.uint64(index * CHUNK_BITS)) & np.uint64(CHUNK_MASK)).astype(np.int64)
+        order = np.argsort(chunk, kind='stable')
+        sizes = np.bincount(chunk, minlength=1 << CHUNK_BITS)
+        starts = np.cumsum(sizes) - sizes
+        for mask in chunk_masks(radius):
+            probe = chunk ^ mask
+            matched = sizes[probe]
+            total = int(matched.sum())
+            if not total:
+                continue
+            first = np.repeat(positions, matched)
+            offsets = np.arange(total) - np.repeat(np.cumsum(matched) - matched, matched)
+            second = order[np.repeat(starts[probe], matched) + offsets]
+            keep = first < second
+            first, second = first[keep], second[keep]
+            close = popcount(values[first] ^ values[second]) <= radius
+            pairs.append((first[close], second[close]))
+    if not pairs:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate([pair[0] for pair in pairs]), np.concatenate([pair[1] for pair in pairs])
+
+
+class HashIndex:
+    # Skróty wszystkich dotąd przeanalizowanych treści w pamięci procesu,
+    # dociągane przyrostowo z bazy (last_id), bo inne procesy też dopisują wiersze
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = MultiIndex()
+        self.hashes = {}
+        self.last_id = 0
+
+    def add(self, key, hashes, row_id=None):
+        with self.lock:
+            if row_id is not None:
+                self.last_id = max(self.last_id, row_id)
+            if key in self.hashes:
+                return
+            self.hashes[key] = hashes
+            self.index.add(hashes['phash'], key)
+
+    def search(self, hashes, radius, exclude=None):
+        # [(klucz, odległości)] od najbliższych, bez samego klucza exclude
+        with self.lock:
+            found = self.index.search(hashes['phash'], radius)
+            matches = [(key, distances(hashes, self.hashes[key])) for _, key in found if key != exclude]
+        matches.sort(key=lambda match: (match[1]['phash'], match[1]['dhash'], match[0]))
+        return matches
+
+
+def cluster(hashes, radius):
+    # Grupy bliskich duplikatów wśród {klucz: skróty} (spójne składowe grafu
+    # "pHash w odległości <= radius"), tylko grupy z co najmniej dwoma kluczami
+    import numpy as np
+
+    keys = sorted(hashes)
+    values = np.array([hashes[key]['phash'] for key in keys], dtype=np.uint64)
+    parent = list(range(len(keys)))
+
+    def find(position):
+        while parent[position] != position:
+            parent[position] = parent[parent[position]]
+            position = parent[position]
+        return position
+
+    for first, second in zip(*(pair.tolist() for pair in near_pairs(values, radius))):
+        root, other_root = find(first), find(second)
+        if root != other_root:
+            parent[max(root, other_root)] = min(root, other_root)
+    groups = {}
+    for position, key in enumerate(keys):
+        groups.setdefault(find(position), []).append(key)
+    return sorted((group for group in groups.values() if len(group) > 1), key=lambda group: (-len(group), group[0]))
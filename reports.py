@@ -0,0 +1,103 @@
+import io
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+# Generowanie raportów TXT/PDF w pamięci, bez plików pośrednich na dysku.
+# Style budowane są raz na proces, a metadane układane w tabele po
+# TABLE_CHUNK_ROWS wierszy, które ReportLab łatwo dzieli między strony.
+# ReportLab importowany jest dopiero przy pierwszym raporcie PDF (albo przy
+# rozgrzewaniu workera), żeby nie wydłużać startu aplikacji.
+
+TABLE_CHUNK_ROWS = 200
+STREAM_CHUNK_SIZE = 64 * 1024
+PAGE_MARGIN = 72
+COLUMN_WIDTHS = [170, 281]
+
+
+@lru_cache(maxsize=1)
+def report_styles():
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='Metadata', fontSize=10, leading=14))
+    # "Title" istnieje już w arkuszu przykładowym, stąd osobna nazwa
+    styles.add(ParagraphStyle(name='ReportTitle', fontSize=24, leading=24, alignment=TA_CENTER))
+    styles.add(ParagraphStyle(name='Subtitle', fontSize=16, leading=16))
+    styles.add(ParagraphStyle(name='Group', fontSize=12, leading=16, spaceBefore=12, spaceAfter=6))
+    return styles
+
+
+@lru_cache(maxsize=1)
+def table_style():
+    from reportlab.lib import colors
+    from reportlab.platypus import TableStyle
+
+    return TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.grey),
+    ])
+
+
+def iter_txt_report(filename, record):
+    yield "# Raport Metadanych\n\n"
+    yield f"Plik: {filename}\n\n"
+    yield "=== Metadane ===\n"
+    for group, tags in record.by_group().items():
+        lines = [f"\n[{group}]\n"]
+        lines.extend(f"- {tag.desc}: {tag.value}\n" for tag in tags)
+        yield ''.join(lines)
+
+
+def _metadata_tables(tags, styles):
+    from reportlab.platypus import Paragraph, Table
+
+    style = styles['Metadata']
+    header = [Paragraph("<b>Tag</b>", style), Paragraph("<b>Wartość</b>", style)]
+    for start in range(0, len(tags), TABLE_CHUNK_ROWS):
+        data = [header]
+        for tag in tags[start:start + TABLE_CHUNK_ROWS]:
+            data.append([Paragraph(escape(tag.desc), style), Paragraph(escape(tag.value), style)])
+        table = Table(data, colWidths=COLUMN_WIDTHS, repeatRows=1)
+        table.setStyle(table_style())
+        yield table
+
+
+def build_pdf_report(filename, record):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+    styles = report_styles()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4,
+                            rightMargin=PAGE_MARGIN, leftMargin=PAGE_MARGIN,
+                            topMargin=PAGE_MARGIN, bottomMargin=PAGE_MARGIN,
+                            title=f"Raport Metadanych - {filename}")
+
+    elements = [
+        Paragraph("Raport Metadanych", styles['ReportTitle']),
+        Spacer(1, 20),
+        Paragraph(f"Plik: {escape(filename)}", styles['Subtitle']),
+        Spacer(1, 24),
+        Paragraph("Metadane:", styles['Normal']),
+    ]
+    for group, tags in record.by_group().items():
+        elements.append(Paragraph(escape(group), styles['Group']))
+        elements.extend(_metadata_tables(tags, styles))
+
+    doc.build(elements)
+    buffer.seek(0)
+    return buffer
+
+
+def iter_buffer(buffer, chunk_size=STREAM_CHUNK_SIZE):
+    while True:
+        chunk = buffer.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,68 @@
+import re
+from collections import namedtuple
+
+# Polityka czyszczenia metadanych (wszystko, wybrane grupy, wybrane tagi,
+# dopisanie komentarza) przekładana na argumenty zapisu ExifTool. Nazwy są
+# sprawdzane, bo trafiają do pliku poleceń procesu -stay_open.
+
+DEFAULT_COMMENT = "LENS OSINT ANALYZER DATA"
+MAX_COMMENT_LENGTH = 1000
+NAME_PATTERN = re.compile(r'^[A-Za-z][\w-]*(:[A-Za-z][\w-]*)?$')
+
+
+def _names(values, label):
+    if isinstance(values, str):
+        values = [values]
+    names = []
+    for value in values or []:
+        if not isinstance(value, str) or not NAME_PATTERN.match(value):
+            raise ValueError(f"Nieprawidłowa nazwa {label}: {value!r}")
+        names.append(value)
+    return tuple(sorted(set(names)))
+
+
+class SanitizePolicy(namedtuple('SanitizePolicy', ['remove_all', 'groups', 'tags', 'comment'])):
+    @classmethod
+    def create(cls, remove_all=False, groups=(), tags=(), comment=None):
+        if comment is not None:
+            # Nowe linie rozbiłyby polecenie w pliku argumentów ExifTool
+            comment = ' '.join(str(comment).split())[:MAX_COMMENT_LENGTH] or None
+        policy = cls(bool(remove_all), _names(groups, "grupy"), _names(tags, "tagu"), comment)
+        if not policy.args():
+            raise ValueError("Polityka czyszczenia nie zawiera żadnej operacji.")
+        return policy
+
+    @classmethod
+    def from_dict(cls, data):
+        # {"all": true, "groups": ["XMP", "GPS"], "tags": ["Make"], "comment": "..."} lub "all"
+        if data == 'all':
+            return cls.create(remove_all=True)
+        if not isinstance(data, dict):
+            raise ValueError("Nieprawidłowa polityka czyszczenia.")
+        return cls.create(data.get('all', False), data.get('groups', ()), data.get('tags', ()), data.get('comment'))
+
+    def args(self):
+        args = ["-all="] if self.remove_all else []
+        args += [f"-{group}:all=" for group in self.groups]
+        args += [f"-{tag}=" for tag in self.tags]
+        if self.comment:
+            args.append(f"-Comment={self.comment}")
+        return args
+
+    @property
+    def operation(self):
+        # Klucz wariantu pochodnego (ta sama polityka na tej samej treści = ten sam wynik)
+        return ' '.join(self.args())
+
+    def to_dict(self):
+        return {'all': self.remove_all, 'groups': list(self.groups), 'tags': list(self.tags), 'comment': self.comment}
+
+
+def errors_by_file(stderr, paths):
+    # Komunikaty ExifTool kończą się ścieżką pliku ("Error: ... - plik")
+    errors = {}
+    for line in stderr.splitlines():
+        for path in paths:
+            if line.endswith(f" - {path}") and line.startswith('Error'):
+                errors.setdefault(path, line)
+    return errors
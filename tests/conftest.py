@@ -0,0 +1,40 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from bench_endpoints import stub_exiftool  # noqa: E402
+
+# Katalog instancji (metryki, profile) poza repozytorium - ustawiany przed
+# pierwszym importem app, także przez moduły testów importujące go na górze
+INSTANCE_PATH = tempfile.mkdtemp(prefix='load-instance-')
+os.environ['INSTANCE_PATH'] = INSTANCE_PATH
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(INSTANCE_PATH, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def client(tmp_path_factory):
+    # Aplikacja z zastępczym ExifTool w pustym katalogu roboczym (uploaded_files
+    # i baza tworzone są względem niego)
+    workdir = tmp_path_factory.mktemp('load')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    import app
+    flask_app = app.create_app({
+        'TESTING': True,
+        'EXIFTOOL_PATH': stub_exiftool(str(workdir)),
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{workdir / 'test.db'}",
+    })
+    try:
+        yield flask_app.test_client()
+    finally:
+        os.chdir(cwd)
@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+import blobstore
+from blobstore import BlobStore
+
+TRY_LOCK = "import sys; from blobstore import FileLock; sys.exit(0 if FileLock(sys.argv[1]).acquire(blocking=False) else 1)"
+
+
+def try_lock_in_other_process(path):
+    return subprocess.run([sys.executable, '-c', TRY_LOCK, path], cwd=os.path.dirname(blobstore.__file__)).returncode == 0
+
+
+def test_blob_lock_excludes_other_processes(tmp_path):
+    store = BlobStore(str(tmp_path))
+    with store.lock:
+        assert not try_lock_in_other_process(store.lock.path)
+    assert try_lock_in_other_process(store.lock.path)
+
+
+def test_gc_lock_is_held_by_one_store_at_a_time(tmp_path):
+    store = BlobStore(str(tmp_path))
+    assert store.gc_lock.acquire(blocking=False)
+    try:
+        assert not BlobStore(str(tmp_path)).gc_lock.acquire(blocking=False)
+    finally:
+        store.gc_lock.release()
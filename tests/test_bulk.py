@@ -0,0 +1,75 @@
+import glob
+import hashlib
+import io
+import os
+import tarfile
+import zipfile
+
+import app
+
+
+def png_bytes(size):
+    return b'\x89PNG\r\n\x1a\n' + os.urandom(size - 8)
+
+
+def tar_bytes(members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as archive:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def test_broken_archive_leaves_nothing_behind(client):
+    first = png_bytes(4096)
+    data = tar_bytes([('a.png', first), ('b.png', png_bytes(64 * 1024))])
+    folders = set(glob.glob(os.path.join('uploaded_files', 'bulk_*')))
+
+    # Archiwum urwane w połowie drugiego pliku - pierwszy został już zapisany
+    response = client.post('/analyze-bulk', data={'files': (io.BytesIO(data[:len(data) // 2]), 'broken.tar')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert set(glob.glob(os.path.join('uploaded_files', 'bulk_*'))) == folders
+    assert not app.blob_store.exists(hashlib.sha256(first).hexdigest())
+
+
+def test_oversized_archive_members_are_skipped(client, monkeypatch):
+    monkeypatch.setitem(client.application.config['UPLOAD_LIMITS'], 'png', 16 * 1024)
+    small, large = png_bytes(4096), png_bytes(64 * 1024)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('zipped.png', large)
+    data = {'files': [(io.BytesIO(tar_bytes([('small.png', small), ('large.png', large)])), 'photos.tar'),
+                      (io.BytesIO(buffer.getvalue()), 'photos.zip')]}
+
+    response = client.post('/analyze-bulk', data=data, content_type='multipart/form-data')
+    assert response.status_code == 200
+    skipped = {result['name'] for result in response.json['files'] if result['status'] == 'skipped'}
+    assert skipped == {'large.png', 'zipped.png'}
+    assert response.json['summary']['skipped'] == 2
+    assert not app.blob_store.exists(hashlib.sha256(large).hexdigest())
+
+
+def test_rejected_direct_files_are_skipped(client):
+    good = png_bytes(4096)
+    data = {'files': [(io.BytesIO(good), 'good.png'), (io.BytesIO(b'not a png' * 100), 'fake.png'),
+                      (io.BytesIO(b'not a zip' * 100), 'fake.zip')]}
+
+    # Jeden plik z błędną sygnaturą nie przerywa całej paczki (415)
+    response = client.post('/analyze-bulk', data=data, content_type='multipart/form-data')
+    assert response.status_code == 200
+    statuses = {result['name']: result['status'] for result in response.json['files']}
+    assert statuses['fake.png'] == statuses['fake.zip'] == 'skipped'
+    assert statuses['good.png'] != 'skipped'
+    assert app.blob_store.exists(hashlib.sha256(good).hexdigest())
+
+
+def test_rejected_file_still_fails_single_upload(client):
+    other = client.application.test_client()
+    other.post('/analyze', data={'file': (io.BytesIO(b'not a png' * 100), 'fake.png')},
+               content_type='multipart/form-data')
+    with other.session_transaction() as session:
+        messages = [message for _, message in session.get('_flashes', [])]
+    assert messages == ["Zawartość pliku fake.png nie odpowiada rozszerzeniu .png"]
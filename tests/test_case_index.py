@@ -0,0 +1,49 @@
+import pytest
+
+from case_index import gps_cell, normalize_date, parse_coordinates
+from metadata import MetadataTag
+
+
+def gps_tag(raw, value):
+    return MetadataTag('Composite', 'GPSPosition', 'GPS Position', raw, value)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2023:05:17 10:22:41', '2023-05-17 10:22:41'),
+    ('2023:05:17 10:22:41+02:00', '2023-05-17 10:22:41'),
+    ('2023:05:17 10:22:41.123Z', '2023-05-17 10:22:41'),
+    ('2023-05-17T10:22', '2023-05-17 10:22:00'),
+    ('2023:05:17', '2023-05-17 00:00:00'),
+    ('0000:00:00 00:00:00', None),
+    ('2023:00:17 10:22:41', None),
+    ('maj 2023', None),
+    ('', None),
+    (None, None),
+])
+def test_normalize_date(value, expected):
+    assert normalize_date(value) == expected
+
+
+@pytest.mark.parametrize('raw, value, expected', [
+    ('52.2297 21.0122', '', (52.2297, 21.0122)),
+    ('52.2297, 21.0122, 110', '', (52.2297, 21.0122)),
+    ('-33.8688 151.2093', '', (-33.8688, 151.2093)),
+    # Bez wartości surowej (-n): stopnie, minuty i sekundy z kierunkiem
+    ('', '52 deg 13\' 48.00" N, 21 deg 0\' 36.00" E', (52.23, 21.01)),
+    ('', '33 deg 52\' 7.68" S, 151 deg 12\' 33.48" W', (-33.8688, -151.2093)),
+    ('', '52 deg 13\' 48.00" N', None),
+    ('0 0', '', None),
+    ('95.0 21.0', '', None),
+    ('52.0 181.0', '', None),
+])
+def test_parse_coordinates(raw, value, expected):
+    coordinates = parse_coordinates(gps_tag(raw, value))
+    if expected is None:
+        assert coordinates is None
+    else:
+        assert coordinates == pytest.approx(expected, abs=1e-4)
+
+
+def test_gps_cell_floors_negative_coordinates():
+    assert gps_cell(52.2297, 21.0122, 0.01) == '5222:2101'
+    assert gps_cell(-0.001, -0.001, 0.01) == '-1:-1'
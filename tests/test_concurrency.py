@@ -0,0 +1,70 @@
+import io
+import os
+import threading
+
+
+def post_concurrently(client, uploads, path='/analyze'):
+    # Każde żądanie w osobnym wątku z własnym klientem, start w tej samej chwili.
+    # Zwraca [(status, komunikaty flash)].
+    barrier = threading.Barrier(len(uploads))
+    responses = []
+
+    def send(filename, data):
+        other = client.application.test_client()
+        barrier.wait()
+        response = other.post(path, data={'file': (io.BytesIO(data), filename)}, content_type='multipart/form-data')
+        with other.session_transaction() as session:
+            messages = [message for _, message in session.get('_flashes', [])]
+        responses.append((response.status_code, messages))
+
+    threads = [threading.Thread(target=send, args=upload) for upload in uploads]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return responses
+
+
+def test_same_content_uploaded_concurrently(client):
+    data = b'\xff\xd8\xff\xe0' + os.urandom(64 * 1024)
+    responses = post_concurrently(client, [('same.jpg', data)] * 8)
+    assert [status for status, _ in responses] == [302] * 8
+
+
+def test_same_image_analyzed_concurrently(client):
+    import cv2
+    import numpy as np
+
+    image = np.random.default_rng().integers(0, 255, (64, 96, 3), dtype=np.uint8)
+    data = cv2.imencode('.jpg', cv2.resize(image, (640, 480)))[1].tobytes()
+    responses = post_concurrently(client, [(f"copy_{index}.jpg", data) for index in range(8)])
+    assert [status for status, _ in responses] == [302] * 8
+    assert not [message for _, messages in responses for message in messages if 'UNIQUE' in message]
+
+
+def test_same_file_indexed_concurrently(client):
+    # Tak jak import paczki i kolejka zadań: index_files bez wcześniejszych zapisów w transakcji
+    import app
+    from metadata import MetadataRecord
+
+    sha256 = os.urandom(32).hex()
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def index():
+        with client.application.app_context():
+            barrier.wait()
+            try:
+                app.index_files('concurrent', [('indexed.jpg', 'indexed.jpg', sha256, MetadataRecord(), 'full')])
+                app.db.session.commit()
+            except Exception as e:
+                errors.append(str(e))
+
+    threads = [threading.Thread(target=index) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    with client.application.app_context():
+        assert app.IndexedFile.query.filter_by(case_name='concurrent', sha256=sha256).count() == 1
@@ -0,0 +1,74 @@
+import json
+import time
+
+import pytest
+
+from bench_endpoints import stub_exiftool
+from exiftool_pool import ExifToolPool, ExifToolTimeout
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ExifToolPool(stub_exiftool(str(tmp_path)), size=1, timeout=10)
+    yield pool
+    pool.close()
+
+
+def test_responses_are_matched_to_commands(pool, tmp_path):
+    photo = tmp_path / 'photo.jpg'
+    photo.write_bytes(b'\xff\xd8\xff\xe0' + bytes(1000))
+    for _ in range(3):
+        assert pool.execute(['-ver']).stdout == '12.70\n'
+        result = pool.execute(['-j', str(photo)])
+        assert result.returncode == 0
+        assert json.loads(result.stdout)[0]['File:FileType']['val'] == 'JPEG'
+    missing = pool.execute(['-j', str(tmp_path / 'missing.jpg')])
+    assert missing.returncode == 1
+    assert missing.stderr.startswith('Error: File not found')
+    assert pool.stats()['jobs_done'] == 7
+
+
+def test_timeout_restarts_the_process(tmp_path, monkeypatch):
+    monkeypatch.setenv('STUB_EXIFTOOL_DELAY_MS', '500')
+    pool = ExifToolPool(stub_exiftool(str(tmp_path)), size=1, timeout=10)
+    try:
+        with pytest.raises(ExifToolTimeout):
+            pool.execute(['-ver'], timeout=0.1)
+        # Spóźniona odpowiedź zabitego procesu nie trafia do kolejnego polecenia
+        result = pool.execute(['-j', str(tmp_path / 'exiftool')])
+        assert json.loads(result.stdout)[0]['SourceFile'].endswith('exiftool')
+        assert pool.stats()['restarts'] == 1
+    finally:
+        pool.close()
+
+
+def test_dead_process_is_restarted(pool):
+    assert pool.warm_up() == 1
+    worker = pool._workers[0]
+    worker.process.kill()
+    worker.process.wait()
+    assert pool.execute(['-ver']).stdout == '12.70\n'
+    assert worker.alive()
+    assert pool.stats()['restarts'] == 1
+
+
+def test_health_checks_restart_idle_processes(tmp_path):
+    pool = ExifToolPool(stub_exiftool(str(tmp_path)), size=1, timeout=10, health_interval=0.2)
+    try:
+        pool.warm_up()
+        assert pool.start_health_checks()
+        assert not pool.start_health_checks()
+        worker = pool._workers[0]
+        process = worker.process
+        process.kill()
+        process.wait()
+        # Martwy proces wraca bez czekania na kolejne zlecenie
+        deadline = time.monotonic() + 5
+        while pool.stats()['restarts'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert pool.stats()['restarts'] == 1
+        assert worker.alive()
+    finally:
+        pool.close()
+    pool._health_thread.join(timeout=1)
+    assert not pool._health_thread.is_alive()
@@ -0,0 +1,53 @@
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from image_analysis import image_dimensions, reduction_factor
+
+
+def tiff_header(width, height, order='<', big=False, kinds=(4, 3)):
+    # Sam nagłówek i IFD0 z kilkoma znacznikami, bez danych obrazu
+    entries = [(254, 4, 0), (256, kinds[0], width), (257, kinds[1], height), (259, 3, 1)]
+    value_format = {3: 'H', 4: 'I', 16: 'Q'}
+    if big:
+        data = (b'II' if order == '<' else b'MM') + struct.pack(order + 'HHHQ', 43, 8, 0, 16)
+        data += struct.pack(order + 'Q', len(entries))
+        for tag, kind, value in entries:
+            data += struct.pack(order + 'HHQ', tag, kind, 1) + struct.pack(order + value_format[kind], value).ljust(8, b'\0')
+        return data + struct.pack(order + 'Q', 0)
+    data = (b'II' if order == '<' else b'MM') + struct.pack(order + 'HI', 42, 8)
+    data += struct.pack(order + 'H', len(entries))
+    for tag, kind, value in entries:
+        data += struct.pack(order + 'HHI', tag, kind, 1) + struct.pack(order + value_format[kind], value).ljust(4, b'\0')
+    return data + struct.pack(order + 'I', 0)
+
+
+@pytest.mark.parametrize('order', ['<', '>'])
+@pytest.mark.parametrize('big, kinds', [(False, (4, 3)), (False, (3, 4)), (True, (16, 4))])
+def test_tiff_dimensions_from_ifd0(tmp_path, order, big, kinds):
+    path = tmp_path / 'scan.tiff'
+    path.write_bytes(tiff_header(8000, 6000, order, big, kinds))
+    assert image_dimensions(str(path)) == (8000, 6000)
+
+
+def test_dimensions_of_encoded_images(tmp_path):
+    image = np.zeros((300, 500, 3), dtype=np.uint8)
+    for extension in ('tiff', 'png', 'jpg'):
+        path = str(tmp_path / f"image.{extension}")
+        cv2.imwrite(path, image)
+        assert image_dimensions(path) == (500, 300)
+
+
+def test_reduction_factor_uses_tiff_header(tmp_path):
+    # 48 Mpx w nagłówku - rozmiar pliku (kilkadziesiąt bajtów) nic by nie powiedział
+    path = tmp_path / 'large.tiff'
+    path.write_bytes(tiff_header(8000, 6000))
+    assert reduction_factor(str(path)) == 4
+
+
+def test_truncated_tiff_has_no_dimensions(tmp_path):
+    path = tmp_path / 'broken.tiff'
+    path.write_bytes(tiff_header(8000, 6000)[:20])
+    assert image_dimensions(str(path)) is None
@@ -0,0 +1,39 @@
+import time
+import uuid
+
+import app
+
+
+def add_job(status, started_at=None):
+    job = app.AnalysisJob(id=uuid.uuid4().hex, status=status, filename='job.jpg', filepath='job.jpg',
+                          sha256='0' * 64, created_at=time.time(), started_at=started_at)
+    app.db.session.add(job)
+    app.db.session.commit()
+    return job.id
+
+
+def test_running_job_with_expired_lease_is_abandoned(client, monkeypatch):
+    monkeypatch.setenv('LOAD_SERVER_STARTED', '0')
+    monkeypatch.setitem(client.application.config, 'JOB_TIMEOUT', 60)
+    with client.application.app_context():
+        expired = add_job('running', time.time() - 120)
+        leased = add_job('running', time.time() - 30)
+        abandoned = {job.id for job in app.AnalysisJob.query.filter(app.abandoned_jobs())}
+    assert expired in abandoned
+    assert leased not in abandoned
+
+
+def test_result_is_written_only_by_lease_owner(client, monkeypatch):
+    def taken_over(*args, **kwargs):
+        # W trakcie analizy dzierżawa wygasa i zadanie przejmuje inny proces
+        app.AnalysisJob.query.filter_by(id=job_id).update({'started_at': time.time() + 1})
+        app.db.session.commit()
+        raise ValueError("przerwany odczyt")
+
+    monkeypatch.setattr(app, 'read_metadata', taken_over)
+    with client.application.app_context():
+        job_id = add_job('queued')
+        app.run_analysis_job(job_id)
+        job = app.db.session.get(app.AnalysisJob, job_id)
+        assert job.status == 'running'
+        assert job.error is None
@@ -0,0 +1,56 @@
+import json
+
+from metadata import MetadataRecord, MetadataTag, parse_exiftool_json
+
+# Wyjście w postaci `exiftool -j -G1 -l`: {"Grupa:Tag": {"desc", "val", "num"}}
+EXIFTOOL_JSON = json.dumps([{
+    'SourceFile': 'uploaded_files/photo.jpg',
+    'ExifTool:ExifToolVersion': {'desc': 'ExifTool Version Number', 'val': 12.7},
+    'IFD0:Make': {'desc': 'Make', 'val': 'Canon'},
+    'IFD0:Orientation': {'desc': 'Orientation', 'val': 'Horizontal (normal)', 'num': 1},
+    'ExifIFD:ExposureTime': {'desc': 'Exposure Time', 'val': '1/200', 'num': 0.005},
+    'XMP-dc:Subject': {'desc': 'Subject', 'val': ['osint', 'test']},
+    'XMP-xmpRights:Marked': {'desc': 'Marked', 'val': True},
+    'Composite:GPSPosition': {'desc': 'GPS Position', 'val': '52 deg 13\' 47.00" N, 21 deg 0\' 44.00" E',
+                              'num': '52.2297 21.0122'},
+}])
+
+
+def test_tags_are_parsed_from_exiftool_json():
+    record = MetadataRecord.from_exiftool_json(EXIFTOOL_JSON)
+    assert len(record) == 7
+    assert record.get('IFD0:Orientation') == MetadataTag('IFD0', 'Orientation', 'Orientation', 1, 'Horizontal (normal)')
+    assert record.get('ExposureTime').raw == 0.005
+    assert record.get('Make').raw == record.get('Make').value == 'Canon'
+    assert record.get('Subject').value == 'osint, test'
+    assert record.get('Marked').value == 'True'
+    assert record.get('Composite:GPSPosition').desc == 'GPS Position'
+    assert record.groups() == ['ExifTool', 'IFD0', 'ExifIFD', 'XMP-dc', 'XMP-xmpRights', 'Composite']
+
+
+def test_plain_values_without_descriptions():
+    # Bez -l ExifTool zwraca same wartości; opisem jest wtedy nazwa tagu
+    record = MetadataRecord.from_exiftool_item({'SourceFile': 'a.jpg', 'IFD0:Model': 'EOS R5', 'FileType': 'JPEG'})
+    assert list(record) == [MetadataTag('IFD0', 'Model', 'Model', 'EOS R5', 'EOS R5'),
+                            MetadataTag('', 'FileType', 'FileType', 'JPEG', 'JPEG')]
+
+
+def test_empty_output():
+    assert len(MetadataRecord.from_exiftool_json('')) == 0
+    assert len(MetadataRecord.from_exiftool_json('[]')) == 0
+    assert parse_exiftool_json('  \n') == {}
+
+
+def test_batch_output_is_keyed_by_source_file():
+    items = [{'SourceFile': f"{name}.jpg", 'IFD0:Make': {'desc': 'Make', 'val': name}} for name in ('a', 'b')]
+    records = parse_exiftool_json(json.dumps(items))
+    assert {path: record.get('Make').value for path, record in records.items()} == {'a.jpg': 'a', 'b.jpg': 'b'}
+
+
+def test_json_round_trip_and_selection():
+    record = MetadataRecord.from_exiftool_json(EXIFTOOL_JSON)
+    restored = MetadataRecord.from_json(record.to_json())
+    assert list(restored) == list(record)
+    assert [tag.tag for tag in restored.select(groups=['IFD0'])] == ['Make', 'Orientation']
+    assert [tag.tag for tag in restored.select(tags=['Make', 'ExifIFD:ExposureTime'])] == ['Make', 'ExposureTime']
+    assert restored.lines()[1] == f"{'Make':<32}: Canon"
@@ -0,0 +1,50 @@
+import random
+
+import numpy as np
+import pytest
+
+from near_duplicates import MAX_DISTANCE, MultiIndex, cluster, hamming, near_pairs
+
+
+def sample_hashes(seed, count=400):
+    # Losowe skróty i ich warianty z kilkoma-kilkunastoma zmienionymi bitami
+    rng = random.Random(seed)
+    bases = [rng.getrandbits(64) for _ in range(count // 4)]
+    values = list(bases)
+    while len(values) < count:
+        value = rng.choice(bases)
+        for bit in rng.sample(range(64), rng.randint(0, 20)):
+            value ^= 1 << bit
+        values.append(value)
+    return values
+
+
+@pytest.mark.parametrize('radius', [0, 1, 4, 8, 12, MAX_DISTANCE])
+def test_search_matches_brute_force(radius):
+    values = sample_hashes(radius)
+    index = MultiIndex()
+    for key, value in enumerate(values):
+        index.add(value, key)
+    for query in values[:50] + sample_hashes(radius + 100, 20):
+        expected = sorted((hamming(query, value), key) for key, value in enumerate(values) if hamming(query, value) <= radius)
+        assert sorted(index.search(query, radius)) == expected
+
+
+@pytest.mark.parametrize('radius', [0, 3, 8, MAX_DISTANCE])
+def test_near_pairs_matches_brute_force(radius):
+    values = sample_hashes(radius)
+    first, second = near_pairs(np.array(values, dtype=np.uint64), radius)
+    expected = {(i, j) for i in range(len(values)) for j in range(i + 1, len(values)) if hamming(values[i], values[j]) <= radius}
+    assert set(zip(first.tolist(), second.tolist())) == expected
+
+
+def test_radius_is_capped():
+    index = MultiIndex()
+    index.add(0, 'zero')
+    index.add((1 << (MAX_DISTANCE + 1)) - 1, 'far')
+    assert index.search(0, 64) == [(0, 'zero')]
+
+
+def test_cluster_groups_connected_hashes():
+    hashes = {key: {'phash': value} for key, value in (('a', 0), ('b', 0b11), ('c', 0b1111), ('d', (1 << 64) - 1))}
+    assert cluster(hashes, 2) == [['a', 'b', 'c']]
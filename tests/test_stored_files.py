@@ -0,0 +1,22 @@
+import os
+
+
+def upload(client, filename, data):
+    url = client.post('/uploads', json={'filename': filename, 'size': len(data)}).json['upload_url']
+    return client.patch(url, data=data, headers={'Upload-Offset': '0'}).json
+
+
+def test_remove_metadata_writes_clean_copy(client):
+    assert upload(client, 'stored.jpg', b'\xff\xd8\xff\xe0' + os.urandom(4096))['status'] == 'complete'
+    response = client.get('/remove-metadata/?filename=stored.jpg')
+    assert response.status_code == 302
+    assert '/report' in response.headers['Location']
+    assert os.path.isfile(os.path.join('uploaded_files', 'clean_stored.jpg'))
+
+
+def test_paths_outside_uploads_are_rejected(client):
+    for name in ('../users.db', '.blobs/stored.jpg', '/etc/passwd', ''):
+        for route in ('/remove-metadata/', '/metadata-tools/'):
+            response = client.get(route, query_string={'filename': name})
+            assert response.status_code == 302
+            assert response.headers['Location'].endswith('/analyze')
@@ -0,0 +1,96 @@
+import hashlib
+import io
+import os
+import threading
+
+
+class DroppedConnection(io.RawIOBase):
+    # Strumień żądania, który po wysłaniu części danych zgłasza zerwane połączenie
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = self._data.readinto(buffer)
+        if not count:
+            raise ConnectionResetError("Połączenie przerwane przez klienta")
+        return count
+
+
+def jpeg_bytes(size):
+    return b'\xff\xd8\xff\xe0' + os.urandom(size - 4)
+
+
+def test_interrupted_chunk_is_resumed(client):
+    data = jpeg_bytes(3 * 1024 * 1024 + 123)
+    sent = 2 * 1024 * 1024 + 7
+    response = client.post('/uploads', json={
+        'filename': 'resume.jpg', 'size': len(data), 'sha256': hashlib.sha256(data).hexdigest(),
+    })
+    assert response.status_code == 201
+    url = response.json['upload_url']
+
+    # Klient deklaruje całą treść, ale połączenie urywa się po `sent` bajtach
+    client.patch(url, headers={'Upload-Offset': '0'}, environ_overrides={
+        'wsgi.input': DroppedConnection(data[:sent]), 'CONTENT_LENGTH': str(len(data)),
+    })
+    response = client.head(url)
+    assert response.headers['Upload-Offset'] == str(sent)
+
+    response = client.patch(url, data=data[sent:], headers={'Upload-Offset': str(sent)})
+    assert response.status_code == 200
+    assert response.json['status'] == 'complete'
+    assert response.json['sha256'] == hashlib.sha256(data).hexdigest()
+
+
+def test_stale_offset_is_rejected(client):
+    data = jpeg_bytes(4096)
+    url = client.post('/uploads', json={'filename': 'stale.jpg', 'size': len(data)}).json['upload_url']
+    client.patch(url, data=data[:1024], headers={'Upload-Offset': '0'})
+
+    # Powtórzenie kawałka od starego offsetu nie nadpisuje zapisanych danych
+    response = client.patch(url, data=data[:1024], headers={'Upload-Offset': '0'})
+    assert response.status_code == 409
+    assert response.headers['Upload-Offset'] == '1024'
+
+
+def test_known_content_is_linked_only_for_the_same_session(client):
+    data = jpeg_bytes(8192)
+    declared = {'filename': 'known.jpg', 'size': len(data), 'sha256': hashlib.sha256(data).hexdigest()}
+    url = client.post('/uploads', json=declared).json['upload_url']
+    assert client.patch(url, data=data, headers={'Upload-Offset': '0'}).json['status'] == 'complete'
+
+    # Ta sama sesja nie musi przesyłać treści ponownie
+    response = client.post('/uploads', json=declared)
+    assert response.json['status'] == 'complete'
+
+    # Inna sesja znająca tylko hash musi przesłać cały plik
+    other = client.application.test_client()
+    response = other.post('/uploads', json=declared)
+    assert response.json['status'] == 'uploading'
+    assert response.headers['Upload-Offset'] == '0'
+
+
+def test_concurrent_chunks_are_serialised(client):
+    data = jpeg_bytes(4 * 1024 * 1024)
+    url = client.post('/uploads', json={'filename': 'parallel.jpg', 'size': len(data)}).json['upload_url']
+    barrier = threading.Barrier(8)
+    statuses = []
+
+    def send():
+        other = client.application.test_client()
+        barrier.wait()
+        statuses.append(other.patch(url, data=data, headers={'Upload-Offset': '0'}).status_code)
+
+    # Ten sam kawałek wysłany równolegle (np. ponowienie klienta) zapisuje tylko jedno żądanie
+    threads = [threading.Thread(target=send) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(statuses) == [200] + [409] * 7
+    response = client.head(url)
+    assert response.headers['Upload-Offset'] == str(len(data))
+    assert client.get(url).json['sha256'] == hashlib.sha256(data).hexdigest()
@@ -0,0 +1,273 @@
+import hashlib
+import os
+import tempfile
+import time
+
+from flask import Request, current_app, g, has_request_context
+from werkzeug.exceptions import ClientDisconnected, RequestEntityTooLarge, UnsupportedMediaType
+
+from blobstore import FileLock
+from metrics import record_stage
+
+# Przyjmowanie plików strumieniowo: parser multipart Werkzeug zapisuje
+# kolejne fragmenty (po 64 kB) bezpośrednio do pliku tymczasowego w katalogu
+# uploadu, a po drodze sprawdzamy limit rozmiaru dla typu pliku, sygnaturę
+# (magic bytes) z pierwszego fragmentu i liczymy SHA-256. Plik niezgodny
+# z rozszerzeniem albo za duży przerywa parsowanie od razu (415/413).
+
+MB = 1024 * 1024
+GB = 1024 * MB
+UPLOAD_CHUNK_SIZE = 1 * MB
+SNIFF_BYTES = 512
+
+UPLOAD_LIMITS = {
+    'jpg': 200 * MB, 'png': 200 * MB, 'gif': 100 * MB, 'bmp': 200 * MB, 'tiff': 2 * GB,
+    'pdf': 500 * MB, 'docx': 200 * MB, 'odt': 200 * MB, 'epub': 200 * MB, 'xlsx': 200 * MB, 'pptx': 500 * MB,
+    'mp3': 500 * MB, 'wav': 2 * GB, 'flac': 2 * GB,
+    'mp4': 8 * GB, 'avi': 8 * GB, 'mov': 8 * GB, 'mkv': 8 * GB,
+    # archiwa dla /analyze-bulk
+    'zip': 16 * GB, 'tar': 16 * GB, 'gz': 16 * GB, 'tgz': 16 * GB, 'bz2': 16 * GB, 'xz': 16 * GB,
+}
+
+_ZIP = (b'PK\x03\x04', b'PK\x05\x06')
+_ISO_BMFF_BOXES = (b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip', b'pnot')
+
+
+def _riff(kind):
+    return lambda head: head[:4] == b'RIFF' and head[8:12] == kind
+
+
+def _mp3(head):
+    # ID3v2 albo nagłówek ramki MPEG (11 bitów synchronizacji)
+    return head.startswith(b'ID3') or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0)
+
+
+SIGNATURES = {
+    'jpg': lambda head: head.startswith(b'\xff\xd8\xff'),
+    'png': lambda head: head.startswith(b'\x89PNG\r\n\x1a\n'),
+    'gif': lambda head: head[:6] in (b'GIF87a', b'GIF89a'),
+    'bmp': lambda head: head.startswith(b'BM'),
+    'tiff': lambda head: head[:4] in (b'II*\x00', b'MM\x00*', b'II+\x00', b'MM\x00+'),
+    'pdf': lambda head: b'%PDF-' in head[:1024],
+    'docx': lambda head: head[:4] in _ZIP,
+    'xlsx': lambda head: head[:4] in _ZIP,
+    'pptx': lambda head: head[:4] in _ZIP,
+    'odt': lambda head: head[:4] in _ZIP,
+    'epub': lambda head: head[:4] in _ZIP,
+    'mp3': _mp3,
+    'wav': _riff(b'WAVE'),
+    'avi': _riff(b'AVI '),
+    'flac': lambda head: head.startswith(b'fLaC') or (head.startswith(b'ID3') and b'fLaC' in head),
+    'mp4': lambda head: head[4:8] in _ISO_BMFF_BOXES,
+    'mov': lambda head: head[4:8] in _ISO_BMFF_BOXES,
+    'mkv': lambda head: head.startswith(b'\x1a\x45\xdf\xa3'),
+    'zip': lambda head: head[:4] in _ZIP,
+    'tar': lambda head: head[257:262] == b'ustar',
+    'gz': lambda head: head.startswith(b'\x1f\x8b'),
+    'tgz': lambda head: head.startswith(b'\x1f\x8b'),
+    'bz2': lambda head: head.startswith(b'BZh'),
+    'xz': lambda head: head.startswith(b'\xfd7zXZ\x00'),
+}
+
+
+def file_extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if filename and '.' in filename else ''
+
+
+def sniff(extension, head):
+    check = SIGNATURES.get(extension)
+    return bool(check and check(head))
+
+
+def size_limit(extension):
+    limits = current_app.config.get('UPLOAD_LIMITS', UPLOAD_LIMITS)
+    return limits.get(extension, 0)
+
+
+class IngestFile:
+    # Obiekt plikowy zwracany parserowi multipart zamiast SpooledTemporaryFile.
+    # strict=False (uploady wielu plików naraz): odrzucenie pliku nie przerywa
+    # żądania - opis trafia do `rejected`, a dalsza treść części jest pomijana
+    def __init__(self, folder, filename, allowed, limit, strict=True):
+        self.filename = filename
+        self.extension = file_extension(filename)
+        self.strict = strict
+        self.rejected = None
+        if self.extension not in allowed:
+            self._reject(UnsupportedMediaType(f"Niedozwolony typ pliku: {filename}"))
+        self.limit = limit
+        self.size = 0
+        self.head = b''
+        self.sniffed = False
+        self.committed = False
+        self.elapsed = 0.0
+        self._digest = hashlib.sha256()
+        os.makedirs(folder, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(dir=folder, suffix='.part')
+        self._file = os.fdopen(fd, 'w+b')
+
+    def _reject(self, error):
+        if self.strict:
+            raise error
+        if self.rejected is None:
+            self.rejected = error.description
+
+    def _check_signature(self):
+        self.sniffed = True
+        if not sniff(self.extension, self.head):
+            self._reject(UnsupportedMediaType(f"Zawartość pliku {self.filename} nie odpowiada rozszerzeniu .{self.extension}"))
+
+    def write(self, data):
+        if self.rejected:
+            return len(data)
+        start = time.perf_counter()
+        self.size += len(data)
+        if self.size > self.limit:
+            self._reject(RequestEntityTooLarge(f"Plik {self.filename} przekracza limit {self.limit // MB} MB dla typu .{self.extension}"))
+            return len(data)
+        if not self.sniffed:
+            self.head += data[:SNIFF_BYTES - len(self.head)]
+            if len(self.head) >= SNIFF_BYTES:
+                self._check_signature()
+                if self.rejected:
+                    return len(data)
+        self._digest.update(data)
+        self._file.write(data)
+        self.elapsed += time.perf_counter() - start
+        return len(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        # Parser przewija plik po zakończeniu części - wtedy sprawdzamy też małe pliki
+        if not self.sniffed:
+            self._check_signature()
+        return self._file.seek(offset, whence)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    @property
+    def sha256(self):
+        return self._digest.hexdigest()
+
+    def commit(self):
+        # Plik gotowy do przeniesienia (bez kopiowania) - od tej chwili za plik
+        # tymczasowy odpowiada wywołujący. Zwraca (sha256, ścieżka).
+        self._file.close()
+        self.committed = True
+        record_stage('upload_receive', self.elapsed)
+        return self.sha256, self.temp_path
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if not self.committed and os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class IngestRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        allowed = set(current_app.config['ALLOWED_EXTENSIONS'])
+        if self.endpoint in current_app.config.get('ARCHIVE_UPLOAD_ENDPOINTS', ()):
+            allowed |= {'zip', 'tar', 'gz', 'tgz', 'bz2', 'xz'}
+        strict = self.endpoint not in current_app.config.get('BATCH_UPLOAD_ENDPOINTS', ())
+        extension = file_extension(filename)
+        limit = size_limit(extension)
+        if strict and content_length and content_length > limit > 0:
+            raise RequestEntityTooLarge(f"Plik {filename} przekracza limit dla typu .{extension}")
+        stream = IngestFile(current_app.config['INCOMING_FOLDER'], filename or '', allowed, limit, strict=strict)
+        if has_request_context():
+            g.setdefault('ingest_files', []).append(stream)
+        return stream
+
+
+def cleanup_ingest_files(exc=None):
+    # Pliki tymczasowe z przerwanych lub nieużytych uploadów
+    for stream in g.pop('ingest_files', []):
+        stream.close()
+
+
+def init_app(app):
+    app.request_class = IngestRequest
+    app.config.setdefault('UPLOAD_LIMITS', dict(UPLOAD_LIMITS))
+    app.config.setdefault('INCOMING_FOLDER', os.path.join(app.config['UPLOAD_FOLDER'], '.incoming'))
+    # Globalny limit żądania: największy limit typu + zapas na nagłówki multipart
+    app.config.setdefault('MAX_CONTENT_LENGTH', max(app.config['UPLOAD_LIMITS'].values()) + MB)
+    app.teardown_request(cleanup_ingest_files)
+
+
+# Wznawialny upload w kawałkach. Stan hasha trzymany jest w pamięci procesu;
+# po restarcie (lub gdy kawałek trafi do innego procesu) liczony jest od nowa
+# z części już zapisanej na dysku.
+_hashers = {}
+
+
+def part_path(folder, upload_id):
+    return os.path.join(folder, f"{upload_id}.part")
+
+
+def part_lock(folder, upload_id):
+    # Kawałki jednego uploadu zapisywane są po kolei - także przez różne procesy serwera
+    return FileLock(os.path.join(folder, f"{upload_id}.lock"))
+
+
+def remove_part(folder, upload_id):
+    # Część i plik blokady zakończonego lub porzuconego uploadu
+    for path in (part_path(folder, upload_id), part_lock(folder, upload_id).path):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _resume_hasher(upload_id, path, offset):
+    state = _hashers.get(upload_id)
+    if state is not None and state[0] == offset:
+        return state[1]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        remaining = offset
+        while remaining > 0:
+            chunk = f.read(min(UPLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest
+
+
+def append_chunk(upload_id, path, offset, size, stream):
+    # Dopisuje treść żądania od `offset`, czytając strumień kawałkami UPLOAD_CHUNK_SIZE.
+    # Zwraca nowy offset - po zerwaniu połączenia offset tego, co zdążyło dotrzeć,
+    # od którego klient wznawia; przy przekroczeniu zadeklarowanego rozmiaru zgłasza 413.
+    digest = _resume_hasher(upload_id, path, offset)
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        f.truncate()
+        try:
+            while True:
+                try:
+                    chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                except (ClientDisconnected, OSError):
+                    break
+                if not chunk:
+                    break
+                if offset + len(chunk) > size:
+                    raise RequestEntityTooLarge("Przesłano więcej danych niż zadeklarowany rozmiar pliku.")
+                f.write(chunk)
+                digest.update(chunk)
+                offset += len(chunk)
+        finally:
+            f.flush()
+            _hashers[upload_id] = (offset, digest)
+    return offset
+
+
+def finish_hasher(upload_id, path, offset):
+    digest = _resume_hasher(upload_id, path, offset)
+    _hashers.pop(upload_id, None)
+    return digest.hexdigest()
+
+
+def forget_hasher(upload_id):
+    _hashers.pop(upload_id, None)
@@ -0,0 +1,6 @@
+# Punkt wejścia serwerów WSGI:
+#   gunicorn -c gunicorn.conf.py         (kilka procesów, Linux/macOS)
+#   flask --app wsgi run                 (serwer deweloperski)
+from app import create_app
+
+app = create_app()